@@ -0,0 +1,124 @@
+# api_client.py
+import os
+import time
+import threading
+# requests/urllib3 are imported when the first session is built, keeping them off the app's import path
+
+# Configuration
+API_POOL_SIZE = int(os.environ.get('API_POOL_SIZE', 32))  # Keep-alive connections per upstream host
+API_RETRIES = int(os.environ.get('API_RETRIES', 3))
+API_BACKOFF_FACTOR = float(os.environ.get('API_BACKOFF_FACTOR', 0.3))  # 0.3s, 0.6s, 1.2s ...
+API_BACKOFF_JITTER = float(os.environ.get('API_BACKOFF_JITTER', 0.3))  # Random extra 0..0.3s per retry
+RETRY_STATUSES = (500, 502, 503, 504)
+RETRY_AFTER_STATUSES = (413, 503)  # Retried in-thread after Retry-After; 429s go back to upstream_scheduler
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+
+_session = None
+_session_lock = threading.Lock()
+# Retry budget of the call running on this thread (see get_json): retries run in the calling thread
+_budget = threading.local()
+
+def build_retry(retries=API_RETRIES, backoff_factor=API_BACKOFF_FACTOR, backoff_jitter=API_BACKOFF_JITTER):
+    """
+    Retry policy for idempotent upstream calls
+    :return: urllib3 Retry with jittered exponential backoff
+    """
+    from urllib3.util.retry import Retry
+
+    class UpstreamRetry(Retry):
+        # A 429 is about the API key's quota, not this connection: raise it so the scheduler
+        # can pause every call on the key instead of one thread sleeping and retrying
+        RETRY_AFTER_STATUS_CODES = frozenset(RETRY_AFTER_STATUSES)
+
+        def is_exhausted(self):
+            # Within a budget, a retry only starts when its backoff plus a full attempt still
+            # ends in time; otherwise the error goes back to the caller, whose deadline has passed
+            stop_at = getattr(_budget, 'stop_at', None)
+            if stop_at is not None and time.monotonic() + self.get_backoff_time() + _budget.attempt > stop_at:
+                return True
+            return super().is_exhausted()
+
+    return UpstreamRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+
+def build_session(pool_size=API_POOL_SIZE, retry=None):
+    """
+    Create a pooled keep-alive session with retry/backoff mounted for http and https
+    :param pool_size: int (max connections kept alive per host)
+    :param retry: urllib3 Retry (default: build_retry())
+    :return: requests.Session
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_size,
+        max_retries=retry if retry is not None else build_retry()
+    )
+    session = requests.Session()
+    session.headers.update({'Connection': 'keep-alive', 'Accept': 'application/json'})
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session():
+    """Process-wide shared session, created on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+def reset_session(session=None):
+    """
+    Replace the shared session (e.g. after fork, or with a custom one for a stub server)
+    :param session: requests.Session or None to rebuild lazily
+    """
+    global _session
+    with _session_lock:
+        if _session is not None and _session is not session:
+            _session.close()
+        _session = session
+
+def _clamp(timeout, budget):
+    # Per-attempt timeout no longer than the budget
+    if isinstance(timeout, tuple):
+        return tuple(None if t is None else min(t, budget) for t in timeout)
+    return budget if timeout is None else min(timeout, budget)
+
+def get_json(url, params, timeout=DEFAULT_TIMEOUT, session=None, budget=None):
+    """
+    GET a JSON document through the pooled session
+    :param url: str
+    :param params: dict (query parameters)
+    :param timeout: float or (connect, read) tuple
+    :param session: requests.Session (default: shared session)
+    :param budget: float (seconds the call may take, retries and backoff included; None = no limit)
+    :return: decoded JSON
+    :raises TimeoutError: when the budget is already spent
+    """
+    if budget is None:
+        response = (session or get_session()).get(url, params=params, timeout=timeout)
+    else:
+        if budget <= 0:
+            raise TimeoutError(f"No time left to call {url}")
+        timeout = _clamp(timeout, budget)
+        _budget.stop_at = time.monotonic() + budget
+        _budget.attempt = timeout[-1] if isinstance(timeout, tuple) else timeout
+        try:
+            response = (session or get_session()).get(url, params=params, timeout=timeout)
+        finally:
+            _budget.stop_at = None
+    response.raise_for_status()
+    return response.json()
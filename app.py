@@ -1,30 +1,78 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+_import_started = time.perf_counter()
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
-from timezonefinder import TimezoneFinder
-import pytz
 import json
-from datetime import datetime
 import os
-import requests
-from main import run_kp_analysis  # Ensure this import works in production
+import queue
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from main import run_kp_analysis, chart_workspace, prune_workspaces, STAGES, apply_stage, render_stage  # Ensure this import works in production
+from api_client import get_json, get_session, DEFAULT_TIMEOUT
+from response_cache import response_cache, cache_key, normalize_params
+from chart_archive import ChartArchive, chart_key, ARCHIVE_DIR
+from chart_search import ChartSearch
+from coalesce import SingleFlight
+from upstream_scheduler import upstream_scheduler, INTERACTIVE, BATCH, DEFAULT_TENANT
+from timezone_resolver import resolver, parse_birth_datetime
+from job_queue import JobQueue
+from kp_models import Chart
+from metrics import metrics
+from kp_renderers import SECTION_TITLES, OUTPUT_FORMATS, render_analysis, mark_partial
 
 app = Flask(__name__, static_folder='static')
 CORS(app)
 
 # Configuration
-DATA_DIR = os.path.join('/tmp', 'user_data')  # Explicit path for production
+DATA_DIR = os.path.join('/tmp', 'user_data')  # Parent of the per-request workspaces
+WRITE_FILES = os.environ.get('KP_WRITE_FILES', '0') == '1'  # Also keep raw JSON and text reports on disk
+WORKSPACE_TTL = float(os.environ.get('KP_WORKSPACE_TTL', 24 * 3600))  # Seconds a kept workspace stays on disk
+WORKSPACE_MAX = int(os.environ.get('KP_WORKSPACE_MAX', 1000))  # Most kept workspaces; the oldest go first
+WORKSPACE_PRUNE_INTERVAL = 60  # Seconds between sweeps of kept workspaces
+API_BASE_URL = os.environ.get('VEDIC_API_BASE_URL', 'https://api.vedicastroapi.com/v3-json').rstrip('/')
 API_ENDPOINTS = [
-    {'url': 'https://api.vedicastroapi.com/v3-json/dashas/maha-dasha', 'filename': 'input_kp_mahadasha_details.json'},
-    {'url': 'https://api.vedicastroapi.com/v3-json/dashas/antar-dasha', 'filename': 'input_kp_antardasha_details.json'},
-    {'url': 'https://api.vedicastroapi.com/v3-json/dashas/paryantar-dasha', 'filename': 'input_kp_paryantardasha_details.json'},
-    {'url': 'https://api.vedicastroapi.com/v3-json/extended-horoscope/kp-houses', 'filename': 'input_kp_house_details.json'},
-    {'url': 'https://api.vedicastroapi.com/v3-json/extended-horoscope/kp-planets', 'filename': 'input_kp_planet_details.json'},
-    {'url': 'https://api.vedicastroapi.com/v3-json/horoscope/planet-details', 'filename': 'input_kp_planet_position_details.json'},
-    {'url': 'https://api.vedicastroapi.com/v3-json/extended-horoscope/yoga-list', 'filename': 'input_kp_list_of_yogas_details.json'}
+    {'url': f'{API_BASE_URL}/dashas/maha-dasha', 'key': 'mahadasha', 'filename': 'input_kp_mahadasha_details.json', 'timeout': (3.05, 8)},
+    {'url': f'{API_BASE_URL}/dashas/antar-dasha', 'key': 'antardasha', 'filename': 'input_kp_antardasha_details.json', 'timeout': (3.05, 8)},
+    {'url': f'{API_BASE_URL}/dashas/paryantar-dasha', 'key': 'paryantardasha', 'filename': 'input_kp_paryantardasha_details.json', 'timeout': (3.05, 15)},
+    {'url': f'{API_BASE_URL}/extended-horoscope/kp-houses', 'key': 'house', 'filename': 'input_kp_house_details.json', 'timeout': (3.05, 8)},
+    {'url': f'{API_BASE_URL}/extended-horoscope/kp-planets', 'key': 'planet', 'filename': 'input_kp_planet_details.json', 'timeout': (3.05, 8)},
+    {'url': f'{API_BASE_URL}/horoscope/planet-details', 'key': 'planet_position', 'filename': 'input_kp_planet_position_details.json', 'timeout': (3.05, 8)},
+    {'url': f'{API_BASE_URL}/extended-horoscope/yoga-list', 'key': 'yoga', 'filename': 'input_kp_list_of_yogas_details.json', 'timeout': (3.05, 10)}
 ]
+FETCH_WORKERS = int(os.environ.get('API_FETCH_WORKERS', 32))  # Shared across concurrent interactive requests
+BATCH_FETCH_WORKERS = int(os.environ.get('API_BATCH_FETCH_WORKERS', 16))  # Same for batch, job and bulk charts
+REQUEST_DEADLINE = float(os.environ.get('API_REQUEST_DEADLINE', 20))  # Seconds for all endpoints of one chart
+BATCH_REQUEST_DEADLINE = float(os.environ.get('API_BATCH_REQUEST_DEADLINE', 120))  # Same for batch and job charts, which queue behind interactive ones
+ENDPOINT_RETRIES = int(os.environ.get('API_ENDPOINT_RETRIES', 1))  # Refetch rounds for a chart's failed endpoints, within its deadline
+ALLOW_PARTIAL = os.environ.get('KP_ALLOW_PARTIAL', '0') == '1'  # Default for "partial": analyse the sections that did arrive
+TENANT_HEADER = os.environ.get('KP_TENANT_HEADER', 'X-Tenant-ID')  # Client id for fair upstream sharing; else the remote address
+LOCAL_DASHAS = os.environ.get('KP_LOCAL_DASHAS', '0') == '1'  # Compute the three dasha responses instead of fetching them
+DASHA_KEYS = ('mahadasha', 'antardasha', 'paryantardasha')
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 8))  # Charts analysed concurrently per batch process
+BATCH_MAX_RECORDS = int(os.environ.get('BATCH_MAX_RECORDS', 10000))  # Upper bound on records per batch request
+DASHA_INDEX_CACHE = int(os.environ.get('DASHA_INDEX_CACHE', 256))  # Charts whose dasha index each worker keeps
+DASHA_MAX_SAMPLES = int(os.environ.get('DASHA_MAX_SAMPLES', 200000))  # Dates per dasha query (120 years daily ~ 44k)
 
-# Ensure directories exist
-os.makedirs(DATA_DIR, exist_ok=True)
+# Bounded pools used to fan out the upstream calls of each chart. Calls wait for their upstream
+# quota on a pool thread, so batch calls get a pool of their own: queued behind the interactive
+# reserve, they would otherwise hold every thread and leave interactive calls waiting for one
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='api-fetch')
+batch_fetch_executor = ThreadPoolExecutor(max_workers=BATCH_FETCH_WORKERS, thread_name_prefix='api-fetch-batch')
+
+# Identical concurrent requests share one in-flight call: upstream fetches (across workers
+# too when KP_COALESCE_DIR is set) and, within a worker, whole in-memory chart runs
+upstream_flight = SingleFlight('upstream')
+chart_flight = SingleFlight('chart', lock_dir='')
+
+# Every fetched chart's payloads as one compressed record (KP_ARCHIVE_DIR), for replay and bulk jobs
+chart_archive = ChartArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None
+
+# Bitmap index over the archived charts: one worker's background thread follows the archive and
+# saves snapshots, the others load them; queries answer from the index as it stands
+chart_search = ChartSearch(chart_archive) if chart_archive is not None else None
+
+# Separate pool for batch charts; each chart fans out on batch_fetch_executor, so sharing one pool could deadlock
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch-chart')
 
 @app.route('/')
 def serve_index():
@@ -34,81 +82,879 @@ def serve_index():
 def static_proxy(path):
     return send_from_directory(app.static_folder, path)
 
-def call_api(endpoint, params):
-    """Generic API call handler"""
+def call_api(endpoint, params, data_dir=None, priority=INTERACTIVE, tenant=DEFAULT_TENANT, deadline=REQUEST_DEADLINE,
+             stop_at=None):
+    """
+    Generic API call handler (cached, pooled session, retries transient failures, quota-scheduled)
+    :param endpoint: dict from API_ENDPOINTS
+    :param params: dict (query parameters)
+    :param data_dir: Optional request workspace the raw JSON is written to
+    :param priority: upstream_scheduler.INTERACTIVE or BATCH
+    :param tenant: str (client sharing the upstream quota fairly with others)
+    :param deadline: float (seconds the call may take, quota wait and retries included)
+    :param stop_at: Optional time.monotonic() the call must end by, in place of deadline: the
+                    request's own deadline, so time spent queued for a pool thread counts too
+    """
+    if stop_at is None:
+        stop_at = time.monotonic() + deadline
     try:
-        response = requests.get(
-            endpoint['url'],
-            params=params,
-            timeout=10
-        )
-        response.raise_for_status()
-        
-        filepath = os.path.join(DATA_DIR, endpoint['filename'])
-        with open(filepath, 'w') as f:
-            json.dump(response.json(), f, indent=2)
-            
-        return {'status': 'success', 'filename': endpoint['filename']}
+        payload = response_cache.get(endpoint['url'], params)
+        cached = payload is not None
+        metrics.inc('kp_cache_requests_total', endpoint=endpoint['key'], result='hit' if cached else 'miss')
+        coalesced = False
+        if not cached:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Request deadline passed before calling {endpoint['key']}")
+            payload, coalesced = upstream_flight.do(
+                cache_key(endpoint['url'], params), fetch_upstream, endpoint, params, priority, tenant, stop_at,
+                priority=priority, timeout=remaining
+            )
+            if coalesced:
+                metrics.inc('kp_coalesced_requests_total', layer='upstream')
+
+        # The vendor reports its own errors in the body; only 5xx ones are worth asking again
+        upstream_status = payload.get('status') if isinstance(payload, dict) else None
+        if upstream_status is not None and upstream_status != 200:
+            metrics.inc('kp_upstream_errors_total', endpoint=endpoint['key'])
+            return {
+                'status': 'error',
+                'filename': endpoint['filename'],
+                'message': f"Upstream status {upstream_status}: {payload.get('response', '')}",
+                'retryable': isinstance(upstream_status, int) and upstream_status >= 500
+            }
+
+        if data_dir:
+            filepath = os.path.join(data_dir, endpoint['filename'])
+            with open(filepath, 'w') as f:
+                json.dump(payload, f, indent=2)
+
+        return {'status': 'success', 'filename': endpoint['filename'], 'cached': cached, 'coalesced': coalesced, 'data': payload}
     except Exception as e:
-        return {'status': 'error', 'filename': endpoint['filename'], 'message': str(e)}
+        metrics.inc('kp_upstream_errors_total', endpoint=endpoint['key'])
+        return {'status': 'error', 'filename': endpoint['filename'], 'message': str(e), 'retryable': True}
+
+def fetch_upstream(endpoint, params, priority=INTERACTIVE, tenant=DEFAULT_TENANT, stop_at=None):
+    """
+    Fetch one endpoint and cache a good answer (the first caller of a coalesced call). The call
+    waits for its turn under the API key's quota; a 429 is retried after the upstream's Retry-After.
+    Queueing, the request and its transient-failure retries all end by stop_at
+    :param stop_at: time.monotonic() the call must end by (default: REQUEST_DEADLINE from now)
+    :return: decoded JSON
+    """
+    if stop_at is None:
+        stop_at = time.monotonic() + REQUEST_DEADLINE
+    if upstream_flight.lock_dir:
+        # Another worker may have stored the answer while this one waited on its lock
+        payload = response_cache.get(endpoint['url'], params)
+        if payload is not None:
+            return payload
+    payload = upstream_scheduler.call(
+        params.get('api_key', ''), get_upstream, endpoint, params, stop_at,
+        priority=priority, tenant=tenant, max_wait=max(stop_at - time.monotonic(), 0)
+    )
+    if payload.get('status') == 200:
+        response_cache.put(endpoint['url'], params, payload)
+    return payload
+
+def get_upstream(endpoint, params, stop_at=None):
+    # One upstream GET, timed once the scheduler has let it through; retries stop at stop_at
+    budget = None if stop_at is None else stop_at - time.monotonic()
+    with metrics.timer('kp_upstream_request_seconds', endpoint=endpoint['key']):
+        return get_json(endpoint['url'], params, timeout=endpoint.get('timeout', DEFAULT_TIMEOUT), budget=budget)
+
+def archive_chart(params, payloads):
+    """Record a chart's upstream payloads in the archive once; failures are only logged"""
+    if chart_archive is None:
+        return
+    try:
+        key = chart_key(params)
+        if key not in chart_archive:
+            chart_archive.put(key, {'params': normalize_params(params), 'payloads': payloads})
+    except Exception as e:
+        app.logger.warning(f"Chart archive write failed: {str(e)}")
+
+def fetch_all(params, deadline=REQUEST_DEADLINE, data_dir=None, endpoints=API_ENDPOINTS, priority=INTERACTIVE,
+              tenant=DEFAULT_TENANT):
+    """
+    Call every API endpoint concurrently
+    :param params: dict (query parameters shared by all endpoints)
+    :param deadline: float (seconds allowed for the whole set of calls)
+    :param data_dir: Optional request workspace for the raw JSON
+    :param endpoints: list of API_ENDPOINTS entries to call
+    :param priority: upstream_scheduler.INTERACTIVE or BATCH
+    :param tenant: str (client the calls are queued for)
+    :return: list of call_api results, in endpoints order
+    """
+    executor = batch_fetch_executor if priority == BATCH else fetch_executor
+    stop_at = time.monotonic() + deadline
+    futures = [
+        executor.submit(call_api, endpoint, params, data_dir, priority, tenant, stop_at=stop_at)
+        for endpoint in endpoints
+    ]
+    done, _ = wait(futures, timeout=deadline)
+
+    results = []
+    for endpoint, future in zip(endpoints, futures):
+        if future in done:
+            results.append(future.result())
+        else:
+            # Only drops a call still queued for a pool thread; a running one ends by stop_at itself
+            future.cancel()
+            results.append({
+                'status': 'error',
+                'filename': endpoint['filename'],
+                'message': f"Request deadline of {deadline}s exceeded"
+            })
+    return results
+
+def fetch_chart(params, deadline=REQUEST_DEADLINE, data_dir=None, endpoints=API_ENDPOINTS, priority=INTERACTIVE,
+                tenant=DEFAULT_TENANT, retries=ENDPOINT_RETRIES):
+    """
+    Fetch a chart's endpoints, then refetch only the failed ones while the deadline allows.
+    Good payloads are kept from the round that got them (and cached, so a retried request
+    reuses them as well); a refetch of a call still running joins it through upstream_flight
+    :param retries: int (extra rounds for failed endpoints)
+    :return: list of call_api results in endpoints order, each with the attempts it took
+    """
+    stop_at = time.monotonic() + deadline
+    results = [None] * len(endpoints)
+    pending = list(range(len(endpoints)))
+    for attempt in range(1, retries + 2):
+        remaining = stop_at - time.monotonic()
+        if remaining <= 0:
+            break
+        if attempt > 1:
+            for i in pending:
+                metrics.inc('kp_endpoint_refetches_total', endpoint=endpoints[i]['key'])
+        round_results = fetch_all(params, remaining, data_dir, [endpoints[i] for i in pending], priority, tenant)
+        failed = []
+        for i, result in zip(pending, round_results):
+            result['attempts'] = attempt
+            results[i] = result
+            if result['status'] != 'success' and result.get('retryable', True):
+                failed.append(i)
+        pending = failed
+        if not pending:
+            break
+    return results
+
+def local_dashas(planet_details, birth):
+    # NumPy and the dasha engine load on first use, or in warm_up() when preloaded
+    from kp_vimshottari import local_dasha_payloads
+    return local_dasha_payloads(planet_details, birth)
+
+def build_params(data):
+    """
+    Build upstream API parameters from the submitted birth details
+    :param data: dict with dob, tob, lat, lon
+    :return: dict of query parameters
+    """
+    # Timezone offset in effect at the birth place on the birth date and time
+    with metrics.timer('kp_timezone_seconds'):
+        offset = resolver.offset_for(data['lat'], data['lon'], data['dob'], data['tob'])
+
+    # Prepare API parameters
+    return {
+        'dob': data['dob'],
+        'tob': data['tob'],
+        'lat': data['lat'],
+        'lon': data['lon'],
+        'tz': offset,
+        'api_key': os.environ.get('VEDIC_API_KEY', '6a799635-5162-574a-970e-5d3c931c6de6'),  # Use environment variable
+        'lang': 'en'
+    }
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition, summed over all workers when KP_METRICS_DIR is set"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "status": "success",
+        "cache": response_cache.get_stats(),
+        "coalescing": {'upstream': upstream_flight.get_stats(), 'chart': chart_flight.get_stats()},
+        "archive": chart_archive.get_stats() if chart_archive is not None else None,
+        "search": chart_search.get_stats() if chart_search is not None else None,
+        "scheduler": upstream_scheduler.get_stats()
+    })
+
+@app.route('/cache/invalidate', methods=['POST'])
+def cache_invalidate():
+    """
+    Drop cached responses for one chart, or everything with {"all": true}. Other workers drop
+    theirs within API_CACHE_SYNC_INTERVAL through the shared disk tier (API_CACHE_DIR)
+    """
+    try:
+        data = request.json or {}
+        if data.get('all'):
+            response_cache.clear()
+            return jsonify({"status": "success", "message": "Cache cleared"})
+
+        required_fields = ['dob', 'tob', 'lat', 'lon']
+        if not all(field in data for field in required_fields):
+            return jsonify({"status": "error", "message": "Missing required fields"}), 400
+
+        params = build_params(data)
+        for endpoint in API_ENDPOINTS:
+            response_cache.invalidate(endpoint['url'], params)
+        return jsonify({"status": "success", "message": f"Invalidated {len(API_ENDPOINTS)} cached responses"})
+
+    except Exception as e:
+        app.logger.error(f"Error in cache-invalidate: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def run_chart(params, workspace=None, progress=None, output_format='text', priority=INTERACTIVE, tenant=DEFAULT_TENANT,
+              partial=ALLOW_PARTIAL):
+    """
+    Fetch all endpoints and run the analysis for one chart
+    :param params: dict (query parameters)
+    :param workspace: Optional request directory for raw JSON and reports
+    :param progress: Optional callable(stage) invoked as each stage starts
+    :param output_format: 'text', 'json' or 'markdown' for reports and analysis
+    :param priority: upstream_scheduler.INTERACTIVE, or BATCH for jobs and batches
+    :param tenant: str (client the upstream calls are queued for)
+    :param partial: When endpoints still fail after refetching, analyse the sections that arrived
+                    and mark the rest missing instead of failing the chart
+    :return: (response body dict, HTTP status code)
+    """
+    if progress:
+        progress('fetch')
+
+    # Dashas follow from the Moon longitude, so they can be computed locally
+    endpoints = [e for e in API_ENDPOINTS if e['key'] not in DASHA_KEYS] if LOCAL_DASHAS else API_ENDPOINTS
+
+    # Call all APIs concurrently, then only the failed ones again; batch charts may wait longer for upstream quota
+    deadline = BATCH_REQUEST_DEADLINE if priority == BATCH else REQUEST_DEADLINE
+    results = fetch_chart(params, deadline, workspace, endpoints, priority, tenant)
+
+    # Check for API errors
+    success_count = sum(1 for r in results if r['status'] == 'success')
+    failures = [{k: v for k, v in r.items() if k != 'data'} for r in results if r['status'] != 'success']
+    if success_count != len(endpoints) and not (partial and success_count):
+        return {
+            "status": "error",
+            "message": f"Only {success_count}/{len(endpoints)} files created",
+            "details": [{k: v for k, v in r.items() if k != 'data'} for r in results]
+        }, 400
+
+    # Run KP analysis in memory on the decoded responses
+    payloads = {endpoint['key']: r['data'] for endpoint, r in zip(endpoints, results) if r['status'] == 'success'}
+    if not failures:
+        archive_chart(params, payloads)
+    if LOCAL_DASHAS and 'planet_position' in payloads:
+        birth = parse_birth_datetime(params['dob'], params['tob'])
+        payloads.update(local_dashas(payloads['planet_position'], birth))
+    analysis_result = run_kp_analysis(
+        payloads, output_dir=workspace, progress=progress, output_format=output_format, partial=partial
+    )
+    if analysis_result['status'] != 'success':
+        raise Exception(analysis_result['message'])
+
+    body = {
+        "status": "success",
+        "message": "Full analysis completed",
+        "analysis": analysis_result['analysis'],
+        "reports": analysis_result['reports'],
+        "output_format": output_format,
+        "output_file": analysis_result['output_file'],
+        "generated_files": analysis_result['generated_files']
+    }
+    if analysis_result['missing']:
+        body.update({
+            "message": f"Partial analysis: {len(analysis_result['missing'])}/{len(STAGES)} sections missing",
+            "partial": True,
+            "missing_sections": analysis_result['missing'],
+            "details": failures
+        })
+    return body, 200
+
+_workspaces_swept = 0
+
+def sweep_workspaces():
+    """Apply the kept-workspace retention (KP_WORKSPACE_TTL, KP_WORKSPACE_MAX) at most once per interval"""
+    global _workspaces_swept
+    now = time.time()
+    if now - _workspaces_swept < WORKSPACE_PRUNE_INTERVAL:
+        return
+    _workspaces_swept = now
+    removed = prune_workspaces(DATA_DIR, WORKSPACE_TTL, WORKSPACE_MAX)
+    if removed:
+        app.logger.info(f"Removed {removed} expired workspaces from {DATA_DIR}")
+
+def analyze_record(data, progress=None, priority=INTERACTIVE, tenant=DEFAULT_TENANT):
+    """
+    Validate one birth record and run its chart
+    :param data: dict with dob, tob, lat, lon and optional output_format
+    :param progress: Optional callable(stage) invoked as each stage starts
+    :param priority: upstream_scheduler.INTERACTIVE, or BATCH for jobs and batches
+    :param tenant: str (client the upstream calls are queued for)
+    :return: (response body dict, HTTP status code)
+    """
+    # Validate input
+    required_fields = ['dob', 'tob', 'lat', 'lon']
+    if not isinstance(data, dict) or not all(field in data for field in required_fields):
+        return {"status": "error", "message": "Missing required fields"}, 400
+
+    output_format = data.get('output_format', 'text')
+    if output_format not in OUTPUT_FORMATS:
+        return {"status": "error", "message": f"output_format must be one of: {', '.join(OUTPUT_FORMATS)}"}, 400
+    partial = request_flag(data.get('partial', ALLOW_PARTIAL))
+
+    try:
+        params = build_params(data)
+    except ValueError as e:  # Unrecognised date or time of birth
+        return {"status": "error", "message": str(e)}, 400
+
+    # Each request gets its own workspace when files are kept, so concurrent
+    # requests never share input or output paths
+    if WRITE_FILES:
+        sweep_workspaces()
+        with chart_workspace(DATA_DIR, keep=True) as workspace:
+            return run_chart(params, workspace, progress, output_format, priority, tenant, partial)
+    if progress is not None:
+        return run_chart(params, None, progress, output_format, priority, tenant, partial)
+
+    # Duplicates of a chart already running in this worker wait for it and share its response
+    key = cache_key('run_chart', dict(params, output_format=output_format, partial=partial))
+    (body, status_code), coalesced = chart_flight.do(
+        key, lambda: run_chart(params, output_format=output_format, priority=priority, tenant=tenant, partial=partial),
+        priority=priority, timeout=BATCH_REQUEST_DEADLINE if priority == BATCH else REQUEST_DEADLINE
+    )
+    if coalesced:
+        metrics.inc('kp_coalesced_requests_total', layer='chart')
+        body = dict(body)
+    return body, status_code
+
+def request_tenant():
+    # Whose share of the upstream quota a request uses
+    return request.headers.get(TENANT_HEADER) or request.remote_addr or DEFAULT_TENANT
+
+def request_flag(value):
+    # JSON booleans, or "1"/"true"/"yes" from a query string
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+def request_record():
+    # JSON body, with ?format= as a shorthand for output_format and ?partial= for partial
+    data = request.json
+    if isinstance(data, dict) and 'format' in request.args:
+        data = dict(data, output_format=request.args['format'])
+    if isinstance(data, dict) and 'partial' in request.args:
+        data = dict(data, partial=request.args['partial'])
+    return data
+
+# Background charts: submissions return a job id at once and are polled on /jobs/<id>, which any
+# worker answers from the job files in KP_JOB_DIR
+JOB_STAGES = ['fetch'] + [stage[0] for stage in STAGES] + ['analysis']
+
+def run_job(payload, progress):
+    # Jobs are background work: their upstream calls queue behind interactive ones
+    data, tenant = payload
+    return analyze_record(data, progress, priority=BATCH, tenant=tenant)
+
+job_queue = JobQueue(run_job, stages=JOB_STAGES)
+
+def submit_job(data, tenant=DEFAULT_TENANT):
+    # 202 with the job id, or 503 when the queue is full
+    try:
+        job = job_queue.submit((data, tenant))
+    except queue.Full:
+        response = jsonify({"status": "error", "message": "Job queue is full, retry later"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return jsonify({
+        "status": "queued",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}"
+    }), 202
 
 @app.route('/generate-params', methods=['POST'])
 def generate_params():
+    try:
+        data = request_record()
+        if request.args.get('async') == '1':
+            return submit_job(data, request_tenant())
+
+        body, status_code = analyze_record(data, tenant=request_tenant())
+        return jsonify(body), status_code
+
+    except Exception as e:
+        app.logger.error(f"Error in generate-params: {str(e)}")
+        metrics.inc('kp_request_errors_total', route='generate-params')
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def sse_event(event, data):
+    # One Server-Sent Events frame; JSON keeps multi-line reports on a single data line
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_chart(params, deadline=REQUEST_DEADLINE, output_format='text', tenant=DEFAULT_TENANT, partial=ALLOW_PARTIAL,
+                 retries=ENDPOINT_RETRIES):
+    """
+    Fetch the endpoints of one chart and emit each section as soon as its response is parsed.
+    A failed endpoint is fetched again (up to `retries` times, within the deadline) before its error is sent
+    :param params: dict (query parameters)
+    :param deadline: float (seconds allowed for the whole set of calls)
+    :param output_format: 'text', 'json' or 'markdown' for the section reports
+    :param tenant: str (client the upstream calls are queued for)
+    :param partial: Also send the consolidated analysis when some sections failed, marked as partial
+    :return: iterator of SSE frames: start, section (one per report), error, done
+    """
+    endpoints = [e for e in API_ENDPOINTS if e['key'] not in DASHA_KEYS] if LOCAL_DASHAS else API_ENDPOINTS
+    stop_at = time.monotonic() + deadline
+
+    def submit(endpoint):
+        return fetch_executor.submit(call_api, endpoint, params, None, INTERACTIVE, tenant, stop_at=stop_at)
+
+    futures = {submit(endpoint): endpoint for endpoint in endpoints}
+    attempts = {endpoint['key']: 1 for endpoint in endpoints}
+    chart = Chart()
+    fetched = {}
+    completed = []
+    errors = []
+
+    yield sse_event('start', {'sections': [key for key, _, _, _ in STAGES] + ['analysis'], 'titles': SECTION_TITLES})
+
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(stop_at - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+
+        for future in done:
+            endpoint = futures.pop(future)
+            result = future.result()
+            if result['status'] != 'success':
+                if result.get('retryable') and attempts[endpoint['key']] <= retries and time.monotonic() < stop_at:
+                    attempts[endpoint['key']] += 1
+                    metrics.inc('kp_endpoint_refetches_total', endpoint=endpoint['key'])
+                    retry = submit(endpoint)
+                    futures[retry] = endpoint
+                    pending.add(retry)
+                    continue
+                errors.append({'key': endpoint['key'], 'message': result['message']})
+                yield sse_event('error', errors[-1])
+                continue
+
+            fetched[endpoint['key']] = result['data']
+            sections = {endpoint['key']: result['data']}
+            if LOCAL_DASHAS and endpoint['key'] == 'planet_position':
+                try:
+                    birth = parse_birth_datetime(params['dob'], params['tob'])
+                    sections.update(local_dashas(result['data'], birth))
+                except Exception as e:
+                    for key in DASHA_KEYS:
+                        errors.append({'key': key, 'message': str(e)})
+                        yield sse_event('error', errors[-1])
+
+            for key, data in sections.items():
+                try:
+                    apply_stage(chart, key, data)
+                    report = render_stage(chart, key, output_format)
+                except Exception as e:
+                    errors.append({'key': key, 'message': str(e)})
+                    yield sse_event('error', errors[-1])
+                    continue
+                completed.append(key)
+                yield sse_event('section', {'key': key, 'title': SECTION_TITLES[key], 'report': report})
+
+    for future in pending:
+        future.cancel()  # Queued calls only: a running one ends by stop_at itself
+        errors.append({'key': futures[future]['key'], 'message': f"Request deadline of {deadline}s exceeded"})
+        yield sse_event('error', errors[-1])
+
+    if len(fetched) == len(endpoints):
+        archive_chart(params, fetched)
+
+    # The consolidated summary needs every section, unless a partial one was asked for
+    if len(completed) == len(STAGES) or (partial and completed):
+        try:
+            report = render_analysis(chart, output_format)
+            missing = {key: 'unavailable' for key, _, _, _ in STAGES if key not in completed}
+            if missing:
+                missing.update((error['key'], error['message']) for error in errors if error['key'] in missing)
+                report = mark_partial(report, missing, output_format)
+            yield sse_event('section', {'key': 'analysis', 'title': SECTION_TITLES['analysis'], 'report': report})
+        except Exception as e:
+            errors.append({'key': 'analysis', 'message': str(e)})
+            yield sse_event('error', errors[-1])
+
+    yield sse_event('done', {
+        'status': 'error' if errors else 'success',
+        'message': f"{len(errors)} section(s) failed" if errors else "Full analysis completed",
+        'errors': errors
+    })
+
+# Dasha period queries: "what is running on date D", "what overlaps this year", daily timelines
+@lru_cache(maxsize=DASHA_INDEX_CACHE)
+def _dasha_index(params_items):
+    # Interval index for one chart, from computed or fetched (cached) dasha periods
+    from kp_dasha_index import DashaIndex
+    params = dict(params_items)
+    key = 'planet_position' if LOCAL_DASHAS else 'paryantardasha'
+    endpoint = next(e for e in API_ENDPOINTS if e['key'] == key)
+    result = call_api(endpoint, params)
+    if result['status'] != 'success':
+        raise ValueError(f"{key}: {result['message']}")
+    if LOCAL_DASHAS:
+        from kp_vimshottari import vimshottari, moon_longitude
+        birth = parse_birth_datetime(params['dob'], params['tob'])
+        return DashaIndex.from_vimshottari(vimshottari(moon_longitude(result['data']), birth, depth=3))
+    from kp_paryantardasha_parser import extract_kp_paryantardasha
+    return DashaIndex.from_series(extract_kp_paryantardasha(result['data']))
+
+def dasha_index(data):
+    """
+    Dasha interval index of a birth record, built once per chart and worker
+    :param data: dict with dob, tob, lat, lon
+    :return: kp_dasha_index.DashaIndex
+    """
+    return _dasha_index(tuple(sorted(build_params(data).items())))
+
+def dasha_query(index, data):
+    """
+    Answer the point, batch, range and timeline parts of a dasha query
+    :param index: DashaIndex
+    :param data: dict with any of at (date or list), from/to, every_days and depth
+    :return: response body dict
+    """
+    from kp_dasha_index import to_datetime64
+    depth = int(data.get('depth', index.depth))
+    body = {"status": "success", "depth": depth}
+
+    if 'at' in data:
+        dates = data['at'] if isinstance(data['at'], list) else [data['at']]
+        if len(dates) > DASHA_MAX_SAMPLES:
+            raise ValueError(f"At most {DASHA_MAX_SAMPLES} dates per query")
+        if isinstance(data['at'], list):
+            rows = index.rows_at([to_datetime64(d) for d in dates], depth).tolist()
+            body['at'] = [
+                {'date': date, 'period': index.interval(row, depth).to_dict() if row >= 0 else None}
+                for date, row in zip(dates, rows)
+            ]
+        else:
+            body['at'] = {'date': data['at'], 'periods': [p.to_dict() for p in index.period_at(data['at'], depth)]}
+
+    if 'from' in data and 'to' in data:
+        if 'every_days' in data:
+            step = float(data['every_days'])
+            span_days = (to_datetime64(data['to']) - to_datetime64(data['from'])).astype('int64') / 86400
+            if step > 0 and span_days / step > DASHA_MAX_SAMPLES:
+                raise ValueError(f"At most {DASHA_MAX_SAMPLES} dates per query")
+            body['timeline'] = [
+                {'from': first.isoformat(), 'to': last.isoformat(), 'period': period.to_dict() if period else None}
+                for first, last, period in index.timeline(data['from'], data['to'], step, depth)
+            ]
+        else:
+            body['periods'] = [p.to_dict() for p in index.periods_between(data['from'], data['to'], depth)]
+    return body
+
+@app.route('/dasha-periods', methods=['POST'])
+def dasha_periods():
+    """
+    Dasha periods of a chart by date. Body: dob, tob, lat, lon plus any of
+    at (date or list of dates), from/to (range), from/to/every_days (sampled timeline), depth (1-3)
+    """
     try:
         data = request.json
-        
-        # Validate input
         required_fields = ['dob', 'tob', 'lat', 'lon']
-        if not all(field in data for field in required_fields):
+        if not isinstance(data, dict) or not all(field in data for field in required_fields):
             return jsonify({"status": "error", "message": "Missing required fields"}), 400
+        if 'at' not in data and not ('from' in data and 'to' in data):
+            return jsonify({"status": "error", "message": "Give 'at', or 'from' and 'to'"}), 400
+        index = dasha_index(data)
+        try:
+            return jsonify(dasha_query(index, data))
+        except (ValueError, TypeError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
 
-        # Calculate timezone offset
-        tf = TimezoneFinder()
-        timezone_str = tf.timezone_at(lng=data['lon'], lat=data['lat'])
-        timezone = pytz.timezone(timezone_str)
-        offset = timezone.utcoffset(datetime.now()).total_seconds() / 3600
-
-        # Prepare API parameters
-        params = {
-            'dob': data['dob'],
-            'tob': data['tob'],
-            'lat': data['lat'],
-            'lon': data['lon'],
-            'tz': offset,
-            'api_key': os.environ.get('VEDIC_API_KEY', '6a799635-5162-574a-970e-5d3c931c6de6'),  # Use environment variable
-            'lang': 'en'
+    except Exception as e:
+        app.logger.error(f"Error in dasha-periods: {str(e)}")
+        metrics.inc('kp_request_errors_total', route='dasha-periods')
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# KP significators: which planets signify which houses, for event timing
+SIGNIFICATOR_KEYS = ('house', 'planet', 'planet_position')
+
+@app.route('/significators', methods=['POST'])
+def significators():
+    """
+    Body: birth record plus optional "houses" (e.g. [2, 7, 11]), "levels" (subset of
+    kp_significators.LEVELS) and "match" ("all" or "any"). Returns every planet's houses by
+    level, the planet x house weight matrix and, with houses, the planets signifying them
+    """
+    try:
+        from kp_significators import SignificatorMatrix, LEVELS, LEVEL_WEIGHTS
+        from kp_vimshottari import DASHA_LORDS
+        data = request.json
+        required_fields = ['dob', 'tob', 'lat', 'lon']
+        if not isinstance(data, dict) or not all(field in data for field in required_fields):
+            return jsonify({"status": "error", "message": "Missing required fields"}), 400
+        levels = data.get('levels', list(LEVELS))
+        if not isinstance(levels, list) or not levels or any(level not in LEVELS for level in levels):
+            return jsonify({"status": "error", "message": f"levels must be a list of: {', '.join(LEVELS)}"}), 400
+
+        params = build_params(data)
+        endpoints = [e for e in API_ENDPOINTS if e['key'] in SIGNIFICATOR_KEYS]
+        results = fetch_chart(params, endpoints=endpoints, tenant=request_tenant())
+        failures = [{k: v for k, v in r.items() if k != 'data'} for r in results if r['status'] != 'success']
+        if failures:
+            return jsonify({"status": "error", "message": "Upstream data unavailable", "details": failures}), 400
+
+        chart = Chart()
+        for endpoint, result in zip(endpoints, results):
+            apply_stage(chart, endpoint['key'], result['data'])
+        matrix = SignificatorMatrix.from_chart(chart)
+        body = {
+            "status": "success",
+            "planets": [lord.value for lord in DASHA_LORDS],
+            "levels": list(LEVELS),
+            "level_weights": dict(zip(LEVELS, LEVEL_WEIGHTS.tolist())),
+            "significators": matrix.to_dict(),
+            "weights": matrix.weights[0].tolist()
         }
+        if 'houses' in data:
+            try:
+                hits = matrix.signifies(data['houses'], levels, require_all=data.get('match', 'all') == 'all')[0]
+            except (ValueError, TypeError) as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
+            body['query'] = {
+                'houses': data['houses'],
+                'match': data.get('match', 'all'),
+                'planets': [DASHA_LORDS[i].value for i in hits.nonzero()[0].tolist()]
+            }
+        return jsonify(body)
 
-        # Call all APIs
-        results = []
-        for endpoint in API_ENDPOINTS:
-            results.append(call_api(endpoint, params))
-
-        # Check for API errors
-        success_count = sum(1 for r in results if r['status'] == 'success')
-        if success_count != len(API_ENDPOINTS):
-            return jsonify({
-                "status": "error",
-                "message": f"Only {success_count}/7 files created",
-                "details": results
-            }), 400
-
-        # Run KP analysis
-        analysis_result = run_kp_analysis()
-        if analysis_result['status'] != 'success':
-            raise Exception(analysis_result['message'])
+    except Exception as e:
+        app.logger.error(f"Error in significators: {str(e)}")
+        metrics.inc('kp_request_errors_total', route='significators')
+        return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/charts/search', methods=['POST'])
+def search_charts():
+    """
+    Boolean queries over every archived chart. Body: {"query": ..., "limit": 100} where a query
+    is a term such as "planet_house:Jupiter:10", "cusp_sub_lord:7:Venus", "nakshatra:Moon:Rohini",
+    "yoga:Raja Yoga>=80" or "yoga_type:raja>=80", or {"and"|"or": [queries]} / {"not": query}.
+    Charts archived since the last snapshot count once the indexer reaches them ("complete")
+    """
+    try:
+        if chart_search is None:
+            return jsonify({"status": "error", "message": "Chart search needs KP_ARCHIVE_DIR"}), 400
+        data = request.json
+        if not isinstance(data, dict) or 'query' not in data:
+            return jsonify({"status": "error", "message": "Missing query"}), 400
+
+        started = time.perf_counter()
+        chart_search.refresh()
+        try:
+            result = chart_search.search(data['query'], limit=int(data.get('limit', 100)))
+        except (ValueError, TypeError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
         return jsonify({
             "status": "success",
-            "message": "Full analysis completed",
-            "output_file": analysis_result['output_file'],
-            "generated_files": analysis_result['generated_files']
+            "count": result['count'],
+            "charts": result['keys'],
+            "complete": chart_search.caught_up(),
+            "seconds": round(time.perf_counter() - started, 6)
         })
 
     except Exception as e:
-        app.logger.error(f"Error in generate-params: {str(e)}")
+        app.logger.error(f"Error in charts-search: {str(e)}")
+        metrics.inc('kp_request_errors_total', route='charts-search')
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/generate-stream', methods=['GET', 'POST'])
+def generate_stream():
+    """Same input as /generate-params (JSON body, or query string for EventSource); streams SSE sections"""
+    try:
+        data = request_record() if request.method == 'POST' else request.args.to_dict()
+        required_fields = ['dob', 'tob', 'lat', 'lon']
+        if not isinstance(data, dict) or not all(field in data for field in required_fields):
+            return jsonify({"status": "error", "message": "Missing required fields"}), 400
+        output_format = data.get('output_format', data.get('format', 'text'))
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({"status": "error", "message": f"output_format must be one of: {', '.join(OUTPUT_FORMATS)}"}), 400
+
+        params = build_params(data)
+        return Response(
+            stream_with_context(stream_chart(
+                params, output_format=output_format, tenant=request_tenant(),
+                partial=request_flag(data.get('partial', ALLOW_PARTIAL))
+            )),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    except Exception as e:
+        app.logger.error(f"Error in generate-stream: {str(e)}")
+        metrics.inc('kp_request_errors_total', route='generate-stream')
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue one chart; poll /jobs/<id> for progress and the result"""
+    try:
+        data = request_record()
+        required_fields = ['dob', 'tob', 'lat', 'lon']
+        if not isinstance(data, dict) or not all(field in data for field in required_fields):
+            return jsonify({"status": "error", "message": "Missing required fields"}), 400
+        return submit_job(data, request_tenant())
+
+    except Exception as e:
+        app.logger.error(f"Error in jobs: {str(e)}")
+        metrics.inc('kp_request_errors_total', route='jobs')
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    return jsonify({"status": "success", "jobs": job_queue.get_stats()})
+
+def batch_records(req):
+    """
+    Birth records of a batch request, read lazily
+    :param req: Flask request with a JSON list (or {"records": [...]}) or an NDJSON body
+    :return: iterator of records; undecodable NDJSON lines are yielded as ValueError
+    """
+    if req.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+        for line in req.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f"Invalid JSON line: {str(e)}")
+        return
+
+    data = req.get_json()
+    records = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        raise ValueError("Expected a list of birth records")
+    yield from records
+
+def _batch_line(index, record, outcome):
+    # One NDJSON result line; the caller's own id is echoed back when given
+    line = {'index': index}
+    if isinstance(record, dict) and 'id' in record:
+        line['id'] = record['id']
+    if isinstance(outcome, Exception):
+        line.update({'status': 'error', 'code': 500, 'message': str(outcome)})
+    else:
+        body, status_code = outcome
+        line.update(body)
+        line['code'] = status_code
+    return json.dumps(line) + '\n'
+
+def _run_record(record, tenant):
+    if isinstance(record, Exception):  # An NDJSON line that didn't decode
+        return {"status": "error", "message": str(record)}, 400
+    return analyze_record(record, priority=BATCH, tenant=tenant)
+
+def stream_batch(records, workers=BATCH_WORKERS, max_records=BATCH_MAX_RECORDS, tenant=DEFAULT_TENANT):
+    """
+    Analyse records with at most `workers` charts in flight, yielding NDJSON lines as charts finish
+    :param records: iterable of birth records
+    :param workers: int (concurrent charts)
+    :param max_records: int (records beyond this are reported as errors, not run)
+    :param tenant: str (client the batch's upstream calls are queued for, at batch priority)
+    :return: iterator of NDJSON lines, in completion order
+    """
+    pending = {}
+    records = iter(records)
+    index = 0
+    exhausted = False
+
+    while pending or not exhausted:
+        # Keep the window full without reading the whole input up front
+        while not exhausted and len(pending) < workers:
+            try:
+                record = next(records)
+            except StopIteration:
+                exhausted = True
+                break
+            except Exception as e:
+                exhausted = True
+                yield _batch_line(index, None, e)
+                break
+            if index >= max_records:
+                exhausted = True
+                yield _batch_line(index, record, ({"status": "error", "message": f"Batch limited to {max_records} records"}, 400))
+                break
+            pending[batch_executor.submit(_run_record, record, tenant)] = (index, record)
+            index += 1
+
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index_done, record = pending.pop(future)
+            try:
+                outcome = future.result()
+            except Exception as e:
+                app.logger.error(f"Error in batch record {index_done}: {str(e)}")
+                outcome = e
+            yield _batch_line(index_done, record, outcome)
+
+@app.route('/batch-analyze', methods=['POST'])
+def batch_analyze():
+    """Analyse many birth records, streaming one NDJSON line per chart as it completes"""
+    try:
+        workers = min(int(request.args.get('workers', BATCH_WORKERS)), BATCH_WORKERS)
+        records = batch_records(request)
+        if request.mimetype not in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+            # Surface a malformed JSON body as a plain 400 before streaming starts
+            records = list(records)
+        batch = stream_batch(records, max(workers, 1), tenant=request_tenant())
+        return Response(stream_with_context(batch), mimetype='application/x-ndjson')
+
+    except Exception as e:
+        app.logger.error(f"Error in batch-analyze: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+# Startup
+STARTUP = {}  # Seconds spent importing this module and in warm_up()
+
+def _warm_tables():
+    # strptime compiles its format regexes on first use
+    parse_birth_datetime('01/01/2000', '00:00')
+    # NumPy, the dasha engine, the interval index and the significator engine
+    import kp_dasha_index
+    import kp_significators
+
+def warm_up():
+    """
+    Do the work the first request would otherwise pay for: timezone polygons and pytz,
+    the pooled upstream session and lazily built tables. Called once in the gunicorn master
+    with preload (see gunicorn.conf.py) so forked workers share it copy-on-write.
+    Makes no upstream calls and starts no threads, so it is safe before fork
+    :return: dict of seconds per step
+    """
+    timings = {}
+    for name, step in (('timezone', resolver.warm_up), ('session', get_session), ('tables', _warm_tables)):
+        started = time.perf_counter()
+        step()
+        timings[name] = round(time.perf_counter() - started, 4)
+    STARTUP['warm_up'] = timings
+    app.logger.info(
+        f"Startup: app imported in {STARTUP['import']:.3f}s, warm-up {sum(timings.values()):.3f}s "
+        f"({', '.join(f'{name} {seconds:.3f}s' for name, seconds in timings.items())})"
+    )
+    return timings
+
+STARTUP['import'] = round(time.perf_counter() - _import_started, 4)
+
 if __name__ == '__main__':
+    warm_up()
     port = int(os.environ.get("PORT", 8080))  # Render provides PORT environment variable
     app.run(host='0.0.0.0', port=port, debug=False)  # Debug=False for production
\ No newline at end of file
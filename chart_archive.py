@@ -0,0 +1,358 @@
+# chart_archive.py
+import os
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from response_cache import normalize_params
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): one writing process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+ARCHIVE_DIR = os.environ.get('KP_ARCHIVE_DIR', '')  # Empty disables archiving fetched charts
+ARCHIVE_COMPRESS_LEVEL = int(os.environ.get('KP_ARCHIVE_COMPRESS_LEVEL', 6))  # zlib level, 1 (fast) - 9 (small)
+ARCHIVE_READ_BUFFER = 1 << 20  # Bytes per read when streaming the segment
+
+SEGMENT_NAME = 'charts.seg'
+INDEX_NAME = 'charts.idx'
+LOCK_NAME = 'charts.lock'
+
+# Segment record: magic, chart key (sha256), compressed length, crc32 of the compressed bytes
+RECORD_HEADER = struct.Struct('<4s32sII')
+RECORD_MAGIC = b'KPR1'
+
+# Index: header, then open-addressing slots of (chart key, record offset, record length, unused)
+INDEX_HEADER = struct.Struct('<4sIQQQ')  # magic, version, capacity, count, segment bytes indexed
+INDEX_MAGIC = b'KPIX'
+INDEX_VERSION = 1
+INDEX_HEADER_SIZE = 64
+SLOT = struct.Struct('<32sQII')
+EMPTY_KEY = bytes(32)
+INITIAL_CAPACITY = 1024
+MAX_LOAD = 0.7
+
+def chart_key(params):
+    """
+    Address of one chart: sha256 of its normalized birth parameters (api_key excluded)
+    :param params: dict (API query parameters)
+    :return: 32 bytes
+    """
+    material = json.dumps(normalize_params(params), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(material.encode('utf-8')).digest()
+
+def encode_record(key, document, level=ARCHIVE_COMPRESS_LEVEL):
+    """Compact JSON, zlib-compressed, behind a record header"""
+    body = zlib.compress(json.dumps(document, separators=(',', ':')).encode('utf-8'), level)
+    return RECORD_HEADER.pack(RECORD_MAGIC, key, len(body), zlib.crc32(body)) + body
+
+def decode_record(data, key=None):
+    """
+    :param data: bytes of one whole record
+    :return: (key, document)
+    :raises ValueError: on a damaged record or a key mismatch
+    """
+    magic, record_key, length, crc = RECORD_HEADER.unpack_from(data)
+    body = data[RECORD_HEADER.size:RECORD_HEADER.size + length]
+    if magic != RECORD_MAGIC or len(body) != length or zlib.crc32(body) != crc:
+        raise ValueError("Damaged archive record")
+    if key is not None and record_key != key:
+        raise ValueError("Archive index points at another chart")
+    return record_key, json.loads(zlib.decompress(body))
+
+class ChartArchive:
+    """
+    All upstream payloads of a chart in one compressed record, appended to a single segment
+    file and found through a memory-mapped open-addressing index (one probe sequence per
+    lookup). Writers in several processes serialize on a file lock; readers never lock: a
+    grown index is mapped anew and the old map stays valid for readers still probing it.
+    Re-archiving a chart appends a new record and repoints the index
+    """
+
+    def __init__(self, directory, compress_level=ARCHIVE_COMPRESS_LEVEL):
+        self.directory = directory
+        self.compress_level = compress_level
+        self.segment_path = os.path.join(directory, SEGMENT_NAME)
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self._lock = threading.RLock()
+        self._segment_fd = None  # Files open on first use, so a preloaded master shares nothing
+        self._index = None
+        self._index_inode = None
+
+    # Files
+    def _open(self):
+        if self._segment_fd is not None:
+            return
+        with self._lock:
+            if self._segment_fd is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._segment_fd = os.open(self.segment_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            with self._write_lock():
+                if not os.path.exists(self.index_path):
+                    self._write_index(self.index_path, INITIAL_CAPACITY, [], 0)
+                self._map_index()
+                self._recover()
+
+    def _map_index(self):
+        # The new map replaces the old one without closing it: readers that still hold the
+        # old map finish their probe on it, and it is unmapped once the last one drops it
+        with open(self.index_path, 'r+b') as f:
+            index = mmap.mmap(f.fileno(), 0)
+            inode = os.fstat(f.fileno()).st_ino
+        magic, version, _, _, _ = INDEX_HEADER.unpack_from(index)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            index.close()
+            raise ValueError(f"Not a chart archive index: {self.index_path}")
+        self._index, self._index_inode = index, inode
+        return index
+
+    def _refresh_index(self):
+        # Another process may have grown the index into a new file
+        try:
+            if os.stat(self.index_path).st_ino != self._index_inode:
+                with self._lock:
+                    if os.stat(self.index_path).st_ino != self._index_inode:
+                        self._map_index()
+                return True
+        except FileNotFoundError:
+            pass
+        return False
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, LOCK_NAME), 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            # Dropped, not closed: a reader may still be probing it
+            self._index = None
+            if self._segment_fd is not None:
+                os.close(self._segment_fd)
+                self._segment_fd = None
+
+    # Index
+    def _header(self):
+        return INDEX_HEADER.unpack_from(self._index)
+
+    def _probe(self, key, index):
+        # Slot holding key, or the empty slot where it would go. Readers pass the map they
+        # took a reference to, so a concurrent grow cannot swap it out mid-probe
+        _, _, capacity, _, _ = INDEX_HEADER.unpack_from(index)
+        slot = int.from_bytes(key[:8], 'little') % capacity
+        while True:
+            position = INDEX_HEADER_SIZE + slot * SLOT.size
+            slot_key = index[position:position + 32]
+            if slot_key == key or slot_key == EMPTY_KEY:
+                return position, slot_key == key
+            slot = (slot + 1) % capacity
+
+    def _lookup(self, key):
+        index = self._index
+        position, found = self._probe(key, index)
+        if not found and (self._refresh_index() or self._index is not index):
+            index = self._index
+            position, found = self._probe(key, index)
+        if not found:
+            return None
+        _, offset, length, _ = SLOT.unpack_from(index, position)
+        return offset, length
+
+    @staticmethod
+    def _write_index(path, capacity, entries, segment_bytes):
+        # Fresh index file holding `entries` [(key, offset, length)], swapped in atomically
+        table = bytearray(INDEX_HEADER_SIZE + capacity * SLOT.size)
+        INDEX_HEADER.pack_into(table, 0, INDEX_MAGIC, INDEX_VERSION, capacity, len(entries), segment_bytes)
+        for key, offset, length in entries:
+            slot = int.from_bytes(key[:8], 'little') % capacity
+            while table[INDEX_HEADER_SIZE + slot * SLOT.size:INDEX_HEADER_SIZE + slot * SLOT.size + 32] != EMPTY_KEY:
+                slot = (slot + 1) % capacity
+            SLOT.pack_into(table, INDEX_HEADER_SIZE + slot * SLOT.size, key, offset, length, 0)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(table)
+        os.replace(tmp_path, path)
+
+    def _entries(self):
+        _, _, capacity, _, _ = self._header()
+        for slot in range(capacity):
+            key, offset, length, _ = SLOT.unpack_from(self._index, INDEX_HEADER_SIZE + slot * SLOT.size)
+            if key != EMPTY_KEY:
+                yield key, offset, length
+
+    def _insert(self, key, offset, length, segment_bytes):
+        # Caller holds the write lock
+        _, _, capacity, count, _ = self._header()
+        position, found = self._probe(key, self._index)
+        if not found and count + 1 > capacity * MAX_LOAD:
+            entries = list(self._entries()) + [(key, offset, length)]
+            self._write_index(self.index_path, capacity * 2, entries, segment_bytes)
+            self._map_index()
+            return
+        # Offset and length land before the key, so a concurrent reader never sees a half slot
+        self._index[position + 32:position + SLOT.size] = SLOT.pack(key, offset, length, 0)[32:]
+        self._index[position:position + 32] = key
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, INDEX_VERSION, capacity, count + (not found), segment_bytes)
+
+    def _recover(self):
+        # Index records a crash left unindexed, and cut off a half-written tail
+        _, _, _, _, indexed = self._header()
+        size = os.fstat(self._segment_fd).st_size
+        if indexed >= size:
+            return
+        good = indexed
+        for offset, length, key, _ in self._scan(indexed, decode=False):
+            self._insert(key, offset, length, offset + length)
+            good = offset + length
+        if good < size:
+            logger.warning(f"Truncating {size - good} damaged bytes at the end of {self.segment_path}")
+            os.ftruncate(self._segment_fd, good)
+            _, _, capacity, count, _ = self._header()
+            INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, INDEX_VERSION, capacity, count, good)
+
+    # Records
+    def put(self, key, document):
+        """
+        Append a chart's record and index it
+        :param key: 32-byte chart key (see chart_key)
+        :param document: JSON-serializable dict (e.g. params and payloads)
+        :return: (offset, length) of the record
+        """
+        self._open()
+        record = encode_record(key, document, self.compress_level)
+        with self._write_lock():
+            self._refresh_index()
+            offset = os.fstat(self._segment_fd).st_size
+            os.write(self._segment_fd, record)
+            self._insert(key, offset, len(record), offset + len(record))
+        return offset, len(record)
+
+    def get(self, key):
+        """
+        :param key: 32-byte chart key
+        :return: archived document, or None
+        """
+        self._open()
+        location = self._lookup(key)
+        if location is None:
+            return None
+        offset, length = location
+        return decode_record(os.pread(self._segment_fd, length, offset), key)[1]
+
+    def __contains__(self, key):
+        self._open()
+        return self._lookup(key) is not None
+
+    def __len__(self):
+        self._open()
+        self._refresh_index()
+        return self._header()[3]
+
+    def _scan(self, start=0, decode=True):
+        # Records in segment order: (offset, length, key, document or compressed body)
+        with open(self.segment_path, 'rb', buffering=ARCHIVE_READ_BUFFER) as f:
+            f.seek(start)
+            offset = start
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                magic, key, length, crc = RECORD_HEADER.unpack(header)
+                body = f.read(length)
+                if magic != RECORD_MAGIC or len(body) != length or zlib.crc32(body) != crc:
+                    return
+                total = RECORD_HEADER.size + length
+                yield offset, total, key, (json.loads(zlib.decompress(body)) if decode else body)
+                offset += total
+
+    def scan(self, start=0):
+        """
+        Records from a segment offset on, in append order (replaced ones included)
+        :return: iterator of (offset after the record, key, document)
+        """
+        self._open()
+        for offset, length, key, document in self._scan(start):
+            yield offset + length, key, document
+
+    def iter_charts(self, latest_only=True):
+        """
+        Stream every archived chart with one sequential pass over the segment
+        :param latest_only: Skip records a later put() replaced
+        :return: iterator of (key, document)
+        """
+        self._open()
+        for offset, _, key, body in self._scan(decode=False):
+            if latest_only:
+                location = self._lookup(key)
+                if location is None or location[0] != offset:
+                    continue
+            yield key, json.loads(zlib.decompress(body))
+
+    def get_stats(self):
+        self._open()
+        self._refresh_index()
+        _, _, capacity, count, indexed = self._header()
+        return {
+            'charts': count,
+            'segment_bytes': indexed,
+            'index_capacity': capacity,
+            'index_bytes': INDEX_HEADER_SIZE + capacity * SLOT.size
+        }
+
+def archive_workspace(archive, directory, file_paths, params=None):
+    """
+    Move one per-file workspace (input_kp_*.json) into the archive
+    :param file_paths: dict of stage -> (input file, output file), as main.FILE_PATHS
+    :param params: Birth parameters the payloads belong to; default: keyed on the directory
+    :return: chart key, or None when the set is incomplete
+    """
+    payloads = {}
+    for key, (input_file, _) in file_paths.items():
+        path = os.path.join(directory, input_file)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            payloads[key] = json.load(f)
+    key = chart_key(params) if params else hashlib.sha256(os.path.abspath(directory).encode('utf-8')).digest()
+    archive.put(key, {'params': normalize_params(params) if params else None, 'source': directory, 'payloads': payloads})
+    return key
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from main import FILE_PATHS, run_kp_analysis
+    # Usage: python chart_archive.py ARCHIVE_DIR stats | import WORKSPACE_ROOT | replay
+    archive = ChartArchive(sys.argv[1])
+    command = sys.argv[2] if len(sys.argv) > 2 else 'stats'
+    started = time.perf_counter()
+    if command == 'import':
+        imported = 0
+        for dirpath, dirnames, _ in os.walk(sys.argv[3]):
+            dirnames.sort()
+            imported += archive_workspace(archive, dirpath, FILE_PATHS) is not None
+        print(f"Imported {imported} charts in {time.perf_counter() - started:.2f}s")
+    elif command == 'replay':
+        for name in ('KPCleaner', 'KPAnalysis', 'main'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+        results = {}
+        for _, document in archive.iter_charts():
+            status = run_kp_analysis(document['payloads'])['status']
+            results[status] = results.get(status, 0) + 1
+        print(f"Replayed {sum(results.values())} charts in {time.perf_counter() - started:.2f}s: {results}")
+    print(json.dumps(archive.get_stats()))
@@ -0,0 +1,423 @@
+# chart_search.py
+import os
+import re
+import json
+import zlib
+import time
+import struct
+import logging
+import threading
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): every process indexes the archive itself
+    fcntl = None
+from kp_models import Chart, planet_name, label
+from main import apply_stage
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SEARCH_SNAPSHOT = os.environ.get('KP_SEARCH_SNAPSHOT', '')  # Saved index; default charts.search in the archive dir
+SEARCH_SNAPSHOT_EVERY = int(os.environ.get('KP_SEARCH_SNAPSHOT_EVERY', 10000))  # New charts between snapshot saves
+SEARCH_INDEX_INTERVAL = float(os.environ.get('KP_SEARCH_INDEX_INTERVAL', 30))  # Seconds between background catch-ups; 0 leaves indexing to `python chart_search.py`
+YOGA_STRENGTH_BUCKET = 10  # Percent per yoga strength bucket
+YOGA_BUCKETS = tuple(range(0, 100 + YOGA_STRENGTH_BUCKET, YOGA_STRENGTH_BUCKET))
+YOGA_TYPES = ('raja', 'dhana', 'daridra')  # Words in a yoga's name that give its type
+
+SNAPSHOT_VERSION = 1
+STAGES = ('house', 'planet', 'yoga')  # Parsed sections the index reads
+
+# Terms: one bitmap each, bit i set when chart i has the property
+def _word(text):
+    return ' '.join(str(text).lower().split())
+
+def _planet(text):
+    return label(planet_name(str(text).strip()))
+
+def _bucket(strength):
+    return min(int(float(strength) // YOGA_STRENGTH_BUCKET) * YOGA_STRENGTH_BUCKET, 100)
+
+def chart_terms(chart):
+    """
+    Index terms of a parsed chart
+    :param chart: Chart with kp_planets (or planets), houses and yogas
+    :return: set of str
+    """
+    terms = set()
+    for planet in chart.kp_planets or chart.planets or ():
+        name = label(planet.planet)
+        if planet.house is not None:
+            terms.add(f"planet_house:{name}:{int(planet.house)}")
+        if planet.nakshatra:
+            terms.add(f"nakshatra:{name}:{_word(planet.nakshatra)}")
+    for house in chart.houses or ():
+        if house.cusp_sub_lord is not None:
+            terms.add(f"cusp_sub_lord:{int(house.house)}:{label(house.cusp_sub_lord)}")
+    for yoga in chart.yogas or ():
+        bucket = _bucket(yoga.strength or 0)
+        name = _word(yoga.name)
+        terms.add(f"yoga:{name}:{bucket}")
+        for yoga_type in YOGA_TYPES:
+            if yoga_type in name.split():
+                terms.add(f"yoga_type:{yoga_type}:{bucket}")
+    return terms
+
+YOGA_LEAF = re.compile(r"^(yoga|yoga_type):(.+?)(?:\s*>=\s*(\d+))?$")
+
+def leaf_terms(leaf):
+    """
+    Terms a query leaf stands for (OR-ed together)
+    :param leaf: 'planet_house:Jupiter:10', 'cusp_sub_lord:7:Venus', 'nakshatra:Moon:Rohini',
+                 'yoga:Raja Yoga', 'yoga:Raja Yoga>=80' or 'yoga_type:raja>=80'
+    :return: list of str
+    :raises ValueError: for malformed leaves
+    """
+    field, _, rest = str(leaf).partition(':')
+    parts = rest.split(':')
+    try:
+        if field == 'planet_house' and len(parts) == 2:
+            return [f"planet_house:{_planet(parts[0])}:{int(parts[1])}"]
+        if field == 'cusp_sub_lord' and len(parts) == 2:
+            return [f"cusp_sub_lord:{int(parts[0])}:{_planet(parts[1])}"]
+        if field == 'nakshatra' and len(parts) == 2:
+            return [f"nakshatra:{_planet(parts[0])}:{_word(parts[1])}"]
+    except ValueError:
+        pass
+    match = YOGA_LEAF.match(str(leaf))
+    if match:
+        field, name, minimum = match.groups()
+        minimum = int(minimum or 0)
+        if minimum % YOGA_STRENGTH_BUCKET:
+            raise ValueError(f"Yoga strength thresholds are multiples of {YOGA_STRENGTH_BUCKET}")
+        return [f"{field}:{_word(name)}:{bucket}" for bucket in YOGA_BUCKETS if bucket >= minimum]
+    raise ValueError(f"Unrecognised query term: {leaf}")
+
+class ChartSearch:
+    """
+    Inverted index over many charts: a bitmap per term (planet in house, cusp sub lord,
+    planet in nakshatra, yoga by strength bucket). Bitmaps are bytearrays while charts are
+    added and Python ints when queried, so a boolean query is a few big-int &, | and ~
+    operations. Replaced charts are tombstoned rather than cleared from every bitmap.
+    Following an archive, the whole catch-up runs in build(): in a background thread started
+    on first use, or offline with `python chart_search.py <archive>`. Of the processes sharing
+    a snapshot, only the one holding its lock file runs build(); the others load the snapshots
+    it saves. Queries never read the archive: they answer from the index as it stands
+    """
+
+    def __init__(self, archive=None, snapshot_path=SEARCH_SNAPSHOT, index_interval=SEARCH_INDEX_INTERVAL):
+        """
+        :param archive: Optional ChartArchive to follow
+        :param snapshot_path: Where save()/load() keep the index between restarts
+        :param index_interval: Seconds between background build() passes, 0 for none
+        """
+        self.archive = archive
+        self.snapshot_path = snapshot_path or (os.path.join(archive.directory, 'charts.search') if archive else '')
+        self.index_interval = index_interval
+        self.keys = []  # chart id -> key (hex)
+        self.ids = {}  # key -> current chart id
+        self.segment_offset = 0  # Archive bytes already indexed
+        self._bits = {}  # term -> bytearray
+        self._ints = {}  # term -> int, built on first query after a change
+        self._deleted = bytearray()
+        self._lock = threading.RLock()
+        self._catch_up_lock = threading.Lock()  # One reader of the archive at a time
+        self._snapshot_version = None
+        self._indexer = None
+        self._indexer_lock = None  # Lock file held for the life of the indexing process
+        self._unsaved = 0
+
+    # Building
+    @staticmethod
+    def _set(bits, chart_id):
+        byte = chart_id >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(max(byte + 1 - len(bits), len(bits))))
+        bits[byte] |= 1 << (chart_id & 7)
+
+    def add(self, key, chart):
+        """
+        Index one chart; a key seen before replaces its earlier chart
+        :param key: str (chart key, e.g. hex of chart_archive.chart_key)
+        :param chart: Chart
+        :return: chart id
+        """
+        terms = chart_terms(chart)
+        with self._lock:
+            previous = self.ids.get(key)
+            if previous is not None:
+                self._set(self._deleted, previous)
+                self._ints.pop(None, None)
+            chart_id = len(self.keys)
+            self.keys.append(key)
+            self.ids[key] = chart_id
+            for term in terms:
+                self._set(self._bits.setdefault(term, bytearray()), chart_id)
+                self._ints.pop(term, None)
+            self._unsaved += 1
+        return chart_id
+
+    @staticmethod
+    def _parse(payloads):
+        # Only the indexed sections are parsed
+        chart = Chart()
+        for stage in STAGES:
+            if stage in payloads:
+                apply_stage(chart, stage, payloads[stage])
+        if chart.kp_planets is None and 'planet_position' in payloads:
+            apply_stage(chart, 'planet_position', payloads['planet_position'])
+        return chart
+
+    def add_payloads(self, key, payloads):
+        """Index a chart from its decoded upstream responses"""
+        return self.add(key, self._parse(payloads))
+
+    # Following the archive
+    def _catch_up(self, limit=None):
+        # Index records past segment_offset; the caller holds _catch_up_lock
+        added = read = 0
+        for offset, key, document in self.archive.scan(self.segment_offset):
+            try:
+                chart = self._parse(document.get('payloads', {}))
+            except Exception as e:
+                logger.warning(f"Skipping archived chart {key.hex()}: {str(e)}")
+                chart = None
+            with self._lock:
+                if chart is not None:
+                    self.add(key.hex(), chart)
+                    added += 1
+                self.segment_offset = offset
+            read += 1
+            if self._unsaved >= SEARCH_SNAPSHOT_EVERY and self.snapshot_path:
+                self.save()
+            if limit is not None and read >= limit:
+                break
+        return added
+
+    def _reload(self):
+        # Load the snapshot when it changed on disk since this process last saw it and is ahead of the index
+        try:
+            stat = os.stat(self.snapshot_path)
+        except OSError:
+            return False
+        # Every save replaces the file, so the inode changes even within one mtime tick
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._snapshot_version:
+            return False
+        self._snapshot_version = version
+        return self.load(ahead_of=self.segment_offset if self.keys else None)
+
+    def refresh(self):
+        """
+        Load a newer snapshot (saved by the indexing process or the command line) for a query.
+        Never reads the archive, and does nothing while a build() is running
+        :return: True when a snapshot was loaded
+        """
+        if self.archive is None:
+            return False
+        self._ensure_indexer()
+        if not self._catch_up_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._reload()
+        finally:
+            self._catch_up_lock.release()
+
+    def build(self):
+        """
+        Index everything appended to the archive since the last snapshot, saving a snapshot
+        every SEARCH_SNAPSHOT_EVERY charts and at the end. Unbounded: never call it from a request
+        :return: number of charts added
+        """
+        if self.archive is None:
+            return 0
+        with self._catch_up_lock:
+            self._reload()
+            added = self._catch_up()
+            if self._unsaved and self.snapshot_path:
+                self.save()
+            return added
+
+    def caught_up(self):
+        """True when every archived record is indexed"""
+        return self.archive is None or self.segment_offset >= self.archive.get_stats()['segment_bytes']
+
+    def _ensure_indexer(self):
+        # The thread starts on first use, so importing the app doesn't spawn it (or fork it)
+        if not self.index_interval or self._indexer is not None:
+            return
+        with self._lock:
+            if self._indexer is not None:
+                return
+            self._indexer = threading.Thread(target=self._index_loop, name='chart-search-index', daemon=True)
+            self._indexer.start()
+
+    def _index_loop(self):
+        # Every process keeps trying for the lock file, so another takes over when the indexer exits
+        while True:
+            try:
+                if self.is_indexer():
+                    added = self.build()
+                    if added:
+                        logger.info(f"Chart search indexed {added} archived charts")
+                else:
+                    self.refresh()
+            except Exception as e:
+                logger.warning(f"Chart search indexing failed: {str(e)}")
+            time.sleep(self.index_interval)
+
+    def is_indexer(self):
+        """
+        Take the snapshot's lock file if no other process holds it
+        :return: True when this process indexes the archive for everyone sharing the snapshot
+        """
+        if self._indexer_lock is not None or fcntl is None or not self.snapshot_path:
+            return True
+        f = open(f"{self.snapshot_path}.lock", 'a')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._indexer_lock = f
+        return True
+
+    # Querying
+    def _term(self, term):
+        value = self._ints.get(term)
+        if value is None:
+            bits = self._deleted if term is None else self._bits.get(term)
+            value = int.from_bytes(bits, 'little') if bits else 0
+            self._ints[term] = value
+        return value
+
+    def _live(self):
+        return ((1 << len(self.keys)) - 1) & ~self._term(None)
+
+    def _evaluate(self, query):
+        if isinstance(query, str):
+            result = 0
+            for term in leaf_terms(query):
+                result |= self._term(term)
+            return result
+        if isinstance(query, dict) and len(query) == 1:
+            operator, operands = next(iter(query.items()))
+            if operator == 'not':
+                return self._live() & ~self._evaluate(operands)
+            if operator in ('and', 'or') and isinstance(operands, list) and operands:
+                values = [self._evaluate(operand) for operand in operands]
+                result = values[0]
+                for value in values[1:]:
+                    result = result & value if operator == 'and' else result | value
+                return result
+        raise ValueError(f"Malformed query: {json.dumps(query)}")
+
+    def search(self, query, limit=100):
+        """
+        Run a boolean query
+        :param query: leaf string, or {"and": [...]}, {"or": [...]}, {"not": query} nested freely
+        :param limit: Chart keys to return (the count is always exact)
+        :return: dict with count and keys
+        :raises ValueError: for malformed queries
+        """
+        with self._lock:
+            matches = self._evaluate(query) & self._live()
+            keys = []
+            if limit and matches:
+                raw = matches.to_bytes((matches.bit_length() + 7) // 8, 'little')
+                for found in re.finditer(rb'[^\x00]', raw):
+                    byte = found.start()
+                    for bit in range(8):
+                        if raw[byte] >> bit & 1:
+                            keys.append(self.keys[byte * 8 + bit])
+                    if len(keys) >= limit:
+                        break
+            return {'count': matches.bit_count(), 'keys': keys[:limit]}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'charts': len(self.keys) - self._term(None).bit_count(),
+                'terms': len(self._bits),
+                'bitmap_bytes': sum(len(bits) for bits in self._bits.values()),
+                'segment_offset': self.segment_offset
+            }
+
+    # Snapshot: JSON header line, then every bitmap, zlib-compressed as one stream
+    def save(self, path=None):
+        """Write the index to a snapshot; bitmaps are copied under the lock and compressed outside it"""
+        path = path or self.snapshot_path
+        with self._lock:
+            terms = [(term, bytes(bits)) for term, bits in self._bits.items()] + [(None, bytes(self._deleted))]
+            header = json.dumps({
+                'version': SNAPSHOT_VERSION,
+                'segment_offset': self.segment_offset,
+                'keys': self.keys,
+                'terms': [[term, len(bits)] for term, bits in terms]
+            }).encode('utf-8')
+            self._unsaved = 0
+        compressor = zlib.compressobj(6)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressor.compress(struct.pack('<Q', len(header)) + header))
+            for _, bits in terms:
+                f.write(compressor.compress(bits))
+            f.write(compressor.flush())
+        os.replace(tmp_path, path)
+        if path == self.snapshot_path:
+            stat = os.stat(path)
+            self._snapshot_version = (stat.st_ino, stat.st_mtime_ns)
+
+    def load(self, path=None, ahead_of=None):
+        """
+        Replace the index with a saved snapshot; a missing or unreadable one leaves it as it is
+        :param ahead_of: Optional segment offset; only a snapshot further into the archive is loaded
+        :return: True when loaded
+        """
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                data = zlib.decompress(f.read())
+            (length,) = struct.unpack_from('<Q', data)
+            header = json.loads(data[8:8 + length])
+            if header['version'] != SNAPSHOT_VERSION:
+                raise ValueError(f"Snapshot version {header['version']}")
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            logger.warning(f"Ignoring chart search snapshot {path}: {str(e)}")
+            return False
+        if ahead_of is not None and header['segment_offset'] <= ahead_of:
+            return False
+
+        position = 8 + length
+        bitmaps = {}
+        for term, size in header['terms']:
+            bitmaps[term] = bytearray(data[position:position + size])
+            position += size
+        with self._lock:
+            self._deleted = bitmaps.pop(None)
+            self._bits = bitmaps
+            self._ints = {}
+            self.keys = header['keys']
+            self.ids = {key: chart_id for chart_id, key in enumerate(self.keys)}
+            self.segment_offset = header['segment_offset']
+            self._unsaved = 0
+        return True
+
+if __name__ == '__main__':
+    import argparse
+    from chart_archive import ChartArchive
+
+    # Offline build: index the archive and save the snapshot the app's workers load
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the chart search snapshot for a chart archive")
+    parser.add_argument('archive', help="Archive directory (KP_ARCHIVE_DIR)")
+    parser.add_argument('--snapshot', default=SEARCH_SNAPSHOT, help="Snapshot path (KP_SEARCH_SNAPSHOT)")
+    args = parser.parse_args()
+
+    search = ChartSearch(ChartArchive(args.archive), snapshot_path=args.snapshot, index_interval=0)
+    if not search.is_indexer():
+        parser.exit(1, f"A running server is already indexing into {search.snapshot_path}\n")
+    started = time.perf_counter()
+    added = search.build()
+    print(json.dumps(dict(search.get_stats(), added=added, seconds=round(time.perf_counter() - started, 3))))
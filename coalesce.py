@@ -0,0 +1,159 @@
+# coalesce.py
+import os
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): coalescing stays within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+COALESCE_ENABLED = os.environ.get('KP_COALESCE', '1') == '1'
+COALESCE_DIR = os.environ.get('KP_COALESCE_DIR', '')  # Lock directory shared by workers; empty = this process only
+COALESCE_TIMEOUT = float(os.environ.get('KP_COALESCE_TIMEOUT', 30))  # Least seconds a duplicate waits for the first caller
+LOCK_POLL_MAX = 0.05  # Longest pause between attempts at a busy lock file
+
+class _Call:
+    __slots__ = ('priority', 'done', 'result', 'error', 'waiters')
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call for their key
+    is in flight wait for it and share its result (or exception) instead of repeating it.
+    With a lock directory, the first caller in each process also takes a lock file of its own
+    key, so workers on one host run a key one at a time (and unrelated keys never wait); the call itself should then re-check a
+    shared cache (see call_api) so the later workers pick up the first one's result.
+    Callers have a priority (lower is more urgent, as in upstream_scheduler): a caller never
+    waits on a less urgent one, but starts its own call, which later duplicates then join
+    """
+
+    def __init__(self, name, enabled=COALESCE_ENABLED, lock_dir=COALESCE_DIR, timeout=COALESCE_TIMEOUT):
+        self.name = name
+        self.enabled = enabled
+        self.lock_dir = lock_dir if fcntl is not None else ''
+        self.timeout = timeout
+        self._calls = {}  # key -> _Call
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'coalesced': 0, 'upgraded': 0, 'timeouts': 0}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn, *args, priority=0, timeout=None, **kwargs):
+        """
+        Run fn(*args, **kwargs), or wait for the identical call already in flight
+        :param key: str (normalized request key)
+        :param priority: int (the caller's urgency, lower first); only calls at least as
+                         urgent are joined
+        :param timeout: float (the caller's deadline); a duplicate waits at least this long,
+                        and the first caller waits no longer than this for the lock file
+        :return: (result, coalesced) where coalesced is True for a shared result
+        :raises TimeoutError: when the in-flight call or the lock file outlasts the wait
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs), False
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None or call.priority > priority
+            if leader:
+                if call is not None:
+                    # A less urgent call holds the key: run separately and take the key over
+                    self.stats['upgraded'] += 1
+                call = self._calls[key] = _Call(priority)
+                self.stats['calls'] += 1
+            else:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            wait = max(self.timeout, timeout or 0)
+            if not call.done.wait(wait):
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise TimeoutError(f"Timed out after {wait}s waiting for an identical in-flight {self.name} call")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            with self._process_lock(key, timeout or self.timeout):
+                call.result = fn(*args, **kwargs)
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    @contextmanager
+    def _process_lock(self, key, timeout):
+        # Cross-worker exclusion on a lock file of this key alone, removed by its holder on release.
+        # Polled without blocking, so a stuck holder costs a caller its deadline, not its thread
+        if not self.lock_dir:
+            yield
+            return
+        path = self.lock_path(key)
+        stop_at = time.monotonic() + timeout
+        pause = 0.001
+        while True:
+            f = open(path, 'a')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # The previous holder may have removed the file between our open and flock:
+                # that lock is on an orphaned inode, so start again on the current file
+                if _same_file(f, path):
+                    break
+                f.close()
+                continue
+            except BlockingIOError:
+                f.close()
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise TimeoutError(f"Timed out after {timeout}s waiting for the {self.name} lock file")
+            time.sleep(min(pause, remaining))
+            pause = min(pause * 2, LOCK_POLL_MAX)
+        try:
+            yield
+        finally:
+            # Removed while still held, so a waiter never locks a file that is about to go away
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            f.close()
+
+    def lock_path(self, key):
+        """Lock file of one key in the shared directory"""
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.lock_dir, f"{self.name}_{digest}.lock")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._calls)
+        stats['cross_process'] = bool(self.lock_dir)
+        return stats
+
+def _same_file(f, path):
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+    except OSError:
+        return False
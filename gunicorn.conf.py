@@ -0,0 +1,57 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` run from this directory. Bind address and
+# worker count keep gunicorn's own defaults (PORT / WEB_CONCURRENCY); command-line flags still win
+import os
+import gc
+import time
+
+_started = time.perf_counter()
+
+# Import the app once in the master and fork workers from it, sharing loaded modules,
+# timezone data and tables copy-on-write instead of loading them per worker
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# /generate-stream (SSE) and /batch-analyze (NDJSON) keep a response open for as long as their
+# charts take, up to BATCH_MAX_RECORDS charts. A sync worker is one request at a time and is
+# killed once a request outlives `timeout`, cutting those streams off. gthread workers serve each
+# request on its own thread and heartbeat from their main loop, so an open stream doesn't count
+# against `timeout`: it only catches a worker whose main loop is stuck
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))  # Concurrent requests per worker, open streams included
+# Above API_BATCH_REQUEST_DEADLINE (120 s), the longest one chart may take, so that even with a sync
+# worker_class override a single chart's request survives; restarts give open streams as long to finish
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 150))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', timeout))
+
+def _warm_up(log, where):
+    import app
+    started = time.perf_counter()
+    app.warm_up()
+    log.info(
+        f"KP app warmed up in {where} in {time.perf_counter() - started:.3f}s "
+        f"(import {app.STARTUP['import']:.3f}s, ready {time.perf_counter() - _started:.3f}s after start)"
+    )
+
+def on_starting(server):
+    # Snapshots (and retired counts) left in KP_METRICS_DIR by an earlier run would be summed into /metrics
+    from metrics import metrics
+    metrics.clear()
+
+def _share_quota(server):
+    # Every worker runs its own upstream token buckets: give each its share of UPSTREAM_RATE,
+    # so together they stay within the key's quota (workers added later with TTIN are not counted)
+    from upstream_scheduler import upstream_scheduler
+    upstream_scheduler.split(server.cfg.workers)
+
+def when_ready(server):
+    if not preload_app:
+        return
+    _share_quota(server)
+    _warm_up(server.log, 'master')
+    # Keep the garbage collector from touching (and so copying) the preloaded objects in workers
+    gc.freeze()
+
+def post_worker_init(worker):
+    if not preload_app:
+        _share_quota(worker)
+        _warm_up(worker.log, f'worker {worker.pid}')
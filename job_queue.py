@@ -0,0 +1,263 @@
+# job_queue.py
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import queue
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))  # Background chart workers per process
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 100))  # Queued jobs before submissions are refused
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 600))  # Seconds finished jobs stay retrievable
+JOB_DIR = os.environ.get('KP_JOB_DIR', os.path.join('/tmp', 'kp_jobs'))  # Job states shared by gunicorn workers; empty = this process only
+JOB_PRUNE_INTERVAL = 60  # Seconds between sweeps of expired job files
+
+JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Job:
+    """One submitted chart and its progress"""
+    __slots__ = (
+        'id', 'payload', 'status', 'stage', 'completed_stages', 'created', 'started',
+        'finished', 'result', 'status_code', 'message'
+    )
+
+    def __init__(self, payload):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = 'queued'
+        self.stage = None
+        self.completed_stages = []
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.status_code = None
+        self.message = ''
+
+    def to_dict(self, stages=()):
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'completed_stages': list(self.completed_stages),
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+        if stages:
+            info['progress'] = round(len(self.completed_stages) / len(stages), 3)
+        if self.message:
+            info['message'] = self.message
+        if self.result is not None:
+            info['result'] = self.result
+            info['result_status'] = self.status_code
+        return info
+
+class JobQueue:
+    """
+    Bounded in-process job queue with a background worker pool. Submissions beyond
+    `max_queued` waiting jobs are refused (queue.Full) so callers can push back.
+    A job runs in the process that accepted it; with a job directory its state is also
+    published there as one JSON file per job on every change, so any worker sharing the
+    directory can answer a status poll
+    """
+
+    def __init__(self, handler, stages=(), workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL,
+                 job_dir=JOB_DIR):
+        """
+        :param handler: callable(payload, progress) -> (result dict, status code); progress(stage)
+                        is called as each stage starts
+        :param stages: Ordered stage names, used to report progress
+        :param job_dir: Directory shared by the processes serving /jobs, '' for this process only
+        """
+        self.handler = handler
+        self.stages = tuple(stages)
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self.job_dir = job_dir
+        self._pruned = 0
+
+    def _ensure_workers(self):
+        # Threads start on first use, so importing the app doesn't spawn them
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'chart-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, payload):
+        """
+        Queue a job
+        :param payload: Handler input
+        :return: Job
+        :raises queue.Full: when the queue is at capacity
+        """
+        self._ensure_workers()
+        self._expire()
+        job = Job(payload)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._publish(job)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            self._unpublish(job.id)
+            raise
+        return job
+
+    def get(self, job_id):
+        """
+        Current state of a job
+        :return: dict, or None when unknown or expired
+        """
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return job.to_dict(self.stages)
+        return self._load(job_id)
+
+    # Shared job files: written whole and renamed into place, so readers never see half a state
+    def _path(self, job_id):
+        return os.path.join(self.job_dir, f'job_{job_id}.json')
+
+    def _publish(self, job):
+        if not self.job_dir:
+            return
+        with self._lock:
+            state = dict(job.to_dict(self.stages), worker=os.getpid())
+        try:
+            os.makedirs(self.job_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.job_dir, prefix='.job_')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self._path(job.id))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not publish job {job.id}: {str(e)}")
+
+    def _unpublish(self, job_id):
+        if self.job_dir:
+            try:
+                os.remove(self._path(job_id))
+            except OSError:
+                pass
+
+    def _load(self, job_id):
+        # A job accepted by another process sharing the job directory
+        if not self.job_dir or not JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state['finished'] and state['finished'] < time.time() - self.result_ttl:
+            return None
+        worker = state.pop('worker', None)
+        if not state['finished'] and worker and not _alive(worker):
+            state.update(status='error', stage=None, message='The worker running this job exited')
+        return state
+
+    def _expire(self):
+        now = time.time()
+        cutoff = now - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+            prune = self.job_dir and now - self._pruned >= JOB_PRUNE_INTERVAL
+            if prune:
+                self._pruned = now
+        if prune:
+            # Files of every process: a file not rewritten within the TTL belongs to a job that
+            # finished that long ago, or whose worker is gone
+            for path in glob.glob(os.path.join(self.job_dir, 'job_*.json')):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    continue
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        def progress(stage):
+            with self._lock:
+                if job.stage:
+                    job.completed_stages.append(job.stage)
+                job.stage = stage
+            self._publish(job)
+
+        with self._lock:
+            job.status = 'running'
+            job.started = time.time()
+        self._publish(job)
+        try:
+            result, status_code = self.handler(job.payload, progress)
+            with self._lock:
+                if job.stage:
+                    job.completed_stages.append(job.stage)
+                job.status = 'success' if result.get('status') == 'success' else 'error'
+                job.result = result
+                job.status_code = status_code
+                job.message = result.get('message', '')
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            with self._lock:
+                job.status = 'error'
+                job.message = str(e)
+        finally:
+            with self._lock:
+                job.stage = None
+                job.payload = None
+                job.finished = time.time()
+            self._publish(job)
+
+    def get_stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'workers': self.workers,
+            'queued': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'jobs': counts,
+            'shared': bool(self.job_dir)
+        }
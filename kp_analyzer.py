@@ -3,6 +3,7 @@ import json
 import os
 import logging
 from datetime import datetime
+from kp_models import planet_name, label
 
 # Configure logging
 logging.basicConfig(
@@ -11,6 +12,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger('KPAnalysis')
 
+READ_BUFFER = 1 << 16  # Bytes buffered per report file handle
+
+# Line patterns, compiled once
+ANTARDASHA_HEADER = re.compile(r"✦ (\w+) Mahadasha")
+MARKER_NAME = re.compile(r"✦ (\w+)")
+BHAVA_HEADER = re.compile(r"Bhava (\d+)")
+YOGA_HEADER = re.compile(r"✦\s*([\w\s]+? Yoga(s?))\b", re.IGNORECASE)
+ZODIAC_HOUSE = re.compile(r"\(House (\d+)\)")
+NAKSHATRA_LORD = re.compile(r"Nakshatra - (\w+)")
+
+def _lines(content):
+    # Report text, or any iterable of lines such as an open file
+    return content.split('\n') if isinstance(content, str) else content
+
+def _report_lines(path):
+    """
+    Stream a rendered report file line by line through a buffered handle
+    :raises FileNotFoundError: when the file is missing
+    :raises RuntimeError: when it can't be read or is blank
+    """
+    try:
+        with open(path, 'r', buffering=READ_BUFFER) as f:
+            blank = True
+            for line in f:
+                if blank and line.strip():
+                    blank = False
+                yield line
+            if blank:
+                raise ValueError(f"Empty file: {path}")
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Critical file missing: {path}")
+    except Exception as e:
+        raise RuntimeError(f"Error reading {path}: {str(e)}")
+
+# Significator table columns, strongest level first
+SIGNIFICATOR_COLUMNS = ('houses', 'star_of_occupant', 'occupant', 'star_of_owner', 'owner')
+
+def house_list(houses):
+    return ', '.join(map(str, houses)) or '-'
+
 class KPAstrologyCleaner:
     def __init__(self):
         self.logger = logging.getLogger('KPCleaner')
@@ -23,7 +64,8 @@ class KPAstrologyCleaner:
             'planets': {},
             'houses': {},
             'yogas': [],
-            'current_periods': {}
+            'current_periods': {},
+            'significators': {}
         }
 
     def clean_data(self, files_content):
@@ -33,19 +75,7 @@ class KPAstrologyCleaner:
                     raise ValueError(f"Empty content for {file_type}")
                     
                 self.logger.info(f"Processing {file_type} data")
-                
-                if file_type == 'mahadasha':
-                    self._parse_mahadasha(content)
-                elif file_type == 'antardasha':
-                    self._parse_antardasha(content)
-                elif file_type == 'paryantardasha':
-                    self._parse_paryantardasha(content)
-                elif file_type in ['planet_position', 'planet_analysis']:
-                    self._parse_planets(content)
-                elif file_type == 'house_analysis':
-                    self._parse_houses(content)
-                elif file_type == 'yoga_details':
-                    self._parse_yogas(content)
+                self._parse(file_type, content)
                     
             return self._consolidate_data()
             
@@ -53,9 +83,163 @@ class KPAstrologyCleaner:
             self.logger.error(f"Cleaning failed: {str(e)}")
             raise
 
+    def clean_files(self, file_paths):
+        """
+        Build the consolidated analysis from rendered report files, scanning each
+        once through a buffered handle instead of reading it into memory
+        :param file_paths: dict of content type (as in clean_data) -> report file path
+        :return: Consolidated analysis text
+        """
+        try:
+            for file_type, path in file_paths.items():
+                self.logger.info(f"Processing {file_type} data")
+                self._parse(file_type, _report_lines(path))
+
+            return self._consolidate_data()
+
+        except Exception as e:
+            self.logger.error(f"Cleaning failed: {str(e)}")
+            raise
+
+    def _parse(self, file_type, content):
+        if file_type == 'mahadasha':
+            self._parse_mahadasha(content)
+        elif file_type == 'antardasha':
+            self._parse_antardasha(content)
+        elif file_type == 'paryantardasha':
+            self._parse_paryantardasha(content)
+        elif file_type == 'planet_position':
+            self._parse_planets(content)
+        elif file_type == 'planet_analysis':
+            self._parse_planets(content, merge=True)
+        elif file_type == 'house_analysis':
+            self._parse_houses(content)
+        elif file_type == 'yoga_details':
+            self._parse_yogas(content)
+
+    def clean_chart(self, chart):
+        """
+        Build the consolidated analysis straight from a parsed Chart
+        :param chart: Chart (see kp_models)
+        :return: Consolidated analysis text
+        """
+        try:
+            self.load_chart(chart)
+            return self._consolidate_data()
+
+        except Exception as e:
+            self.logger.error(f"Cleaning failed: {str(e)}")
+            raise
+
+    def load_chart(self, chart):
+        """
+        Fill parsed_data from a parsed Chart
+        :param chart: Chart (see kp_models)
+        :return: parsed_data
+        """
+        self.logger.info("Loading chart data")
+        if chart.mahadasha is not None:
+            self._load_mahadasha(chart.mahadasha)
+        # Antardasha and paryantardasha periods have their own reports; the consolidation only
+        # prints the running dasha, so they are not copied into parsed_data
+        if chart.planets is not None:
+            self._load_planets(chart.planets)
+        # KP planet sub lords are merged onto the rows from planet details
+        if chart.kp_planets is not None:
+            self._load_kp_planets(chart.kp_planets)
+        if chart.houses is not None:
+            self._load_houses(chart.houses)
+        if chart.yogas is not None:
+            self._load_yogas(chart.yogas)
+        if chart.houses is not None and (chart.kp_planets is not None or chart.planets is not None):
+            self._load_significators(chart)
+        return self.parsed_data
+
+    def summary(self):
+        """
+        The consolidated analysis as data: the fields _consolidate_data() prints
+        :return: dict with current_dasa, planets, significant_yogas, houses and significators
+        """
+        return {
+            'current_dasa': self.parsed_data['dasha']['mahadasha'].get('current'),
+            'planets': self.parsed_data['planets'],
+            'significant_yogas': self._significant_yogas(),
+            'houses': {house: planets for house, planets in self.parsed_data['houses'].items() if planets},
+            'significators': self.parsed_data['significators']
+        }
+
+    def _significant_yogas(self):
+        significant = []
+        for yoga in self.parsed_data['yogas']:
+            strength = 0
+            try:
+                strength = float(yoga.get('strength', '0%').replace('%', ''))
+            except ValueError:
+                pass
+
+            if strength > 80:
+                significant.append(yoga)
+        return significant
+
+    def _load_mahadasha(self, summary):
+        for section, dasa, dasa_time in (
+            ('birth', summary.birth_dasa, summary.birth_dasa_time),
+            ('current', summary.current_dasa, summary.current_dasa_time)
+        ):
+            lords = (dasa or '').split('>')
+            period = {
+                level: label(planet_name(lords[i])) if len(lords) > i else 'N/A'
+                for i, level in enumerate(('mahadasha', 'antardasha', 'pratyantaradasha'))
+            }
+            date_key = 'start date' if section == 'birth' else 'current date'
+            period[date_key] = (dasa_time or 'N/A').strip()
+            self.parsed_data['dasha']['mahadasha'][section] = period
+
+    def _load_planets(self, planets):
+        for planet in planets:
+            self.parsed_data['planets'][label(planet.planet)] = {
+                'abbr': planet.abbr,
+                'house': str(planet.house),
+                'nakshatra': planet.nakshatra,
+                'lord': label(planet.nakshatra_lord),
+                'retrograde': 'Yes' if planet.retro else 'No',
+                'combust': 'Yes' if planet.combust else 'No'
+            }
+
+    def _load_kp_planets(self, planets):
+        by_abbr = {data.get('abbr'): name for name, data in self.parsed_data['planets'].items()}
+        for planet in planets:
+            name = by_abbr.get(planet.abbr, label(planet.planet))
+            row = self.parsed_data['planets'].setdefault(name, {
+                'abbr': planet.abbr,
+                'house': str(planet.house),
+                'nakshatra': planet.nakshatra,
+                'lord': label(planet.nakshatra_lord),
+                'retrograde': 'Yes' if planet.retro else 'No',
+                'combust': ''
+            })
+            row['sublord'] = f"{label(planet.sub_lord)} → {label(planet.sub_sub_lord)}"
+
+    def _load_houses(self, houses):
+        for house in houses:
+            self.parsed_data['houses'][str(house.house)] = [label(p.planet) for p in house.planets]
+
+    def _load_significators(self, chart):
+        # NumPy loads with the first chart that has cusps, or in the app's warm-up
+        from kp_significators import significators
+        self.parsed_data['significators'] = significators(chart)
+
+    def _load_yogas(self, yogas):
+        for yoga in yogas:
+            self.parsed_data['yogas'].append({
+                'name': yoga.name,
+                'planets': [label(p) for p in yoga.planets],
+                'strength': f"{yoga.strength:.2f}%"
+            })
+
     def _parse_mahadasha(self, content):
         current_section = None
-        for line in content.split('\n'):
+        for line in _lines(content):
             line = line.strip()
             if 'Birth Dasa Period:' in line:
                 current_section = 'birth'
@@ -65,14 +249,14 @@ class KPAstrologyCleaner:
                 self.parsed_data['dasha']['mahadasha'][current_section] = {}
             elif current_section and ':' in line:
                 key, val = [p.strip() for p in line.split(':', 1)]
-                self.parsed_data['dasha']['mahadasha'][current_section][key.lower()] = val
+                self.parsed_data['dasha']['mahadasha'][current_section][key.lstrip('- ').lower()] = val
 
     def _parse_antardasha(self, content):
         current_mahadasha = None
-        for line in content.split('\n'):
+        for line in _lines(content):
             line = line.strip()
             if '✦' in line:
-                match = re.search(r"✦ (\w+) Mahadasha", line)
+                match = ANTARDASHA_HEADER.search(line)
                 if match:
                     current_mahadasha = match.group(1)
                     self.parsed_data['dasha']['antardasha'][current_mahadasha] = []
@@ -87,7 +271,7 @@ class KPAstrologyCleaner:
 
     def _parse_paryantardasha(self, content):
         current_key = None
-        for line in content.split('\n'):
+        for line in _lines(content):
             line = line.strip()
             if '✦' in line:
                 parts = line.split('>')
@@ -103,50 +287,69 @@ class KPAstrologyCleaner:
                         'date': date.strip()
                     })
 
-    def _parse_planets(self, content):
-        current_planet = None
-        for line in content.split('\n'):
+    def _parse_planets(self, content, merge=False):
+        """
+        Planet rows from the planet details report, or from the KP planets report with merge:
+        its rows (headed by abbreviations) only add the sublord chain to planets already
+        read, like load_chart() does
+        """
+        planets = self.parsed_data['planets']
+        row, fields = None, None
+        for line in _lines(content):
             line = line.strip()
             if '✦' in line:
-                match = re.search(r"✦ (\w+)", line)
+                match = MARKER_NAME.search(line)
                 if match:
-                    current_planet = match.group(1)
-                    self.parsed_data['planets'][current_planet] = {}
-            elif current_planet and ':' in line:
+                    name = label(planet_name(match.group(1)))
+                    if merge and name in planets:
+                        row, fields = planets[name], ('sublord',)
+                    else:
+                        row, fields = planets.setdefault(name, {}), None
+            elif row is not None and ':' in line:
                 key, val = [p.strip() for p in line.split(':', 1)]
-                key = key.replace('(', '').replace(')', '').strip().lower()
-                
-                if 'house' in key:
-                    self.parsed_data['planets'][current_planet]['house'] = val.split()[0]
-                elif 'nakshatra' in key:
-                    self.parsed_data['planets'][current_planet]['nakshatra'] = val.split('(')[0].strip()
-                elif 'lord' in key:
-                    self.parsed_data['planets'][current_planet]['lord'] = val.split('-')[-1].strip()
-                elif 'retrograde' in key:
-                    self.parsed_data['planets'][current_planet]['retrograde'] = val.strip()
-                elif 'combust' in key:
-                    self.parsed_data['planets'][current_planet]['combust'] = val.strip()
-                elif 'sublord' in key:
-                    self.parsed_data['planets'][current_planet]['sublord'] = val.strip()
+                field, value = self._planet_field(key.lstrip('- ').lower(), val)
+                if field and (fields is None or field in fields):
+                    row[field] = value
+
+    @staticmethod
+    def _planet_field(key, val):
+        # (row field, value) of one report line, (None, None) for lines the consolidation doesn't use
+        if key == 'zodiac':  # Planet details: "Leo (House 10)"
+            match = ZODIAC_HOUSE.search(val)
+            return ('house', match.group(1)) if match else (None, None)
+        if key == 'house position':  # KP planets: "10"
+            return 'house', val.split()[0]
+        if key == 'nakshatra':
+            return 'nakshatra', val.split('(')[0].strip()
+        if key == 'lords':  # Planet details: "Nakshatra - Venus, Zodiac - Sun"
+            match = NAKSHATRA_LORD.search(val)
+            return ('lord', match.group(1)) if match else (None, None)
+        if key == 'nakshatra lord':
+            return 'lord', val
+        if key in ('retrograde', 'combust'):
+            return key, val
+        if key == 'sublord chain':
+            return 'sublord', val
+        return None, None
 
     def _parse_houses(self, content):
         current_house = None
-        for line in content.split('\n'):
+        for line in _lines(content):
             line = line.strip()
             if 'Bhava ' in line:
-                match = re.search(r"Bhava (\d+)", line)
+                match = BHAVA_HEADER.search(line)
                 if match:
                     current_house = match.group(1)
                     self.parsed_data['houses'][current_house] = []
             elif current_house and '✦' in line:
-                match = re.search(r"✦ (\w+)", line)
+                match = MARKER_NAME.search(line)
                 if match:
                     planet = match.group(1)
                     self.parsed_data['houses'][current_house].append(planet)
 
     def _parse_yogas(self, content):
         current_yoga = {}
-        for line in content.split('\n'):
+        for line in _lines(content):
             line = line.strip()
             try:
                 if '✦' in line:
@@ -155,11 +358,7 @@ class KPAstrologyCleaner:
                         self.parsed_data['yogas'].append(current_yoga)
                         
                     # Match more flexible yoga patterns
-                    yoga_match = re.search(
-                        r"✦\s*([\w\s]+? Yoga(s?))\b", 
-                        line,
-                        re.IGNORECASE
-                    )
+                    yoga_match = YOGA_HEADER.search(line)
                     if yoga_match:
                         current_yoga = {
                             'name': yoga_match.group(1).strip(),
@@ -195,7 +394,7 @@ class KPAstrologyCleaner:
         if 'current' in self.parsed_data['dasha']['mahadasha']:
             current = self.parsed_data['dasha']['mahadasha']['current']
             output.append(f"   - Current Mahadasha: {current.get('mahadasha', 'N/A')}")
-            output.append(f"   - Start Date: {current.get('start date', 'N/A')}")
+            output.append(f"   - Start Date: {current.get('start date', current.get('current date', 'N/A'))}")
 
         # Planetary Positions
         output.append("\n2. PLANETARY POSITIONS")
@@ -209,18 +408,11 @@ class KPAstrologyCleaner:
 
         # Yogas
         output.append("\n3. SIGNIFICANT YOGAS")
-        for yoga in self.parsed_data['yogas']:
-            strength = 0
-            try:
-                strength = float(yoga.get('strength', '0%').replace('%', ''))
-            except ValueError:
-                pass
-                
-            if strength > 80:
-                output.append(
-                    f"   - {yoga['name']}: {', '.join(yoga['planets'])} "
-                    f"(Strength: {yoga.get('strength', 'Unknown')})"
-                )
+        for yoga in self._significant_yogas():
+            output.append(
+                f"   - {yoga['name']}: {', '.join(yoga['planets'])} "
+                f"(Strength: {yoga.get('strength', 'Unknown')})"
+            )
 
         # Houses
         output.append("\n4. HOUSE ANALYSIS")
@@ -228,6 +420,17 @@ class KPAstrologyCleaner:
             if planets:
                 output.append(f"   - House {house}: {', '.join(planets)}")
 
+        # Significators (charts loaded from parsed data only; the text reports don't carry cusp signs)
+        if self.parsed_data['significators']:
+            output.append("\n5. KP SIGNIFICATORS")
+            output.append("| Planet  | Houses               | Star of occ. | Occupant | Star of owner | Owner   |")
+            for planet, row in self.parsed_data['significators'].items():
+                columns = [house_list(row[key]) for key in SIGNIFICATOR_COLUMNS]
+                output.append(
+                    f"| {planet.ljust(7)} | {columns[0].ljust(20)} | {columns[1].ljust(12)} | "
+                    f"{columns[2].ljust(8)} | {columns[3].ljust(13)} | {columns[4].ljust(7)} |"
+                )
+
         return '\n'.join(output)
 
 def analyze_kp_charts(
@@ -238,44 +441,38 @@ def analyze_kp_charts(
     planet_analysis_file: str,
     house_analysis_file: str,
     yoga_details_file: str,
-    output_file: str = "consolidated_kp_analysis.txt"
+    output_file: str = None
 ):
-    """Process KP astrology files and generate consolidated analysis"""
-    def read_file(path):
-        try:
-            with open(path, 'r') as f:
-                content = f.read()
-                if not content.strip():
-                    raise ValueError(f"Empty file: {path}")
-                return content
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Critical file missing: {path}")
-        except Exception as e:
-            raise RuntimeError(f"Error reading {path}: {str(e)}")
-
+    """
+    Process KP astrology report files and generate consolidated analysis (written to output_file if given).
+    For report sets without their input JSON: the table matches analyze_kp_chart(), but the reports
+    don't carry the cusp signs, so there is no KP significators section
+    """
     try:
         logger.info("Starting KP analysis")
         
-        files_content = {
-            'mahadasha': read_file(mahadasha_file),
-            'antardasha': read_file(antardasha_file),
-            'paryantardasha': read_file(paryantardasha_file),
-            'planet_position': read_file(planet_position_file),
-            'planet_analysis': read_file(planet_analysis_file),
-            'house_analysis': read_file(house_analysis_file),
-            'yoga_details': read_file(yoga_details_file)
+        file_paths = {
+            'mahadasha': mahadasha_file,
+            'antardasha': antardasha_file,
+            'paryantardasha': paryantardasha_file,
+            'planet_position': planet_position_file,
+            'planet_analysis': planet_analysis_file,
+            'house_analysis': house_analysis_file,
+            'yoga_details': yoga_details_file
         }
 
         cleaner = KPAstrologyCleaner()
-        consolidated = cleaner.clean_data(files_content)
+        consolidated = cleaner.clean_files(file_paths)
         
-        with open(output_file, 'w') as f:
-            f.write(consolidated)
-            
-        logger.info(f"Analysis saved to {output_file}")
+        if output_file:
+            with open(output_file, 'w') as f:
+                f.write(consolidated)
+            logger.info(f"Analysis saved to {output_file}")
+
         return {
             'status': 'success',
-            'output_file': output_file,
+            'analysis': consolidated,
+            'output_file': output_file or '',
             'generated_files': [
                 mahadasha_file, antardasha_file, paryantardasha_file,
                 planet_position_file, planet_analysis_file,
@@ -283,6 +480,37 @@ def analyze_kp_charts(
             ]
         }
         
+    except Exception as e:
+        logger.error(f"Analysis failed: {str(e)}")
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
+def analyze_kp_chart(chart, output_file=None):
+    """
+    Generate the consolidated analysis from a parsed Chart, without intermediate files
+    :param chart: Chart (see kp_models)
+    :param output_file: Optional output file path
+    :return: dict with status and analysis text
+    """
+    try:
+        logger.info("Starting KP analysis")
+
+        cleaner = KPAstrologyCleaner()
+        consolidated = cleaner.clean_chart(chart)
+
+        if output_file:
+            with open(output_file, 'w') as f:
+                f.write(consolidated)
+            logger.info(f"Analysis saved to {output_file}")
+
+        return {
+            'status': 'success',
+            'analysis': consolidated,
+            'output_file': output_file or ''
+        }
+
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}")
         return {
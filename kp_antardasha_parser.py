@@ -1,11 +1,60 @@
 # kp_antardasha_parser.py
 import json
+from kp_models import Chart, dasha_series, label
 
-def parse_kp_antardasha(json_input, output_file):
+def extract_kp_antardasha(data):
+    """
+    Build antardasha periods from decoded antar-dasha JSON
+    :param data: dict (JSON data)
+    :return: tuple of DashaSeries, one per mahadasha
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid response status")
+
+    response = data.get('response', {})
+
+    # Get antardasha lists
+    antardashas = response.get('antardashas', [])
+    dates = response.get('antardasha_order', [])
+
+    groups = []
+    for mahadasha_list, date_list in zip(antardashas, dates):
+        if not mahadasha_list or len(mahadasha_list) != len(date_list):
+            continue  # Skip mismatched entries
+        groups.append(dasha_series(mahadasha_list, date_list))
+    return tuple(groups)
+
+def render_kp_antardasha(chart):
+    """
+    Format the antardasha part of a chart
+    :param chart: Chart (antardashas)
+    :return: Analysis text
+    """
+    output = ["=== KP Antardasha Analysis ==="]
+
+    # Process each mahadasha
+    for periods in chart.antardashas:
+        output.append(f"\n✦ {label(periods.lords[0][0], periods.short)} Mahadasha:")
+
+        # Add antardashas with dates
+        for lords, start in zip(periods.lords, periods.starts):
+            output.append(f"  - {label(lords[-1], periods.short)} Antardasha: {start}")
+
+    return '\n'.join(output)
+
+def format_kp_antardasha(data):
+    """
+    Format KP Antardasha details from decoded JSON
+    :param data: dict (JSON data)
+    :return: Analysis text
+    """
+    return render_kp_antardasha(Chart(antardashas=extract_kp_antardasha(data)))
+
+def parse_kp_antardasha(json_input, output_file=None):
     """
     Parse KP Antardasha details from JSON input and save formatted output
     :param json_input: str (file path) or dict (JSON data)
-    :param output_file: str (output file path)
+    :param output_file: str (output file path), None to skip writing
     :return: True if successful, False otherwise
     """
     try:
@@ -16,33 +65,12 @@ def parse_kp_antardasha(json_input, output_file):
         else:
             data = json_input
 
-        if data.get('status') != 200:
-            raise ValueError("Invalid response status")
-
-        response = data.get('response', {})
-        output = ["=== KP Antardasha Analysis ==="]
-
-        # Get antardasha lists
-        antardashas = response.get('antardashas', [])
-        dates = response.get('antardasha_order', [])
-
-        # Process each mahadasha
-        for i, (mahadasha_list, date_list) in enumerate(zip(antardashas, dates)):
-            if len(mahadasha_list) != len(date_list):
-                continue  # Skip mismatched entries
-
-            # Get mahadasha name from first entry
-            mahadasha = mahadasha_list[0].split('/')[0]
-            output.append(f"\n✦ {mahadasha} Mahadasha:")
-
-            # Add antardashas with dates
-            for antardasha, date_str in zip(mahadasha_list, date_list):
-                planet1, planet2 = antardasha.split('/')
-                output.append(f"  - {planet2} Antardasha: {date_str}")
+        output = format_kp_antardasha(data)
 
         # Save to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(output))
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(output)
 
         return True
 
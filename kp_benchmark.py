@@ -0,0 +1,337 @@
+# kp_benchmark.py
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import tracemalloc
+import subprocess
+from datetime import datetime, timedelta
+from kp_house_parser import format_kp_houses
+from kp_planet_parser import format_kp_planets
+from kp_planet_details_parser import format_kp_planet_details
+from kp_mahadasha_parser import format_kp_mahadasha
+from kp_antardasha_parser import format_kp_antardasha
+from kp_paryantardasha_parser import format_kp_paryantardasha
+from kp_yoga_parser import format_kp_yogas
+from kp_analyzer import KPAstrologyCleaner, analyze_kp_chart
+from kp_sublords import lords_at, NAKSHATRAS
+from kp_vimshottari import vimshottari, dasha_payloads
+from kp_models import PLANET_ABBREVIATIONS, PlanetName
+from main import run_kp_analysis, build_chart
+
+# Configuration
+DEFAULT_SIZES = (1, 1000, 100000)
+DEFAULT_SEED = 42
+POOL_SIZE = int(os.environ.get('BENCH_POOL_SIZE', 256))  # Distinct synthetic charts, reused round-robin
+MEMORY_SAMPLE = int(os.environ.get('BENCH_MEMORY_SAMPLE', 1000))  # Charts run under tracemalloc per case
+
+GRAHAS = [p for p in PlanetName if p is not PlanetName.ASCENDANT]
+RETRO_CAPABLE = (PlanetName.MARS, PlanetName.MERCURY, PlanetName.JUPITER, PlanetName.VENUS, PlanetName.SATURN)
+YOGA_NAMES = [
+    "Gaja Kesari Yoga", "Budha Aditya Yoga", "Chandra Mangala Yoga", "Hamsa Yoga", "Malavya Yoga",
+    "Ruchaka Yoga", "Bhadra Yoga", "Sasa Yoga", "Dhana Yoga", "Raja Yoga", "Vipareeta Raja Yoga",
+    "Neecha Bhanga Raja Yoga", "Kemadruma Yoga", "Sunapha Yoga", "Anapha Yoga", "Durudhara Yoga",
+    "Adhi Yoga", "Amala Yoga", "Parvata Yoga", "Lakshmi Yoga", "Saraswati Yoga", "Daridra Yoga",
+    "Shakata Yoga", "Vasumathi Yoga", "Pushkala Yoga", "Kahala Yoga", "Chamara Yoga", "Sankha Yoga"
+]
+
+# Synthetic upstream payloads
+def _position(planet, longitude, house, rng):
+    chain = lords_at(longitude)
+    return {
+        'name': PLANET_ABBREVIATIONS[planet],
+        'full_name': planet.value,
+        'zodiac': chain.sign.value,
+        'house': house,
+        'nakshatra': chain.nakshatra,
+        'nakshatra_pada': int((longitude % (40 / 3)) // (10 / 3)) + 1,
+        'nakshatra_no': NAKSHATRAS.index(chain.nakshatra) + 1,
+        'nakshatra_lord': chain.star_lord.value,
+        'zodiac_lord': chain.sign_lord.value,
+        'sub_lord': chain.sub_lord.value,
+        'sub_sub_lord': chain.sub_sub_lord.value,
+        'local_degree': longitude % 30,
+        'global_degree': longitude,
+        'retro': planet in (PlanetName.RAHU, PlanetName.KETU) or (planet in RETRO_CAPABLE and rng.random() < 0.15),
+        'is_combust': planet in RETRO_CAPABLE and rng.random() < 0.1
+    }
+
+def synthetic_payloads(seed):
+    """
+    Realistic decoded responses of all seven endpoints for one random chart: positions,
+    cusps and lord chains are mutually consistent and the dashas follow from the Moon
+    :param seed: int (same seed, same chart)
+    :return: dict of JSON data keyed by stage name
+    """
+    rng = random.Random(seed)
+    birth = datetime(1940, 1, 1) + timedelta(minutes=rng.randrange(80 * 365 * 24 * 60))
+
+    # Unequal house cusps starting from the ascendant
+    ascendant = rng.uniform(0, 360)
+    lengths = [rng.uniform(22, 38) for _ in range(12)]
+    scale = 360 / sum(lengths)
+    cusps = [ascendant]
+    for length in lengths[:-1]:
+        cusps.append((cusps[-1] + length * scale) % 360)
+
+    def house_of(longitude):
+        offset = (longitude - ascendant) % 360
+        total = 0.0
+        for i, length in enumerate(lengths):
+            total += length * scale
+            if offset < total:
+                return i + 1
+        return 12
+
+    longitudes = {planet: rng.uniform(0, 360) for planet in GRAHAS}
+    longitudes[PlanetName.KETU] = (longitudes[PlanetName.RAHU] + 180) % 360
+    positions = {planet: _position(planet, lon, house_of(lon), rng) for planet, lon in longitudes.items()}
+    asc_position = _position(PlanetName.ASCENDANT, ascendant, 1, rng)
+
+    dasha = dasha_payloads(vimshottari(longitudes[PlanetName.MOON], birth, depth=3), now=birth + timedelta(days=rng.randrange(365 * 60)))
+    summary = dasha['mahadasha']['response']
+
+    planet_details = {'0': asc_position}
+    planet_details.update({str(i + 1): positions[planet] for i, planet in enumerate(GRAHAS)})
+    planet_details.update({key: summary[key] for key in ('birth_dasa', 'birth_dasa_time', 'current_dasa', 'current_dasa_time')})
+
+    kp_planets = {
+        planet.value: {
+            'name': pos['name'], 'zodiac': pos['zodiac'], 'house': pos['house'], 'retro': pos['retro'],
+            'global_degree': pos['global_degree'], 'local_degree': pos['local_degree'],
+            'pseudo_nakshatra': pos['nakshatra'], 'pseudo_nakshatra_pada': pos['nakshatra_pada'],
+            'pseudo_nakshatra_lord': pos['nakshatra_lord'], 'sub_lord': pos['sub_lord'],
+            'sub_sub_lord': pos['sub_sub_lord'], 'pseudo_rasi_lord': pos['zodiac_lord'], 'pseudo_rasi': pos['zodiac']
+        }
+        for planet, pos in positions.items()
+    }
+    kp_planets['midheaven'] = cusps[9]
+    kp_planets['ascendant'] = ascendant
+
+    houses = []
+    for i, start in enumerate(cusps):
+        end = cusps[(i + 1) % 12]
+        start_chain, end_chain = lords_at(start), lords_at(end)
+        houses.append({
+            'house': i + 1,
+            'start_rasi': start_chain.sign.value,
+            'end_rasi': end_chain.sign.value,
+            'start_nakshatra_lord': start_chain.star_lord.value,
+            'end_nakshatra_lord': end_chain.star_lord.value,
+            'cusp_sub_lord': start_chain.sub_lord.value,
+            'cusp_sub_sub_lord': start_chain.sub_sub_lord.value,
+            'bhavmadhya': (start + lengths[i] * scale / 2) % 360,
+            'length': lengths[i] * scale,
+            'local_start_degree': start % 30,
+            'local_end_degree': end % 30,
+            'global_start_degree': start,
+            'global_end_degree': end,
+            'planets': [
+                {key: pos[key] for key in ('name', 'full_name', 'retro', 'nakshatra', 'nakshatra_pada', 'nakshatra_no')}
+                for pos in positions.values() if pos['house'] == i + 1
+            ]
+        })
+
+    yogas = [
+        {
+            'yoga': name,
+            'strength_in_percentage': round(rng.uniform(0, 100), 2),
+            'planets_involved': [p.value for p in rng.sample(GRAHAS, rng.randint(1, 3))],
+            'houses_involved': sorted(rng.sample(range(1, 13), rng.randint(1, 3))),
+            'meaning': f"{name} brings results of its houses during the periods of its planets."
+        }
+        for name in rng.sample(YOGA_NAMES, rng.randint(4, len(YOGA_NAMES)))
+    ]
+    raja = sum(1 for y in yogas if 'Raja' in y['yoga'])
+    dhana = sum(1 for y in yogas if 'Dhana' in y['yoga'] or 'Lakshmi' in y['yoga'])
+    daridra = sum(1 for y in yogas if 'Daridra' in y['yoga'])
+
+    return {
+        'planet_position': {'status': 200, 'response': planet_details},
+        'house': {'status': 200, 'response': houses},
+        'planet': {'status': 200, 'response': kp_planets},
+        'mahadasha': dasha['mahadasha'],
+        'antardasha': dasha['antardasha'],
+        'paryantardasha': dasha['paryantardasha'],
+        'yoga': {'status': 200, 'response': {
+            'yogas_list': yogas, 'yogas_count': len(yogas), 'raja_yoga_count': raja,
+            'dhana_yoga_count': dhana, 'daridra_yoga_count': daridra
+        }}
+    }
+
+def synthetic_pool(size=POOL_SIZE, seed=DEFAULT_SEED):
+    """Distinct synthetic charts derived from one seed"""
+    rng = random.Random(seed)
+    return [synthetic_payloads(rng.getrandbits(64)) for _ in range(size)]
+
+def legacy_files_content(payloads):
+    # Text reports keyed the way analyze_kp_charts() hands them to KPAstrologyCleaner.clean_data()
+    reports = run_kp_analysis(payloads)['reports']
+    return {
+        'mahadasha': reports['mahadasha'],
+        'antardasha': reports['antardasha'],
+        'paryantardasha': reports['paryantardasha'],
+        'planet_position': reports['planet_position'],
+        'planet_analysis': reports['planet'],
+        'house_analysis': reports['house'],
+        'yoga_details': reports['yoga']
+    }
+
+# Benchmarks: name -> (input builder from one chart's payloads, function under test)
+PARSER_BENCHMARKS = {
+    'parser.planet_position': (lambda p: p['planet_position'], format_kp_planet_details),
+    'parser.house': (lambda p: p['house'], format_kp_houses),
+    'parser.planet': (lambda p: p['planet'], format_kp_planets),
+    'parser.mahadasha': (lambda p: p['mahadasha'], format_kp_mahadasha),
+    'parser.antardasha': (lambda p: p['antardasha'], format_kp_antardasha),
+    'parser.paryantardasha': (lambda p: p['paryantardasha'], format_kp_paryantardasha),
+    'parser.yoga': (lambda p: p['yoga'], format_kp_yogas)
+}
+ANALYZER_BENCHMARKS = {
+    'analyzer.clean_data': (legacy_files_content, lambda content: KPAstrologyCleaner().clean_data(content)),
+    'analyzer.clean_chart': (build_chart, analyze_kp_chart)
+}
+END_TO_END_BENCHMARKS = {
+    'end_to_end.run_kp_analysis': (lambda p: p, run_kp_analysis)
+}
+GROUPS = {
+    'parsers': PARSER_BENCHMARKS,
+    'analyzer': ANALYZER_BENCHMARKS,
+    'end_to_end': END_TO_END_BENCHMARKS
+}
+
+def run_case(name, func, inputs, size, memory=True):
+    """
+    Time `size` calls of func over the inputs round-robin, then measure memory on a sample
+    :return: dict result row
+    """
+    count = len(inputs)
+    start = time.perf_counter()
+    for i in range(size):
+        func(inputs[i % count])
+    elapsed = time.perf_counter() - start
+
+    row = {
+        'benchmark': name,
+        'charts': size,
+        'seconds': round(elapsed, 6),
+        'charts_per_sec': round(size / elapsed, 2) if elapsed else None,
+        'us_per_chart': round(elapsed / size * 1e6, 2)
+    }
+
+    if memory:
+        sample = min(size, MEMORY_SAMPLE)
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        for i in range(sample):
+            func(inputs[i % count])
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        row.update({
+            'memory_sample': sample,
+            'peak_bytes': peak - before,
+            'retained_bytes': current - before
+        })
+    return row
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed=DEFAULT_SEED, pool_size=POOL_SIZE, groups=tuple(GROUPS), memory=True, progress=None):
+    """
+    Run the suite offline on synthetic charts
+    :param sizes: Chart counts per benchmark
+    :param groups: Subset of GROUPS to run
+    :param progress: Optional callable(row) invoked after each case
+    :return: dict with meta and results
+    """
+    # Per-stage INFO logging would dominate the timings
+    logging.disable(logging.INFO)
+    try:
+        pool = synthetic_pool(pool_size, seed)
+        results = []
+        for group in groups:
+            for name, (prepare, func) in GROUPS[group].items():
+                inputs = [prepare(payloads) for payloads in pool]
+                for size in sizes:
+                    row = run_case(name, func, inputs, size, memory)
+                    results.append(row)
+                    if progress:
+                        progress(row)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'pool_size': pool_size,
+            'sizes': list(sizes)
+        },
+        'results': results
+    }
+
+def compare(baseline, current):
+    """
+    Throughput change per benchmark and size against an earlier run
+    :return: list of (benchmark, charts, baseline charts/sec, current charts/sec, change %)
+    """
+    before = {(r['benchmark'], r['charts']): r for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        old = before.get((r['benchmark'], r['charts']))
+        if old and old['charts_per_sec'] and r['charts_per_sec']:
+            change = (r['charts_per_sec'] / old['charts_per_sec'] - 1) * 100
+            rows.append((r['benchmark'], r['charts'], old['charts_per_sec'], r['charts_per_sec'], round(change, 1)))
+    return rows
+
+if __name__ == '__main__':
+    # Usage: python kp_benchmark.py [--sizes 1,1000] [--output results.json] [--compare baseline.json]
+    parser = argparse.ArgumentParser(description="Offline KP parser/analyzer benchmarks on synthetic charts")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="Comma-separated chart counts")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--pool', type=int, default=POOL_SIZE, help="Distinct synthetic charts")
+    parser.add_argument('--groups', default=','.join(GROUPS), help=f"Subset of: {', '.join(GROUPS)}")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--output', help="Write results JSON here (default: stdout)")
+    parser.add_argument('--compare', help="Earlier results JSON to compare throughput against")
+    args = parser.parse_args()
+
+    report = lambda row: print(
+        f"{row['benchmark']:<32} {row['charts']:>7} charts {row['charts_per_sec']:>12} charts/s"
+        + (f" peak {row['peak_bytes'] / 1024:.0f} KiB" if 'peak_bytes' in row else ''),
+        file=sys.stderr
+    )
+    results = run_benchmarks(
+        sizes=[int(s) for s in args.sizes.split(',')],
+        seed=args.seed,
+        pool_size=args.pool,
+        groups=[g.strip() for g in args.groups.split(',')],
+        memory=not args.no_memory,
+        progress=report
+    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, charts, old, new, change in compare(baseline, results):
+            print(f"{name:<32} {charts:>7} {old:>12} -> {new:>12} charts/s ({change:+.1f}%)", file=sys.stderr)
@@ -0,0 +1,205 @@
+# kp_bulk.py
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from kp_analyzer import KPAstrologyCleaner
+from main import FILE_PATHS, FINAL_OUTPUT, build_chart, load_payloads
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+BULK_WORKERS = int(os.environ.get('KP_BULK_WORKERS', os.cpu_count() or 1))  # Worker processes; 1 runs inline
+BULK_CHUNKSIZE = int(os.environ.get('KP_BULK_CHUNKSIZE', 16))  # Report sets handed to a worker at a time
+MANIFEST_NAME = 'kp_bulk_manifest.jsonl'
+
+# Analyzer content type -> FILE_PATHS stage, in the order analyze_kp_charts reads them
+REPORT_SECTIONS = (
+    ('mahadasha', 'mahadasha'),
+    ('antardasha', 'antardasha'),
+    ('paryantardasha', 'paryantardasha'),
+    ('planet_position', 'planet_position'),
+    ('planet_analysis', 'planet'),
+    ('house_analysis', 'house'),
+    ('yoga_details', 'yoga')
+)
+
+def report_files(file_paths=FILE_PATHS):
+    """
+    Report file names making up one chart's set
+    :return: dict of analyzer content type -> file name
+    """
+    return {file_type: file_paths[key][1] for file_type, key in REPORT_SECTIONS}
+
+def report_sets(root, file_paths=FILE_PATHS):
+    """
+    Walk a directory tree for complete chart report sets
+    :param root: Archive root
+    :return: Generator of directories relative to root ('.' for root itself), in sorted order
+    """
+    names = set(report_files(file_paths).values())
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if names.issubset(filenames):
+            yield os.path.relpath(dirpath, root)
+
+def has_inputs(directory, file_paths=FILE_PATHS):
+    """True when a report set still holds the input JSON it was rendered from"""
+    return all(os.path.exists(os.path.join(directory, input_name)) for input_name, _ in file_paths.values())
+
+def _source_files(directory, file_paths):
+    # What a set is consolidated from: its input JSON when present, else the text reports
+    if has_inputs(directory, file_paths):
+        return [input_name for input_name, _ in file_paths.values()]
+    return list(report_files(file_paths).values())
+
+def fingerprint(directory, file_paths=FILE_PATHS):
+    """Size and mtime of each source file, so changed sets are picked up on resume"""
+    stamp = []
+    for name in _source_files(directory, file_paths):
+        stat = os.stat(os.path.join(directory, name))
+        stamp.append([name, stat.st_size, stat.st_mtime_ns])
+    return stamp
+
+def consolidate_directory(task):
+    """
+    Re-run the consolidated analysis over one report set (process pool worker). Sets holding
+    their input JSON go through the parsed chart, like the file and in-memory pipelines; sets of
+    text reports alone get the same table without the KP significators section
+    :param task: (root, relative directory, output root or None, file_paths)
+    :return: Manifest entry dict with status, output_file and seconds
+    """
+    root, relative, output_root, file_paths = task
+    directory = os.path.join(root, relative)
+    entry = {'directory': relative}
+    started = time.perf_counter()
+    try:
+        entry['fingerprint'] = fingerprint(directory, file_paths)
+        if has_inputs(directory, file_paths):
+            consolidated = KPAstrologyCleaner().clean_chart(build_chart(load_payloads(directory, file_paths)))
+        else:
+            paths = {
+                file_type: os.path.join(directory, name)
+                for file_type, name in report_files(file_paths).items()
+            }
+            consolidated = KPAstrologyCleaner().clean_files(paths)
+
+        target_dir = os.path.join(output_root, relative) if output_root else directory
+        os.makedirs(target_dir, exist_ok=True)
+        output_file = os.path.join(target_dir, FINAL_OUTPUT)
+        with open(output_file, 'w') as f:
+            f.write(consolidated)
+
+        entry.update(status='success', output_file=output_file)
+    except Exception as e:
+        entry.update(status='error', message=str(e))
+    entry['seconds'] = round(time.perf_counter() - started, 6)
+    return entry
+
+def _init_worker():
+    # Per-file INFO lines cost more than the parsing at archive scale
+    logging.getLogger('KPCleaner').setLevel(logging.WARNING)
+    logging.getLogger('KPAnalysis').setLevel(logging.WARNING)
+    logging.getLogger('main').setLevel(logging.WARNING)
+
+# Resumable progress manifest: one JSON line per finished set, last entry wins
+def load_manifest(path):
+    """
+    :return: dict of relative directory -> latest manifest entry
+    """
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            entries[entry['directory']] = entry
+    return entries
+
+def _is_done(entry, directory, file_paths):
+    if not entry or entry.get('status') != 'success':
+        return False
+    try:
+        return entry.get('fingerprint') == fingerprint(directory, file_paths)
+    except OSError:
+        return False
+
+def run_bulk(root, output_root=None, workers=BULK_WORKERS, manifest_path=None, force=False,
+             file_paths=FILE_PATHS, chunksize=BULK_CHUNKSIZE):
+    """
+    Consolidate every report set under an archive root across a process pool. Sets already
+    recorded as done in the manifest, with unchanged report files, are skipped
+    :param root: Archive root holding one directory per chart
+    :param output_root: Mirror tree for the consolidated outputs (default: next to the reports)
+    :param workers: Worker processes
+    :param manifest_path: Progress manifest (default: kp_bulk_manifest.jsonl under output_root or root)
+    :param force: Re-run sets the manifest marks as done
+    :return: dict with status, message, processed, skipped, failed and manifest
+    """
+    started = time.perf_counter()
+    manifest_path = manifest_path or os.path.join(output_root or root, MANIFEST_NAME)
+    done = {} if force else load_manifest(manifest_path)
+
+    pending, skipped = [], 0
+    for relative in report_sets(root, file_paths):
+        if _is_done(done.get(relative), os.path.join(root, relative), file_paths):
+            skipped += 1
+        else:
+            pending.append((root, relative, output_root, file_paths))
+    logger.info(f"{len(pending)} report sets to consolidate, {skipped} already done")
+
+    processed, failed = 0, []
+    if os.path.dirname(manifest_path):
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, 'a') as manifest:
+        if workers > 1 and len(pending) > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            results = executor.map(consolidate_directory, pending, chunksize=chunksize)
+        else:
+            executor = None
+            _init_worker()
+            results = map(consolidate_directory, pending)
+        try:
+            for entry in results:
+                manifest.write(json.dumps(entry) + '\n')
+                manifest.flush()
+                if entry['status'] == 'success':
+                    processed += 1
+                else:
+                    failed.append(entry['directory'])
+                    logger.warning(f"{entry['directory']}: {entry['message']}")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - started
+    return {
+        'status': 'error' if failed else 'success',
+        'message': f"Consolidated {processed} report sets in {seconds:.2f}s "
+                   f"({skipped} skipped, {len(failed)} failed)",
+        'processed': processed,
+        'skipped': skipped,
+        'failed': failed,
+        'manifest': manifest_path
+    }
+
+if __name__ == '__main__':
+    # Usage: python kp_bulk.py ARCHIVE_ROOT [--output-dir DIR] [--workers N] [--force]
+    parser = argparse.ArgumentParser(description="Re-run the consolidated KP analysis over archived report sets")
+    parser.add_argument('root', help="Directory tree of per-chart output_kp_*.txt report sets")
+    parser.add_argument('--output-dir', help="Write consolidated outputs to a mirror tree instead of in place")
+    parser.add_argument('--workers', type=int, default=BULK_WORKERS)
+    parser.add_argument('--manifest', help=f"Progress manifest path (default: {MANIFEST_NAME} in the output root)")
+    parser.add_argument('--force', action='store_true', help="Ignore the manifest and redo every set")
+    args = parser.parse_args()
+
+    result = run_bulk(args.root, output_root=args.output_dir, workers=args.workers,
+                      manifest_path=args.manifest, force=args.force)
+    print(result['message'])
+    for directory in result['failed']:
+        print(f"  failed: {directory}")
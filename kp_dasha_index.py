@@ -0,0 +1,233 @@
+# kp_dasha_index.py
+import json
+from dataclasses import dataclass
+from datetime import datetime, date
+import numpy as np
+from kp_models import _Model
+from kp_vimshottari import DASHA_LORDS, DASHA_YEARS, TOTAL_YEARS, YEAR_DAYS, SECONDS_PER_DAY, _parse_date
+
+LORD_INDEX = {lord: i for i, lord in enumerate(DASHA_LORDS)}
+LEVEL_NAMES = ('mahadasha', 'antardasha', 'pratyantardasha')
+
+@dataclass(slots=True, kw_only=True)
+class DashaInterval(_Model):
+    """One dasha period with its lords from mahadasha down and its [start, end) span"""
+    lords: tuple = ()  # PlanetName per level
+    start: datetime | None = None
+    end: datetime | None = None
+
+    @property
+    def label(self):
+        return '/'.join(lord.value for lord in self.lords)
+
+    def to_dict(self):
+        return {
+            'period': self.label,
+            'level': LEVEL_NAMES[len(self.lords) - 1] if len(self.lords) <= len(LEVEL_NAMES) else len(self.lords),
+            'lords': [lord.value for lord in self.lords],
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat()
+        }
+
+def to_datetime64(value):
+    """
+    A query moment as datetime64[s]
+    :param value: datetime, date, datetime64 or str (ISO, or any upstream dasha date layout)
+    """
+    if isinstance(value, str):
+        try:
+            return np.datetime64(value.strip(), 's')
+        except ValueError:
+            return np.datetime64(_parse_date(value), 's')
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return np.datetime64(value, 's')
+
+class DashaIndex:
+    """
+    Dasha periods of one chart as sorted datetime64[s] interval arrays, one set per level
+    (1 = mahadasha). The periods of a level tile time, so starts and ends are both sorted
+    and point, range and batched queries are each a searchsorted
+    """
+    __slots__ = ('starts', 'ends', 'lords')
+
+    def __init__(self, starts, ends, lords):
+        """
+        :param starts: list per level of datetime64[s] arrays (n,)
+        :param ends: list per level of datetime64[s] arrays (n,)
+        :param lords: list per level of int8 arrays (n, level) of DASHA_LORDS indices
+        """
+        self.starts = starts
+        self.ends = ends
+        self.lords = lords
+
+    @property
+    def depth(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_periods(cls, lords, starts):
+        """
+        Build every level from the deepest one: each parent period starts where its first
+        child does, and a period ends where the next one starts. The last period ends after
+        its nominal Vimshottari length
+        :param lords: int array (n, depth) of DASHA_LORDS indices, mahadasha first
+        :param starts: datetime64[s] array (n,)
+        """
+        starts = np.asarray(starts, dtype='datetime64[s]')
+        if not len(starts):
+            raise ValueError("No dasha periods to index")
+        order = np.argsort(starts, kind='stable')
+        lords = np.asarray(lords, dtype=np.int8)[order]
+        starts = starts[order]
+
+        last_years = TOTAL_YEARS * np.prod(DASHA_YEARS[lords[-1]] / TOTAL_YEARS)
+        cycle_end = starts[-1] + np.timedelta64(int(round(last_years * YEAR_DAYS * SECONDS_PER_DAY)), 's')
+
+        level_starts, level_ends, level_lords = [], [], []
+        for level in range(1, lords.shape[1] + 1):
+            prefix = lords[:, :level]
+            first = np.ones(len(prefix), dtype=bool)
+            first[1:] = (prefix[1:] != prefix[:-1]).any(axis=1)
+            level_start = starts[first]
+            level_starts.append(level_start)
+            level_ends.append(np.append(level_start[1:], cycle_end))
+            level_lords.append(prefix[first])
+        return cls(level_starts, level_ends, level_lords)
+
+    @classmethod
+    def from_series(cls, groups):
+        """
+        Index parsed upstream periods
+        :param groups: DashaSeries per mahadasha (Chart.antardashas or Chart.paryantardashas)
+        """
+        lords, starts, parsed = [], [], {}
+        for series in groups:
+            for period_lords, start in zip(series.lords, series.starts):
+                try:
+                    lords.append([LORD_INDEX[lord] for lord in period_lords])
+                except KeyError as e:
+                    raise ValueError(f"Unknown dasha lord: {e.args[0]}")
+                when = parsed.get(start)
+                if when is None:
+                    when = parsed[start] = np.datetime64(_parse_date(start), 's')
+                starts.append(when)
+        if not lords:
+            raise ValueError("No dasha periods to index")
+        return cls.from_periods(lords, np.array(starts, dtype='datetime64[s]'))
+
+    @classmethod
+    def from_chart(cls, chart):
+        """Index a parsed Chart's deepest dasha level"""
+        groups = chart.paryantardashas or chart.antardashas
+        if not groups:
+            raise ValueError("Chart has no dasha periods")
+        return cls.from_series(groups)
+
+    @classmethod
+    def from_vimshottari(cls, dasha):
+        """Index periods computed by kp_vimshottari.vimshottari(), with their exact ends"""
+        starts, ends, lords = [], [], []
+        for level in range(1, dasha.depth + 1):
+            shape = dasha.starts[level - 1].shape
+            columns = [
+                np.broadcast_to(dasha.lords[k].reshape(dasha.lords[k].shape + (1,) * (level - 1 - k)), shape).ravel()
+                for k in range(level)
+            ]
+            starts.append(dasha.starts[level - 1].ravel())
+            ends.append(dasha.ends[level - 1].ravel())
+            lords.append(np.stack(columns, axis=1).astype(np.int8))
+        return cls(starts, ends, lords)
+
+    def _level(self, depth):
+        depth = depth or self.depth
+        if not 1 <= depth <= self.depth:
+            raise ValueError(f"Depth must be between 1 and {self.depth}")
+        return depth
+
+    def interval(self, row, depth=None):
+        """
+        :param row: Row of a level, as returned by rows_at()
+        :return: DashaInterval
+        """
+        depth = self._level(depth)
+        return DashaInterval(
+            lords=tuple(DASHA_LORDS[i] for i in self.lords[depth - 1][row]),
+            start=self.starts[depth - 1][row].astype(datetime),
+            end=self.ends[depth - 1][row].astype(datetime)
+        )
+
+    def rows_at(self, moments, depth=None):
+        """
+        Batched point query
+        :param moments: datetime64 array (or anything np.asarray turns into one)
+        :return: int array of rows at `depth`, -1 where a moment falls outside the indexed span
+        """
+        depth = self._level(depth)
+        moments = np.asarray(moments, dtype='datetime64[s]')
+        starts, ends = self.starts[depth - 1], self.ends[depth - 1]
+        rows = np.searchsorted(starts, moments, side='right') - 1
+        inside = (rows >= 0) & (moments < ends[np.maximum(rows, 0)])
+        return np.where(inside, rows, -1)
+
+    def period_at(self, when, depth=None):
+        """
+        Periods running at a moment
+        :param when: datetime, date, datetime64 or str
+        :return: tuple of DashaInterval from mahadasha down to `depth`, () outside the indexed span
+        """
+        depth = self._level(depth)
+        when = to_datetime64(when)
+        periods = []
+        for level in range(1, depth + 1):
+            row = int(self.rows_at(when, level))
+            if row < 0:
+                return ()
+            periods.append(self.interval(row, level))
+        return tuple(periods)
+
+    def periods_between(self, start, end, depth=None):
+        """
+        Range query
+        :return: list of DashaInterval at `depth` overlapping [start, end)
+        """
+        depth = self._level(depth)
+        start, end = to_datetime64(start), to_datetime64(end)
+        first = int(np.searchsorted(self.ends[depth - 1], start, side='right'))
+        last = int(np.searchsorted(self.starts[depth - 1], end, side='left'))
+        return [self.interval(row, depth) for row in range(first, last)]
+
+    def timeline(self, start, end, step_days=1, depth=None):
+        """
+        Sample [start, end) every `step_days` and collapse consecutive samples in the same period
+        :return: list of (first sample, last sample, DashaInterval or None) as datetimes
+        """
+        depth = self._level(depth)
+        step = np.timedelta64(int(round(float(step_days) * SECONDS_PER_DAY)), 's')
+        if step <= np.timedelta64(0, 's'):
+            raise ValueError("step_days must be positive")
+        moments = np.arange(to_datetime64(start), to_datetime64(end), step)
+        if not len(moments):
+            return []
+        rows = self.rows_at(moments, depth)
+        breaks = np.flatnonzero(np.diff(rows)) + 1
+        firsts = np.concatenate(([0], breaks))
+        lasts = np.concatenate((breaks - 1, [len(rows) - 1]))
+        return [
+            (moments[a].astype(datetime), moments[b].astype(datetime),
+             self.interval(rows[a], depth) if rows[a] >= 0 else None)
+            for a, b in zip(firsts.tolist(), lasts.tolist())
+        ]
+
+if __name__ == '__main__':
+    import sys
+    from kp_paryantardasha_parser import extract_kp_paryantardasha
+    # Usage: python kp_dasha_index.py <input_kp_paryantardasha_details.json> <date> [<end date>]
+    with open(sys.argv[1]) as f:
+        index = DashaIndex.from_series(extract_kp_paryantardasha(json.load(f)))
+    if len(sys.argv) > 3:
+        for period in index.periods_between(sys.argv[2], sys.argv[3]):
+            print(json.dumps(period.to_dict()))
+    else:
+        for period in index.period_at(sys.argv[2]):
+            print(json.dumps(period.to_dict()))
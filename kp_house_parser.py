@@ -1,120 +1,175 @@
-# kp_parser.py
+# kp_house_parser.py
+import sys
 import json
+from kp_models import Chart, HouseCusp, Planet, planet_name, sign_name, label
+
+# Static tables
+HOUSE_SIGNIFICATIONS = {
+    1: "Self, Personality, Physique",
+    2: "Wealth, Family, Speech",
+    3: "Courage, Siblings, Short Travel",
+    4: "Home, Mother, Comforts",
+    5: "Children, Intelligence, Past Karma",
+    6: "Health, Debts, Enemies",
+    7: "Marriage, Partnerships, Business",
+    8: "Longevity, Occult, Sudden Gains",
+    9: "Fortune, Father, Long Travel",
+    10: "Career, Status, Authority",
+    11: "Gains, Friends, Aspirations",
+    12: "Losses, Isolation, Moksha"
+}
+STAR_LORDS = ("Ketu", "Venus", "Sun", "Moon", "Mars", "Rahu",
+              "Jupiter", "Saturn", "Mercury") * 3
+STAR_LORD_SIGNIFICATIONS = {
+    "Sun": "Soul, Vitality, Authority",
+    "Moon": "Mind, Emotions, Public",
+    "Mars": "Courage, Energy, Conflicts",
+    "Mercury": "Intellect, Communication, Trade",
+    "Jupiter": "Wisdom, Expansion, Fortune",
+    "Venus": "Relationships, Luxury, Arts",
+    "Saturn": "Discipline, Challenges, Longevity",
+    "Rahu": "Unconventional, Obsessions, Modern Tech",
+    "Ketu": "Spirituality, Detachment, Past Karma"
+}
+# Trinal houses counted from each house, rendered once
+ASPECT_MAP = {house: [house, (house + 3) % 12 + 1, (house + 7) % 12 + 1] for house in range(1, 13)}
+ASPECT_TEXT = {house: f"Aspects houses: {aspects}" for house, aspects in ASPECT_MAP.items()}
 
 # Helper functions
 def get_house_significance(house_num):
-    significations = {
-        1: "Self, Personality, Physique",
-        2: "Wealth, Family, Speech",
-        3: "Courage, Siblings, Short Travel",
-        4: "Home, Mother, Comforts",
-        5: "Children, Intelligence, Past Karma",
-        6: "Health, Debts, Enemies",
-        7: "Marriage, Partnerships, Business",
-        8: "Longevity, Occult, Sudden Gains",
-        9: "Fortune, Father, Long Travel",
-        10: "Career, Status, Authority",
-        11: "Gains, Friends, Aspirations",
-        12: "Losses, Isolation, Moksha"
-    }
-    return significations.get(house_num, "General Life Area")
+    return HOUSE_SIGNIFICATIONS.get(house_num, "General Life Area")
 
 def get_star_lord(nakshatra_no):
-    star_lords = ["Ketu", "Venus", "Sun", "Moon", "Mars", "Rahu", 
-                "Jupiter", "Saturn", "Mercury"] * 3
-    return star_lords[nakshatra_no-1]
+    return STAR_LORDS[nakshatra_no-1]
 
 def get_star_lord_significance(planet):
-    significations = {
-        "Sun": "Soul, Vitality, Authority",
-        "Moon": "Mind, Emotions, Public",
-        "Mars": "Courage, Energy, Conflicts",
-        "Mercury": "Intellect, Communication, Trade",
-        "Jupiter": "Wisdom, Expansion, Fortune",
-        "Venus": "Relationships, Luxury, Arts",
-        "Saturn": "Discipline, Challenges, Longevity",
-        "Rahu": "Unconventional, Obsessions, Modern Tech",
-        "Ketu": "Spirituality, Detachment, Past Karma"
-    }
-    return significations.get(planet, "General Influence")
+    return STAR_LORD_SIGNIFICATIONS.get(planet, "General Influence")
 
 def calculate_planet_strength(planet, house):
     strengths = []
-    if planet['retro']:
+    if planet.retro:
         strengths.append("Retrograde - Modified Influence")
-    if house['start_nakshatra_lord'] == planet['full_name']:
+    if house.start_nakshatra_lord == planet.planet:
         strengths.append("In Own Constellation - Strong")
     return " | ".join(strengths) if strengths else "Neutral Position"
 
+class ChartIndex:
+    """
+    Lookups over a chart's houses, built in one pass:
+    planet (PlanetName) -> first house holding it, plus the chart-wide significators and conjunctions
+    """
+    __slots__ = ('houses', 'planet_house', 'significators', 'conjunctions')
+
+    def __init__(self, houses):
+        self.houses = houses
+        self.planet_house = {}
+        self.conjunctions = []
+        significators = set()
+
+        for house in houses:
+            significators.add(label(house.cusp_sub_lord))
+            significators.add(label(house.cusp_sub_sub_lord))
+            for planet in house.planets:
+                significators.add(label(planet.planet))
+                self.planet_house.setdefault(planet.planet, house.house)
+            if len(house.planets) > 1:
+                self.conjunctions.append(
+                    f"Conjunction in House {house.house}: {', '.join(p.abbr for p in house.planets)}"
+                )
+        self.significators = significators
+
+def _index(houses):
+    return houses if isinstance(houses, ChartIndex) else ChartIndex(houses)
+
 def get_sub_lord_house(planet, houses):
-    for h in houses:
-        if any(p['name'] == planet for p in h['planets']):
-            return f"House {h['house']}"
-    return "Not found in chart"
-
-def get_aspects(house_num, houses):
-    aspect_map = {
-        1: [1, 5, 9],
-        2: [2, 6, 10],
-        3: [3, 7, 11],
-        4: [4, 8, 12],
-        5: [5, 9, 1],
-        6: [6, 10, 2],
-        7: [7, 11, 3],
-        8: [8, 12, 4],
-        9: [9, 1, 5],
-        10: [10, 2, 6],
-        11: [11, 3, 7],
-        12: [12, 4, 8]
-    }
-    return f"Aspects houses: {aspect_map.get(house_num, [])}"
+    """
+    House occupied by a planet
+    :param planet: PlanetName, full name or abbreviation
+    :return: str ('House 7', or 'Not found in chart')
+    """
+    if isinstance(planet, str):
+        planet = planet_name(planet)
+    house = _index(houses).planet_house.get(planet)
+    return f"House {house}" if house is not None else "Not found in chart"
+
+def get_aspects(house_num, houses=None):
+    return ASPECT_TEXT.get(house_num, "Aspects houses: []")
 
 def get_key_significators(houses):
-    significators = set()
-    for house in houses:
-        significators.add(house['cusp_sub_lord'])
-        significators.add(house['cusp_sub_sub_lord'])
-        for planet in house['planets']:
-            significators.add(planet['full_name'])
-    return ", ".join(significators)
+    return ", ".join(_index(houses).significators)
 
 def get_planetary_configurations(houses):
-    aspects = []
-    for house in houses:
-        if len(house['planets']) > 1:
-            planets = [p['name'] for p in house['planets']]
-            aspects.append(f"Conjunction in House {house['house']}: {', '.join(planets)}")
-    return "\n".join(aspects) if aspects else "No major conjunctions"
+    conjunctions = _index(houses).conjunctions
+    return "\n".join(conjunctions) if conjunctions else "No major conjunctions"
 
-# Main parser
-def parse_kp_houses(json_data):
-    """Parse KP houses JSON into readable text with KP astrology terminology"""
+# Model builder
+def extract_kp_houses(data):
+    """
+    Build HouseCusp records from decoded kp-houses JSON
+    :param data: dict (JSON data)
+    :return: tuple of HouseCusp
+    """
+    return tuple(
+        HouseCusp(
+            house=house['house'],
+            start_sign=sign_name(house['start_rasi']),
+            end_sign=sign_name(house['end_rasi']),
+            start_nakshatra_lord=planet_name(house['start_nakshatra_lord']),
+            end_nakshatra_lord=planet_name(house['end_nakshatra_lord']),
+            cusp_sub_lord=planet_name(house['cusp_sub_lord']),
+            cusp_sub_sub_lord=planet_name(house['cusp_sub_sub_lord']),
+            bhavmadhya=house['bhavmadhya'],
+            length=house['length'],
+            local_start_degree=house['local_start_degree'],
+            local_end_degree=house['local_end_degree'],
+            global_start_degree=house['global_start_degree'],
+            global_end_degree=house['global_end_degree'],
+            planets=tuple(
+                Planet(
+                    planet=planet_name(planet['full_name']),
+                    abbr=sys.intern(planet['name']),
+                    retro=bool(planet['retro']),
+                    nakshatra=sys.intern(planet['nakshatra']),
+                    nakshatra_pada=planet['nakshatra_pada'],
+                    nakshatra_no=planet['nakshatra_no']
+                )
+                for planet in house['planets']
+            )
+        )
+        for house in data.get('response', [])
+    )
+
+# Main renderer
+def render_kp_houses(chart):
+    """Render the houses of a chart as readable text with KP astrology terminology"""
     output = []
     
-    houses = json_data.get('response', [])
+    houses = chart.houses
+    index = ChartIndex(houses)
     
     for house in houses:
         house_info = [
-            f"=== Bhava {house['house']} ({get_house_significance(house['house'])}) ===",
-            f"Rasi Transition : {house['start_rasi']} ({house['start_nakshatra_lord']}) → {house['end_rasi']} ({house['end_nakshatra_lord']})",
+            f"=== Bhava {house.house} ({get_house_significance(house.house)}) ===",
+            f"Rasi Transition : {label(house.start_sign)} ({label(house.start_nakshatra_lord)}) → {label(house.end_sign)} ({label(house.end_nakshatra_lord)})",
             f"Cusp Details:",
-            f"  - Sublord (Vargas)    : {house['cusp_sub_lord']} in {get_sub_lord_house(house['cusp_sub_lord'], houses)}",
-            f"  - Sub-Sublord (Sub-Sub): {house['cusp_sub_sub_lord']}",
+            f"  - Sublord (Vargas)    : {label(house.cusp_sub_lord)} in {get_sub_lord_house(house.cusp_sub_lord, index)}",
+            f"  - Sub-Sublord (Sub-Sub): {label(house.cusp_sub_sub_lord)}",
             f"Positional Data:",
-            f"  - Bhavmadhya (Cusp Midpoint) : {house['bhavmadhya']:.2f}°",
-            f"  - Span: {house['length']:.2f}° ({house['local_start_degree']:.2f}° to {house['local_end_degree']:.2f}° local)",
-            f"  - Galactic Longitude: {house['global_start_degree']:.2f}° to {house['global_end_degree']:.2f}°"
+            f"  - Bhavmadhya (Cusp Midpoint) : {house.bhavmadhya:.2f}°",
+            f"  - Span: {house.length:.2f}° ({house.local_start_degree:.2f}° to {house.local_end_degree:.2f}° local)",
+            f"  - Galactic Longitude: {house.global_start_degree:.2f}° to {house.global_end_degree:.2f}°"
         ]
         
-        planets = house['planets']
+        planets = house.planets
         if planets:
             house_info.append("Planetary Influences:")
             for planet in planets:
-                retro_status = "Rx" if planet['retro'] else "Direct"
+                retro_status = "Rx" if planet.retro else "Direct"
+                star_lord = get_star_lord(planet.nakshatra_no)
                 planet_info = [
-                    f"  ✦ {planet['full_name']} ({planet['name']}) [{retro_status}]",
-                    f"    Nakshatra: {planet['nakshatra']} (Padam {planet['nakshatra_pada']})",
-                    f"    Starlord : {get_star_lord(planet['nakshatra_no'])} → {get_star_lord_significance(get_star_lord(planet['nakshatra_no']))}",
+                    f"  ✦ {label(planet.planet)} ({planet.abbr}) [{retro_status}]",
+                    f"    Nakshatra: {planet.nakshatra} (Padam {planet.nakshatra_pada})",
+                    f"    Starlord : {star_lord} → {get_star_lord_significance(star_lord)}",
                     f"    Position : {calculate_planet_strength(planet, house)}"
                 ]
                 house_info.extend(planet_info)
@@ -123,8 +178,8 @@ def parse_kp_houses(json_data):
         
         house_info.extend([
             f"Significator Chain:",
-            f"  {house['cusp_sub_lord']} → {house['cusp_sub_sub_lord']} → ...",
-            f"Aspect Analysis: {get_aspects(house['house'], houses)}"
+            f"  {label(house.cusp_sub_lord)} → {label(house.cusp_sub_sub_lord)} → ...",
+            f"Aspect Analysis: {get_aspects(house.house)}"
         ])
         
         output.append("\n".join(house_info))
@@ -132,11 +187,37 @@ def parse_kp_houses(json_data):
     output.insert(0, "=== KP Astrological Chart Analysis ===")
     output.append("\n=== KP Chart Summary ===")
     output.append(f"Total Cuspal Points: {len(houses)}")
-    output.append(f"Key Significators: {get_key_significators(houses)}")
-    output.append(f"Planetary Configurations:\n{get_planetary_configurations(houses)}")
+    output.append(f"Key Significators: {get_key_significators(index)}")
+    output.append(f"Planetary Configurations:\n{get_planetary_configurations(index)}")
     
     return "\n\n".join(output)
 
+def parse_kp_houses(json_data):
+    """Parse KP houses JSON into readable text with KP astrology terminology"""
+    return render_kp_houses(Chart(houses=extract_kp_houses(json_data)))
+
+def validate_kp_houses(data):
+    """
+    Check decoded KP houses JSON before use
+    :param data: dict (JSON data)
+    :return: data, unchanged
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid KP data: Status code not 200")
+    if 'response' not in data:
+        raise ValueError("Invalid KP data: Missing 'response' array")
+    if len(data['response']) != 12:
+        raise ValueError("Invalid KP data: Expected 12 houses")
+    return data
+
+def format_kp_houses(data):
+    """
+    Validate decoded KP houses JSON and format it
+    :param data: dict (JSON data)
+    :return: Analysis text
+    """
+    return parse_kp_houses(validate_kp_houses(data))
+
 # Public interface function
 def get_kp_details(input_source, output_file=None):
     """
@@ -153,16 +234,8 @@ def get_kp_details(input_source, output_file=None):
         else:
             data = input_source
 
-        # Validate data structure
-        if data.get('status') != 200:
-            raise ValueError("Invalid KP data: Status code not 200")
-        if 'response' not in data:
-            raise ValueError("Invalid KP data: Missing 'response' array")
-        if len(data['response']) != 12:
-            raise ValueError("Invalid KP data: Expected 12 houses")
-
-        # Generate analysis
-        analysis = parse_kp_houses(data)
+        # Validate and generate analysis
+        analysis = format_kp_houses(data)
 
         # Save to file if requested
         if output_file:
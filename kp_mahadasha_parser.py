@@ -1,11 +1,74 @@
 # kp_mahadasha_parser.py
 import json
+from kp_models import Chart, DashaSummary, planet_name, label
 
-def parse_kp_mahadasha(json_input, output_file):
+def extract_kp_mahadasha(data):
+    """
+    Build the birth/current dasha summary from decoded maha-dasha JSON
+    :param data: dict (JSON data)
+    :return: DashaSummary
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid response status")
+
+    response = data.get('response', {})
+    return DashaSummary(
+        birth_dasa=response.get('birth_dasa'),
+        birth_dasa_time=response.get('birth_dasa_time'),
+        current_dasa=response.get('current_dasa'),
+        current_dasa_time=response.get('current_dasa_time')
+    )
+
+def _dasa_lords(dasa):
+    # 'Ju>Sa>Me' -> ['Jupiter', 'Saturn', 'Mercury']
+    return [label(planet_name(code)) for code in (dasa or '').split('>')]
+
+def render_kp_mahadasha(chart):
+    """
+    Format the mahadasha part of a chart
+    :param chart: Chart (mahadasha)
+    :return: Analysis text
+    """
+    summary = chart.mahadasha
+    output = ["=== KP Mahadasha Analysis ==="]
+
+    # Birth dasa
+    birth_dasa = _dasa_lords(summary.birth_dasa)
+    birth_dasa_time = summary.birth_dasa_time or 'N/A'
+    output.extend([
+        "\nBirth Dasa Period:",
+        f"  - Mahadasha: {birth_dasa[0] if len(birth_dasa) > 0 else 'N/A'}",
+        f"  - Antardasha: {birth_dasa[1] if len(birth_dasa) > 1 else 'N/A'}",
+        f"  - Pratyantaradasha: {birth_dasa[2] if len(birth_dasa) > 2 else 'N/A'}",
+        f"  - Start Date: {birth_dasa_time.strip()}"
+    ])
+
+    # Current dasa
+    current_dasa = _dasa_lords(summary.current_dasa)
+    current_dasa_time = summary.current_dasa_time or 'N/A'
+    output.extend([
+        "\nCurrent Dasa Period:",
+        f"  - Mahadasha: {current_dasa[0] if len(current_dasa) > 0 else 'N/A'}",
+        f"  - Antardasha: {current_dasa[1] if len(current_dasa) > 1 else 'N/A'}",
+        f"  - Pratyantaradasha: {current_dasa[2] if len(current_dasa) > 2 else 'N/A'}",
+        f"  - Current Date: {current_dasa_time.strip()}"
+    ])
+
+    return '\n'.join(output)
+
+def format_kp_mahadasha(data):
+    """
+    Format KP Mahadasha details from decoded JSON
+    :param data: dict (JSON data)
+    :return: Analysis text
+    """
+    return render_kp_mahadasha(Chart(mahadasha=extract_kp_mahadasha(data)))
+
+def parse_kp_mahadasha(json_input, output_file=None):
     """
     Parse KP Mahadasha details from JSON input and save to output file
     :param json_input: str (file path) or dict (JSON data)
-    :param output_file: str (output file path)
+    :param output_file: str (output file path), None to skip writing
     :return: True if successful, False otherwise
     """
     try:
@@ -16,50 +79,12 @@ def parse_kp_mahadasha(json_input, output_file):
         else:
             data = json_input
 
-        if data.get('status') != 200:
-            raise ValueError("Invalid response status")
-
-        response = data.get('response', {})
-        output = ["=== KP Mahadasha Analysis ==="]
-
-        # Dasa period mapping
-        planet_map = {
-            "Me": "Mercury",
-            "Ke": "Ketu",
-            "Ve": "Venus",
-            "Su": "Sun",
-            "Mo": "Moon",
-            "Ma": "Mars",
-            "Ra": "Rahu",
-            "Ju": "Jupiter",
-            "Sa": "Saturn"
-        }
-
-        # Parse birth dasa
-        birth_dasa = response.get('birth_dasa', '').split('>')
-        birth_dasa_time = response.get('birth_dasa_time', 'N/A')
-        output.extend([
-            "\nBirth Dasa Period:",
-            f"  - Mahadasha: {planet_map.get(birth_dasa[0], birth_dasa[0]) if len(birth_dasa) > 0 else 'N/A'}",
-            f"  - Antardasha: {planet_map.get(birth_dasa[1], birth_dasa[1]) if len(birth_dasa) > 1 else 'N/A'}",
-            f"  - Pratyantaradasha: {planet_map.get(birth_dasa[2], birth_dasa[2]) if len(birth_dasa) > 2 else 'N/A'}",
-            f"  - Start Date: {birth_dasa_time.strip()}"
-        ])
-
-        # Parse current dasa
-        current_dasa = response.get('current_dasa', '').split('>')
-        current_dasa_time = response.get('current_dasa_time', 'N/A')
-        output.extend([
-            "\nCurrent Dasa Period:",
-            f"  - Mahadasha: {planet_map.get(current_dasa[0], current_dasa[0]) if len(current_dasa) > 0 else 'N/A'}",
-            f"  - Antardasha: {planet_map.get(current_dasa[1], current_dasa[1]) if len(current_dasa) > 1 else 'N/A'}",
-            f"  - Pratyantaradasha: {planet_map.get(current_dasa[2], current_dasa[2]) if len(current_dasa) > 2 else 'N/A'}",
-            f"  - Current Date: {current_dasa_time.strip()}"
-        ])
+        output = format_kp_mahadasha(data)
 
         # Save to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(output))
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(output)
 
         return True
 
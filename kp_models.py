@@ -0,0 +1,302 @@
+# kp_models.py
+import sys
+from enum import Enum
+from functools import lru_cache
+from dataclasses import dataclass, fields
+
+class PlanetName(Enum):
+    """Grahas (plus the Ascendant) by full name"""
+    SUN = "Sun"
+    MOON = "Moon"
+    MARS = "Mars"
+    MERCURY = "Mercury"
+    JUPITER = "Jupiter"
+    VENUS = "Venus"
+    SATURN = "Saturn"
+    RAHU = "Rahu"
+    KETU = "Ketu"
+    ASCENDANT = "Ascendant"
+
+    # Members are singletons compared by identity, so the C identity hash is enough; Enum's
+    # own __hash__ is a Python call on every dict lookup keyed by a planet
+    __hash__ = object.__hash__
+
+    @property
+    def abbr(self):
+        return PLANET_ABBREVIATIONS[self]
+
+class Sign(Enum):
+    """Rasis in zodiac order"""
+    ARIES = "Aries"
+    TAURUS = "Taurus"
+    GEMINI = "Gemini"
+    CANCER = "Cancer"
+    LEO = "Leo"
+    VIRGO = "Virgo"
+    LIBRA = "Libra"
+    SCORPIO = "Scorpio"
+    SAGITTARIUS = "Sagittarius"
+    CAPRICORN = "Capricorn"
+    AQUARIUS = "Aquarius"
+    PISCES = "Pisces"
+
+    __hash__ = object.__hash__
+
+PLANET_ABBREVIATIONS = {
+    PlanetName.SUN: "Su",
+    PlanetName.MOON: "Mo",
+    PlanetName.MARS: "Ma",
+    PlanetName.MERCURY: "Me",
+    PlanetName.JUPITER: "Ju",
+    PlanetName.VENUS: "Ve",
+    PlanetName.SATURN: "Sa",
+    PlanetName.RAHU: "Ra",
+    PlanetName.KETU: "Ke",
+    PlanetName.ASCENDANT: "As"
+}
+
+# Lookup by full name or abbreviation
+_PLANETS = {p.value: p for p in PlanetName}
+_PLANETS.update({abbr: p for p, abbr in PLANET_ABBREVIATIONS.items()})
+_SIGNS = {s.value: s for s in Sign}
+
+def planet_name(text):
+    """
+    Enum member for a planet name or abbreviation
+    :param text: str (e.g. 'Jupiter' or 'Ju')
+    :return: PlanetName, or the interned string when not a known planet
+    """
+    if text is None:
+        return None
+    return _PLANETS.get(text) or sys.intern(str(text))
+
+def sign_name(text):
+    """
+    Enum member for a sign name
+    :return: Sign, or the interned string when not a known sign
+    """
+    if text is None:
+        return None
+    return _SIGNS.get(text) or sys.intern(str(text))
+
+# Display text per enum member, read through plain dicts instead of Enum.value
+_LABELS = {member: member.value for enum in (PlanetName, Sign) for member in enum}
+_SHORT_LABELS = {**_LABELS, **PLANET_ABBREVIATIONS}
+
+def label(value, short=False):
+    """
+    Display text for an enum member or raw string
+    :param short: Use the planet abbreviation
+    """
+    text = (_SHORT_LABELS if short else _LABELS).get(value)
+    if text is not None:
+        return text
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+class PeriodLords(tuple):
+    """
+    Lords of one dasha period from mahadasha down. Instances are shared between charts
+    through the period_lords cache, so the display texts are worked out once per period
+    """
+    def __new__(cls, lords):
+        self = super().__new__(cls, lords)
+        self.texts = ('/'.join(label(lord) for lord in self), '/'.join(label(lord, True) for lord in self))
+        return self
+
+def period_label(lords, short=False):
+    """
+    Display text of a dasha period
+    :param lords: PeriodLords, or any tuple of PlanetName/str from mahadasha down
+    :param short: Use the planet abbreviations
+    """
+    texts = getattr(lords, 'texts', None)
+    if texts is not None:
+        return texts[short]
+    return '/'.join(label(lord, short) for lord in lords)
+
+# Parsed period strings ('Ju/Sa/Me' -> lords), shared by every chart
+@lru_cache(maxsize=4096)
+def period_lords(text, sep='/'):
+    """
+    Lords of an upstream period string such as 'Ju/Sa/Me'
+    :return: (tuple of PlanetName/str, short) where short tells if abbreviations were used
+    """
+    parts = text.split(sep)
+    lords = PeriodLords(planet_name(part) for part in parts)
+    return lords, isinstance(lords[0], PlanetName) and parts[0] == lords[0].abbr
+
+class SeriesLords(tuple):
+    """
+    The PeriodLords of one mahadasha's periods, shared by every chart with the same upstream
+    period list, with the period labels in the upstream style worked out once
+    """
+    def __new__(cls, periods, short):
+        self = super().__new__(cls, periods)
+        self.short = short
+        self.labels = tuple(period.texts[short] for period in self)
+        return self
+
+    def __getnewargs__(self):
+        return tuple(self), self.short
+
+# Parsed period lists, keyed by the whole upstream list: a mahadasha's periods always come in
+# the same Vimshottari order, so every chart repeats a few dozen distinct lists
+@lru_cache(maxsize=256)
+def series_lords(periods, sep='/'):
+    """
+    Lords of a list of upstream period strings
+    :param periods: tuple of str
+    :return: SeriesLords
+    """
+    lords = []
+    short = False
+    for text in periods:
+        period, short = period_lords(text, sep)
+        lords.append(period)
+    return SeriesLords(lords, short)
+
+def dasha_series(periods, dates, sep='/'):
+    """
+    DashaSeries from parallel upstream lists of period strings and start dates
+    :param periods: list of str (e.g. ['Ju/Ju', 'Ju/Sa', ...])
+    :param dates: list of str (start dates as given upstream)
+    """
+    lords = series_lords(tuple(periods), sep)
+    return DashaSeries(lords=lords, starts=tuple(map(str, dates)), short=lords.short)
+
+class _Model:
+    """Base for the chart records, which are keyword-only slotted dataclasses"""
+    __slots__ = ()
+
+    def to_dict(self):
+        return {field.name: _plain(getattr(self, field.name)) for field in fields(self)}
+
+def _plain(value):
+    if isinstance(value, _Model):
+        return value.to_dict()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (tuple, list)):
+        return [_plain(v) for v in value]
+    return value
+
+@dataclass(slots=True, kw_only=True)
+class Planet(_Model):
+    """A graha as reported by planet-details, kp-planets or kp-houses (unused fields stay None)"""
+    planet: PlanetName | str | None = None
+    abbr: str | None = None
+    sign: Sign | str | None = None
+    house: int | None = None
+    nakshatra: str | None = None
+    nakshatra_pada: int | None = None
+    nakshatra_no: int | None = None
+    nakshatra_lord: PlanetName | str | None = None
+    sign_lord: PlanetName | str | None = None
+    local_degree: float | None = None
+    global_degree: float | None = None
+    retro: bool | None = None
+    combust: bool | None = None
+    sub_lord: PlanetName | str | None = None
+    sub_sub_lord: PlanetName | str | None = None
+    pseudo_sign: Sign | str | None = None
+
+    @property
+    def name(self):
+        return label(self.planet)
+
+@dataclass(slots=True, kw_only=True)
+class HouseCusp(_Model):
+    """A bhava with its cusp lords, span and occupants"""
+    house: int | None = None
+    start_sign: Sign | str | None = None
+    end_sign: Sign | str | None = None
+    start_nakshatra_lord: PlanetName | str | None = None
+    end_nakshatra_lord: PlanetName | str | None = None
+    cusp_sub_lord: PlanetName | str | None = None
+    cusp_sub_sub_lord: PlanetName | str | None = None
+    bhavmadhya: float | None = None
+    length: float | None = None
+    local_start_degree: float | None = None
+    local_end_degree: float | None = None
+    global_start_degree: float | None = None
+    global_end_degree: float | None = None
+    planets: tuple | None = None  # Planet occupants
+
+@dataclass(slots=True, kw_only=True)
+class DashaPeriod(_Model):
+    """One dasha period: lords from mahadasha down, and its start date as given upstream"""
+    lords: tuple | None = None
+    start: str | None = None
+    short: bool | None = None
+
+    @property
+    def label(self):
+        return period_label(self.lords, self.short)
+
+@dataclass(slots=True, kw_only=True)
+class DashaSeries(_Model):
+    """
+    The periods of one mahadasha at one level, stored column-wise: lord tuples are shared
+    between charts, start dates are kept as given upstream
+    """
+    lords: tuple = ()  # SeriesLords, or any tuple of period lord tuples
+    starts: tuple = ()  # str per period
+    short: bool = False
+
+    @property
+    def labels(self):
+        if isinstance(self.lords, SeriesLords) and self.lords.short == self.short:
+            return self.lords.labels
+        return tuple(period_label(lords, self.short) for lords in self.lords)
+
+    def __len__(self):
+        return len(self.lords)
+
+    def __iter__(self):
+        for lords, start in zip(self.lords, self.starts):
+            yield DashaPeriod(lords=lords, start=start, short=self.short)
+
+    def __getitem__(self, index):
+        return DashaPeriod(lords=self.lords[index], start=self.starts[index], short=self.short)
+
+    def to_dict(self):
+        return [period.to_dict() for period in self]
+
+@dataclass(slots=True, kw_only=True)
+class DashaSummary(_Model):
+    """Birth and current dasha strings (e.g. 'Ju>Sa>Me') with their dates, as given upstream"""
+    birth_dasa: str | None = None
+    birth_dasa_time: str | None = None
+    current_dasa: str | None = None
+    current_dasa_time: str | None = None
+
+@dataclass(slots=True, kw_only=True)
+class Yoga(_Model):
+    """A yoga with its strength in percent"""
+    name: str | None = None
+    strength: float | None = None
+    planets: tuple | None = None
+    houses: tuple | None = None
+    meaning: str | None = None
+
+@dataclass(slots=True, kw_only=True)
+class Chart(_Model):
+    """
+    Everything parsed for one birth chart
+    planets: planet-details positions; kp_planets: kp-planets sub lord data;
+    antardashas/paryantardashas: one DashaSeries per mahadasha;
+    yoga_counts: (total, raja, dhana, daridra)
+    """
+    planets: tuple | None = None
+    planet_dasha: DashaSummary | None = None
+    kp_planets: tuple | None = None
+    midheaven: float | None = None
+    ascendant: float | None = None
+    houses: tuple | None = None
+    mahadasha: DashaSummary | None = None
+    antardashas: tuple | None = None
+    paryantardashas: tuple | None = None
+    yogas: tuple | None = None
+    yoga_counts: tuple | None = None
@@ -1,11 +1,75 @@
 # kp_paryantardasha_parser.py
 import json
+from kp_models import Chart, dasha_series, label
 
-def parse_kp_paryantardasha(json_input, output_file):
+def extract_kp_paryantardasha(data):
+    """
+    Build paryantardasha periods from decoded paryantar-dasha JSON
+    :param data: dict (JSON data)
+    :return: tuple of DashaSeries, one per mahadasha
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid response status")
+
+    response = data.get('response', {})
+
+    # Get paryantardasha lists
+    paryantardashas = response.get('paryantardasha', [])
+    dates = response.get('paryantardasha_order', [])
+
+    groups = []
+    for md_idx, (md_periods, md_dates) in enumerate(zip(paryantardashas, dates)):
+        # Flatten nested structure
+        try:
+            periods = [p for sublist in md_periods for p in sublist]
+            dates_flat = [d for sublist in md_dates for d in sublist]
+        except Exception as e:
+            print(f"Error flattening structure for Mahadasha {md_idx}: {str(e)}")
+            continue
+
+        if len(periods) != len(dates_flat):
+            print(f"Skipping Mahadasha {md_idx} due to length mismatch")
+            continue
+
+        groups.append(dasha_series(periods, dates_flat))
+    return tuple(groups)
+
+def render_kp_paryantardasha(chart):
+    """
+    Format the paryantardasha part of a chart
+    :param chart: Chart (paryantardashas)
+    :return: Analysis text
+    """
+    output = ["=== KP Paryantardasha Analysis ==="]
+
+    # Process each mahadasha
+    for md_idx, periods in enumerate(chart.paryantardashas):
+        # Get mahadasha name from first entry
+        if periods:
+            mahadasha_name = label(periods.lords[0][0], periods.short)
+        else:
+            mahadasha_name = f"Mahadasha-{md_idx+1}"
+        output.append(f"\n✦ {mahadasha_name} Mahadasha:")
+
+        # Add all paryantardashas with dates
+        for period, start in zip(periods.labels, periods.starts):
+            output.append(f"  - {period}: {start}")
+
+    return '\n'.join(output)
+
+def format_kp_paryantardasha(data):
+    """
+    Format KP Paryantardasha details from decoded JSON
+    :param data: dict (JSON data)
+    :return: Analysis text
+    """
+    return render_kp_paryantardasha(Chart(paryantardashas=extract_kp_paryantardasha(data)))
+
+def parse_kp_paryantardasha(json_input, output_file=None):
     """
     Parse KP Paryantardasha details from JSON input and save formatted output
     :param json_input: str (file path) or dict (JSON data)
-    :param output_file: str (output file path)
+    :param output_file: str (output file path), None to skip writing
     :return: True if successful, False otherwise
     """
     try:
@@ -16,41 +80,12 @@ def parse_kp_paryantardasha(json_input, output_file):
         else:
             data = json_input
 
-        if data.get('status') != 200:
-            raise ValueError("Invalid response status")
-
-        response = data.get('response', {})
-        output = ["=== KP Paryantardasha Analysis ==="]
-
-        # Get paryantardasha lists
-        paryantardashas = response.get('paryantardasha', [])
-        dates = response.get('paryantardasha_order', [])
-
-        # Process each mahadasha
-        for md_idx, (md_periods, md_dates) in enumerate(zip(paryantardashas, dates)):
-            # Flatten nested structure
-            try:
-                periods = [p for sublist in md_periods for p in sublist]
-                dates_flat = [d for sublist in md_dates for d in sublist]
-            except Exception as e:
-                print(f"Error flattening structure for Mahadasha {md_idx}: {str(e)}")
-                continue
-
-            if len(periods) != len(dates_flat):
-                print(f"Skipping Mahadasha {md_idx} due to length mismatch")
-                continue
-
-            # Get mahadasha name from first entry
-            mahadasha_name = periods[0].split('/')[0] if periods else f"Mahadasha-{md_idx+1}"
-            output.append(f"\n✦ {mahadasha_name} Mahadasha:")
-
-            # Add all paryantardashas with dates
-            for period, date_str in zip(periods, dates_flat):
-                output.append(f"  - {period}: {date_str}")
+        output = format_kp_paryantardasha(data)
 
         # Save to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(output))
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(output)
 
         return True
 
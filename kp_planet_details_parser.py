@@ -1,11 +1,98 @@
 # kp_planet_parser.py
+import sys
 import json
+from kp_models import Chart, Planet, DashaSummary, planet_name, sign_name, label
 
-def parse_kp_planet_details(json_input, output_file):
+def extract_kp_planet_details(data):
+    """
+    Build Planet records from decoded planet-details JSON
+    :param data: dict (JSON data)
+    :return: (tuple of Planet, DashaSummary)
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid response status")
+
+    response = data.get('response', {})
+
+    # Parse planets (entries 0-9)
+    planets = []
+    for pid in [str(i) for i in range(10)]:
+        pdata = response.get(pid, {})
+        if not pdata:
+            continue
+
+        planets.append(Planet(
+            planet=planet_name(pdata['full_name']),
+            abbr=sys.intern(pdata['name']),
+            sign=sign_name(pdata['zodiac']),
+            house=pdata['house'],
+            nakshatra=sys.intern(pdata['nakshatra']),
+            nakshatra_pada=pdata['nakshatra_pada'],
+            nakshatra_lord=planet_name(pdata['nakshatra_lord']),
+            sign_lord=planet_name(pdata['zodiac_lord']),
+            local_degree=pdata['local_degree'],
+            global_degree=pdata['global_degree'],
+            retro=bool(pdata.get('retro', False)),
+            combust=bool(pdata.get('is_combust', False))
+        ))
+
+    dasha = DashaSummary(
+        birth_dasa=response.get('birth_dasa'),
+        birth_dasa_time=response.get('birth_dasa_time'),
+        current_dasa=response.get('current_dasa'),
+        current_dasa_time=response.get('current_dasa_time')
+    )
+    return tuple(planets), dasha
+
+def render_kp_planet_details(chart):
+    """
+    Format the planet-details part of a chart
+    :param chart: Chart (planets, planet_dasha)
+    :return: Analysis text
+    """
+    output = ["=== KP Planetary Details Analysis ==="]
+
+    for planet in chart.planets:
+        planet_info = [
+            f"\n✦ {label(planet.planet)} ({planet.abbr})",
+            f"  - Zodiac: {label(planet.sign)} (House {planet.house})",
+            f"  - Nakshatra: {planet.nakshatra} (Pada {planet.nakshatra_pada})",
+            f"  - Lords: Nakshatra - {label(planet.nakshatra_lord)}, Zodiac - {label(planet.sign_lord)}",
+            f"  - Degrees: Local {planet.local_degree:.2f}°, Global {planet.global_degree:.2f}°",
+            f"  - Retrograde: {'Yes' if planet.retro else 'No'}",
+            f"  - Combust: {'Yes' if planet.combust else 'No'}"
+        ]
+        output.extend(planet_info)
+
+    # Add Dasa information
+    dasha = chart.planet_dasha
+    output.extend([
+        "\n=== Dasa Periods ===",
+        f"Birth Dasa: {_or_na(dasha.birth_dasa)}",
+        f"Current Dasa: {_or_na(dasha.current_dasa)}",
+        f"Start Date: {_or_na(dasha.birth_dasa_time)}",
+        f"Current Date: {_or_na(dasha.current_dasa_time)}"
+    ])
+
+    return '\n'.join(output)
+
+def _or_na(value):
+    return 'N/A' if value is None else value
+
+def format_kp_planet_details(data):
+    """
+    Format KP planet details from decoded JSON
+    :param data: dict (JSON data)
+    :return: Analysis text
+    """
+    planets, dasha = extract_kp_planet_details(data)
+    return render_kp_planet_details(Chart(planets=planets, planet_dasha=dasha))
+
+def parse_kp_planet_details(json_input, output_file=None):
     """
     Parse KP planet details from JSON (file path or dict) and save to output file
     :param json_input: str (file path) or dict (JSON data)
-    :param output_file: str (output file path)
+    :param output_file: str (output file path), None to skip writing
     :return: True if successful, False otherwise
     """
     try:
@@ -16,41 +103,12 @@ def parse_kp_planet_details(json_input, output_file):
         else:
             data = json_input
 
-        if data.get('status') != 200:
-            raise ValueError("Invalid response status")
-
-        planets = data.get('response', {})
-        output = ["=== KP Planetary Details Analysis ==="]
-
-        # Parse planets (entries 0-9)
-        for pid in [str(i) for i in range(10)]:
-            pdata = planets.get(pid, {})
-            if not pdata:
-                continue
-
-            planet_info = [
-                f"\n✦ {pdata['full_name']} ({pdata['name']})",
-                f"  - Zodiac: {pdata['zodiac']} (House {pdata['house']})",
-                f"  - Nakshatra: {pdata['nakshatra']} (Pada {pdata['nakshatra_pada']})",
-                f"  - Lords: Nakshatra - {pdata['nakshatra_lord']}, Zodiac - {pdata['zodiac_lord']}",
-                f"  - Degrees: Local {pdata['local_degree']:.2f}°, Global {pdata['global_degree']:.2f}°",
-                f"  - Retrograde: {'Yes' if pdata.get('retro', False) else 'No'}",
-                f"  - Combust: {'Yes' if pdata.get('is_combust', False) else 'No'}"
-            ]
-            output.extend(planet_info)
-
-        # Add Dasa information
-        output.extend([
-            "\n=== Dasa Periods ===",
-            f"Birth Dasa: {planets.get('birth_dasa', 'N/A')}",
-            f"Current Dasa: {planets.get('current_dasa', 'N/A')}",
-            f"Start Date: {planets.get('birth_dasa_time', 'N/A')}",
-            f"Current Date: {planets.get('current_dasa_time', 'N/A')}"
-        ])
+        output = format_kp_planet_details(data)
 
         # Save to specified output file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(output))
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(output)
 
         return True
 
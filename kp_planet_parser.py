@@ -1,48 +1,108 @@
 # kp_planet_parser.py
+import sys
 import json
+from kp_models import Chart, Planet, planet_name, sign_name, label
+
+def extract_kp_planets(data):
+    """
+    Build Planet records from decoded kp-planets JSON
+    :param data: dict (JSON data)
+    :return: (tuple of Planet, midheaven degree, ascendant degree)
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid response status")
+
+    response = data.get('response', {})
+
+    # Parse planets (exclude midheaven/ascendant)
+    planets = tuple(
+        Planet(
+            planet=planet_name(pdata['name']),
+            abbr=sys.intern(pdata['name']),
+            sign=sign_name(pdata['zodiac']),
+            house=pdata['house'],
+            retro=bool(pdata['retro']),
+            global_degree=pdata['global_degree'],
+            local_degree=pdata['local_degree'],
+            nakshatra=sys.intern(pdata['pseudo_nakshatra']),
+            nakshatra_pada=pdata['pseudo_nakshatra_pada'],
+            nakshatra_lord=planet_name(pdata['pseudo_nakshatra_lord']),
+            sub_lord=planet_name(pdata['sub_lord']),
+            sub_sub_lord=planet_name(pdata['sub_sub_lord']),
+            sign_lord=planet_name(pdata['pseudo_rasi_lord']),
+            pseudo_sign=sign_name(pdata['pseudo_rasi'])
+        )
+        for pid, pdata in response.items() if pid not in ('midheaven', 'ascendant')
+    )
+    return planets, response.get('midheaven', 0), response.get('ascendant', 0)
+
+def render_kp_planets(chart):
+    """
+    Format the kp-planets part of a chart
+    :param chart: Chart (kp_planets, midheaven, ascendant)
+    :return: Analysis text
+    """
+    output = ["=== KP Planetary Positions Analysis ==="]
+
+    for planet in chart.kp_planets:
+        planet_info = [
+            f"\n✦ {planet.abbr} ({label(planet.sign)})",
+            f"  - House Position: {planet.house}",
+            f"  - Retrograde: {'Yes' if planet.retro else 'No'}",
+            f"  - Degrees: {planet.global_degree:.2f}° (Global) / {planet.local_degree:.2f}° (Local)",
+            f"  - Nakshatra: {planet.nakshatra} (Pada {planet.nakshatra_pada})",
+            f"  - Nakshatra Lord: {label(planet.nakshatra_lord)}",
+            f"  - Sublord Chain: {label(planet.sub_lord)} → {label(planet.sub_sub_lord)}",
+            f"  - Sign Lord: {label(planet.sign_lord)}",
+            f"  - Pseudo Sign: {label(planet.pseudo_sign)} (Based on Nakshatra)"
+        ]
+        output.extend(planet_info)
+
+    # Add special points
+    output.extend([
+        "\n=== Special Points ===",
+        f"Midheaven (MC): {chart.midheaven:.2f}°",
+        f"Ascendant (ASC): {chart.ascendant:.2f}°"
+    ])
+
+    return "\n".join(output)
+
+def _kp_planets_chart(data):
+    planets, midheaven, ascendant = extract_kp_planets(data)
+    return Chart(kp_planets=planets, midheaven=midheaven, ascendant=ascendant)
 
 def parse_kp_planets(json_data):
     """Parse KP planet data into human-readable format for LLMs"""
     try:
         if json_data.get('status') != 200:
             return "Error: Invalid response status"
-            
-        planets = json_data.get('response', {})
-        output = ["=== KP Planetary Positions Analysis ==="]
-        
-        # Parse planets (exclude midheaven/ascendant)
-        for pid, pdata in [(k,v) for k,v in planets.items() if k not in ('midheaven', 'ascendant')]:
-            planet_info = [
-                f"\n✦ {pdata['name']} ({pdata['zodiac']})",
-                f"  - House Position: {pdata['house']}",
-                f"  - Retrograde: {'Yes' if pdata['retro'] else 'No'}",
-                f"  - Degrees: {pdata['global_degree']:.2f}° (Global) / {pdata['local_degree']:.2f}° (Local)",
-                f"  - Nakshatra: {pdata['pseudo_nakshatra']} (Pada {pdata['pseudo_nakshatra_pada']})",
-                f"  - Nakshatra Lord: {pdata['pseudo_nakshatra_lord']}",
-                f"  - Sublord Chain: {pdata['sub_lord']} → {pdata['sub_sub_lord']}",
-                f"  - Sign Lord: {pdata['pseudo_rasi_lord']}",
-                f"  - Pseudo Sign: {pdata['pseudo_rasi']} (Based on Nakshatra)"
-            ]
-            output.extend(planet_info)
-        
-        # Add special points
-        output.extend([
-            "\n=== Special Points ===",
-            f"Midheaven (MC): {planets.get('midheaven', 0):.2f}°",
-            f"Ascendant (ASC): {planets.get('ascendant', 0):.2f}°"
-        ])
-        
-        return "\n".join(output)
+
+        return render_kp_planets(_kp_planets_chart(json_data))
     
     except Exception as e:
         return f"Planet Parsing Error: {str(e)}"
 
-def get_kp_planets(input_source, output_file="output_kp_planet_analysis.txt"):
+def format_kp_planets(data):
+    """
+    Format decoded KP planet JSON, raising instead of returning error text
+    :param data: dict (JSON data)
+    :return: Analysis text
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid response status")
+
+    try:
+        chart = _kp_planets_chart(data)
+    except Exception as e:
+        raise ValueError(f"Planet Parsing Error: {str(e)}")
+    return render_kp_planets(chart)
+
+def get_kp_planets(input_source, output_file=None):
     """
     Get KP planet analysis and save to file
     :param input_source: str (file path) or dict (JSON data)
-    :param output_file: Output file path (default: output_kp_planet_analysis.txt)
-    :return: Status message
+    :param output_file: Optional output file path
+    :return: Status message, or the analysis text when no output file is given
     """
     try:
         # Load data
@@ -55,6 +115,9 @@ def get_kp_planets(input_source, output_file="output_kp_planet_analysis.txt"):
         # Generate analysis
         analysis = parse_kp_planets(data)
         
+        if not output_file:
+            return analysis
+
         # Save to file
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(analysis)
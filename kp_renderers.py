@@ -0,0 +1,289 @@
+# kp_renderers.py
+import json
+from kp_house_parser import render_kp_houses, get_house_significance
+from kp_planet_parser import render_kp_planets
+from kp_planet_details_parser import render_kp_planet_details
+from kp_mahadasha_parser import render_kp_mahadasha
+from kp_antardasha_parser import render_kp_antardasha
+from kp_paryantardasha_parser import render_kp_paryantardasha
+from kp_yoga_parser import render_kp_yogas
+from kp_analyzer import KPAstrologyCleaner, SIGNIFICATOR_COLUMNS, house_list
+from kp_models import label
+
+OUTPUT_FORMATS = ('text', 'json', 'markdown')
+FILE_EXTENSIONS = {'text': '.txt', 'json': '.json', 'markdown': '.md'}
+
+SECTION_TITLES = {
+    'planet_position': 'Planet Positions',
+    'house': 'Houses',
+    'planet': 'KP Planets',
+    'mahadasha': 'Mahadasha',
+    'antardasha': 'Antardasha',
+    'paryantardasha': 'Paryantardasha',
+    'yoga': 'Yogas',
+    'analysis': 'Consolidated Analysis'
+}
+
+# Today's text layouts, one per stage
+TEXT_RENDERERS = {
+    'planet_position': render_kp_planet_details,
+    'house': render_kp_houses,
+    'planet': render_kp_planets,
+    'mahadasha': render_kp_mahadasha,
+    'antardasha': render_kp_antardasha,
+    'paryantardasha': render_kp_paryantardasha,
+    'yoga': render_kp_yogas
+}
+
+def check_format(output_format):
+    """
+    Validate an output format name
+    :raises ValueError: for unknown formats
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of: {', '.join(OUTPUT_FORMATS)}")
+    return output_format
+
+# Structured sections
+def _compact(model):
+    # Model fields without the unset ones
+    return {name: value for name, value in model.to_dict().items() if value is not None}
+
+def _dasha_groups(groups):
+    return [
+        {'mahadasha': label(series.lords[0][0]), 'periods': series.labels, 'starts': series.starts}
+        for series in groups if len(series)
+    ]
+
+def section_data(chart, key):
+    """
+    One stage of a chart as JSON-ready data
+    :param chart: Chart (see kp_models)
+    :param key: Stage name
+    :return: dict
+    """
+    if key == 'planet_position':
+        return {
+            'planets': [_compact(p) for p in chart.planets],
+            'dasha': chart.planet_dasha.to_dict() if chart.planet_dasha else None
+        }
+    if key == 'house':
+        return {'houses': [
+            dict(_compact(h), planets=[_compact(p) for p in h.planets], signification=get_house_significance(h.house))
+            for h in chart.houses
+        ]}
+    if key == 'planet':
+        return {
+            'planets': [_compact(p) for p in chart.kp_planets],
+            'midheaven': chart.midheaven,
+            'ascendant': chart.ascendant
+        }
+    if key == 'mahadasha':
+        return chart.mahadasha.to_dict()
+    if key == 'antardasha':
+        return {'mahadashas': _dasha_groups(chart.antardashas)}
+    if key == 'paryantardasha':
+        return {'mahadashas': _dasha_groups(chart.paryantardashas)}
+    if key == 'yoga':
+        total, raja, dhana, daridra = chart.yoga_counts
+        return {
+            'yogas': [_compact(y) for y in chart.yogas],
+            'counts': {'total': total, 'raja': raja, 'dhana': dhana, 'daridra': daridra}
+        }
+    raise KeyError(f"Unknown section: {key}")
+
+def analysis_data(chart):
+    """
+    Consolidated analysis as data, from the same fields as the text summary
+    :param chart: Chart (see kp_models)
+    :return: dict with current_dasa, planets, significant_yogas and houses
+    """
+    cleaner = KPAstrologyCleaner()
+    cleaner.load_chart(chart)
+    return cleaner.summary()
+
+# Markdown
+def _table(headers, rows):
+    escape = lambda value: str('' if value is None else value).replace('|', '\\|')
+    lines = ['| ' + ' | '.join(headers) + ' |', '|' + '---|' * len(headers)]
+    lines.extend('| ' + ' | '.join(escape(v) for v in row) + ' |' for row in rows)
+    return '\n'.join(lines)
+
+def _yes_no(value):
+    return 'Yes' if value else 'No'
+
+def _markdown_dasha_summary(summary):
+    return '\n'.join([
+        f"- **Birth dasa:** {summary.birth_dasa or 'N/A'} (from {(summary.birth_dasa_time or 'N/A').strip()})",
+        f"- **Current dasa:** {summary.current_dasa or 'N/A'} (from {(summary.current_dasa_time or 'N/A').strip()})"
+    ])
+
+def _markdown_dasha_groups(groups):
+    parts = []
+    for group in _dasha_groups(groups):
+        rows = zip(group['periods'], group['starts'])
+        parts.append(f"### {group['mahadasha']} Mahadasha\n\n" + _table(['Period', 'Start'], rows))
+    return '\n\n'.join(parts)
+
+def section_markdown(chart, key):
+    """
+    One stage of a chart as Markdown
+    :return: str
+    """
+    title = f"## {SECTION_TITLES[key]}\n\n"
+    if key == 'planet_position':
+        table = _table(
+            ['Planet', 'Sign', 'House', 'Nakshatra', 'Pada', 'Star Lord', 'Sign Lord', 'Degree', 'Retro', 'Combust'],
+            [
+                [label(p.planet), label(p.sign), p.house, p.nakshatra, p.nakshatra_pada, label(p.nakshatra_lord),
+                 label(p.sign_lord), f"{p.global_degree:.2f}°", _yes_no(p.retro), _yes_no(p.combust)]
+                for p in chart.planets
+            ]
+        )
+        dasha = f"\n\n{_markdown_dasha_summary(chart.planet_dasha)}" if chart.planet_dasha else ''
+        return title + table + dasha
+    if key == 'house':
+        return title + _table(
+            ['House', 'Signification', 'Signs', 'Cusp Sub Lord', 'Sub-Sub Lord', 'Bhavmadhya', 'Span', 'Occupants'],
+            [
+                [h.house, get_house_significance(h.house), f"{label(h.start_sign)} → {label(h.end_sign)}",
+                 label(h.cusp_sub_lord), label(h.cusp_sub_sub_lord), f"{h.bhavmadhya:.2f}°", f"{h.length:.2f}°",
+                 ', '.join(label(p.planet) for p in h.planets) or '-']
+                for h in chart.houses
+            ]
+        )
+    if key == 'planet':
+        table = _table(
+            ['Planet', 'Sign', 'House', 'Degree', 'Nakshatra', 'Star Lord', 'Sub Lord', 'Sub-Sub Lord', 'Retro'],
+            [
+                [p.abbr, label(p.sign), p.house, f"{p.global_degree:.2f}°", p.nakshatra, label(p.nakshatra_lord),
+                 label(p.sub_lord), label(p.sub_sub_lord), _yes_no(p.retro)]
+                for p in chart.kp_planets
+            ]
+        )
+        return title + table + f"\n\n- **Midheaven:** {chart.midheaven:.2f}°\n- **Ascendant:** {chart.ascendant:.2f}°"
+    if key == 'mahadasha':
+        return title + _markdown_dasha_summary(chart.mahadasha)
+    if key == 'antardasha':
+        return title + _markdown_dasha_groups(chart.antardashas)
+    if key == 'paryantardasha':
+        return title + _markdown_dasha_groups(chart.paryantardashas)
+    if key == 'yoga':
+        total, raja, dhana, daridra = chart.yoga_counts
+        counts = f"- **Total:** {total} (Raja {raja}, Dhana {dhana}, Daridra {daridra})\n\n"
+        return title + counts + _table(
+            ['Yoga', 'Strength', 'Planets', 'Houses', 'Meaning'],
+            [
+                [y.name, f"{y.strength:.2f}%", ', '.join(label(p) for p in y.planets),
+                 ', '.join(map(str, y.houses)), y.meaning]
+                for y in chart.yogas
+            ]
+        )
+    raise KeyError(f"Unknown section: {key}")
+
+def analysis_markdown(chart):
+    data = analysis_data(chart)
+    output = [f"## {SECTION_TITLES['analysis']}", "", "### Dasa Periods", ""]
+    current = data['current_dasa']
+    if current:
+        output.append(f"- **Current Mahadasha:** {current.get('mahadasha', 'N/A')}")
+        output.append(f"- **Start Date:** {current.get('start date', current.get('current date', 'N/A'))}")
+    output.extend(["", "### Planetary Positions", ""])
+    output.append(_table(
+        ['Planet', 'House', 'Nakshatra', 'Lord', 'Retrograde', 'Combust'],
+        [
+            [planet, row.get('house', ''), row.get('nakshatra', ''), row.get('lord', ''),
+             row.get('retrograde', ''), row.get('combust', '')]
+            for planet, row in data['planets'].items()
+        ]
+    ))
+    output.extend(["", "### Significant Yogas", ""])
+    output.extend(
+        f"- {yoga['name']}: {', '.join(yoga['planets'])} (Strength: {yoga.get('strength', 'Unknown')})"
+        for yoga in data['significant_yogas']
+    )
+    output.extend(["", "### House Analysis", ""])
+    output.extend(f"- House {house}: {', '.join(planets)}" for house, planets in data['houses'].items())
+    if data['significators']:
+        output.extend(["", "### KP Significators", ""])
+        output.append(_table(
+            ['Planet', 'Houses', 'Star of occupant', 'Occupant', 'Star of owner', 'Owner'],
+            [[planet] + [house_list(row[key]) for key in SIGNIFICATOR_COLUMNS] for planet, row in data['significators'].items()]
+        ))
+    return '\n'.join(output)
+
+# Entry points
+def render_section(chart, key, output_format='text'):
+    """
+    Render one stage of a parsed chart
+    :param chart: Chart (see kp_models)
+    :param key: Stage name
+    :param output_format: 'text' (today's layout), 'json' or 'markdown'
+    :return: str for text/markdown, dict for json
+    """
+    if output_format == 'text':
+        return TEXT_RENDERERS[key](chart)
+    if output_format == 'json':
+        return section_data(chart, key)
+    if output_format == 'markdown':
+        return section_markdown(chart, key)
+    check_format(output_format)
+
+def render_analysis(chart, output_format='text'):
+    """
+    Consolidated analysis of a parsed chart
+    :return: str for text/markdown, dict for json
+    """
+    if output_format == 'text':
+        return KPAstrologyCleaner().clean_chart(chart)
+    if output_format == 'json':
+        return analysis_data(chart)
+    if output_format == 'markdown':
+        return analysis_markdown(chart)
+    check_format(output_format)
+
+def render_missing(key, reason, output_format='text'):
+    """
+    Placeholder for a section a partial analysis could not build
+    :param key: Stage name, or 'analysis'
+    :param reason: str (why the section is missing)
+    :return: str for text/markdown, dict for json
+    """
+    if output_format == 'json':
+        return {'missing': True, 'reason': reason}
+    if output_format == 'markdown':
+        return f"## {SECTION_TITLES[key]}\n\n_Unavailable: {reason}_"
+    check_format(output_format)
+    return f"{SECTION_TITLES[key]}: unavailable ({reason})"
+
+def mark_partial(analysis, missing, output_format='text'):
+    """
+    Flag a consolidated analysis built without some sections
+    :param analysis: str for text/markdown, dict for json (from render_analysis)
+    :param missing: dict of stage -> reason
+    :return: analysis with the missing sections named
+    """
+    if not missing:
+        return analysis
+    if output_format == 'json':
+        return dict(analysis, missing_sections=sorted(missing))
+    titles = ', '.join(SECTION_TITLES[key] for key in missing)
+    if output_format == 'markdown':
+        return f"> **Partial analysis** - missing sections: {titles}\n\n{analysis}"
+    return f"PARTIAL ANALYSIS - missing sections: {titles}\n\n{analysis}"
+
+def serialize(report):
+    """
+    File contents for a rendered report (compact JSON for structured data)
+    :return: str
+    """
+    if isinstance(report, str):
+        return report
+    return json.dumps(report, separators=(',', ':'), ensure_ascii=False)
+
+def output_filename(filename, output_format):
+    """Swap a report file's extension for the format's"""
+    if output_format == 'text':
+        return filename
+    base, _ = filename.rsplit('.', 1) if '.' in filename else (filename, '')
+    return base + FILE_EXTENSIONS[output_format]
@@ -0,0 +1,202 @@
+# kp_significators.py
+import json
+import numpy as np
+from kp_models import planet_name
+from kp_vimshottari import DASHA_LORDS
+from kp_sublords import SIGNS, SIGN_LORDS
+
+LORD_INDEX = {lord: i for i, lord in enumerate(DASHA_LORDS)}
+SIGN_INDEX = {sign: i for i, sign in enumerate(SIGNS)}
+SIGN_OWNERS = [int(lord) for lord in SIGN_LORDS]
+HOUSES = np.arange(1, 13, dtype=np.int8)
+
+# Significator levels, in the order the matrices are stacked
+LEVELS = ('occupant', 'star_of_occupant', 'owner', 'star_of_owner')
+# KP strength of each level: a planet in the star of an occupant gives the house's results
+# most strongly, then the occupant, the planets in the star of the owner and the owner
+LEVEL_WEIGHTS = np.array([3, 4, 1, 2], dtype=np.int8)
+
+def _lord(value):
+    # DASHA_LORDS index of a planet (enum, name or abbreviation), -1 when unknown
+    return LORD_INDEX.get(planet_name(value) if isinstance(value, str) else value, -1)
+
+def chart_lists(chart):
+    """
+    The three inputs of the significator matrices for one parsed chart
+    :param chart: Chart with houses and kp_planets (or planets)
+    :return: (planet_house [9], star_lord [9], owner [12]) int lists in DASHA_LORDS order,
+             -1 where the chart does not say
+    """
+    planet_house = [-1] * len(DASHA_LORDS)
+    star_lord = [-1] * len(DASHA_LORDS)
+    owner = [-1] * len(HOUSES)
+
+    # Planet rows, least to most specific: KP planets win over planet details
+    for planet in (chart.planets or ()) + (chart.kp_planets or ()):
+        i = _lord(planet.planet)
+        if i < 0:
+            continue
+        if planet.house is not None:
+            planet_house[i] = int(planet.house)
+        if planet.nakshatra_lord is not None:
+            star_lord[i] = _lord(planet.nakshatra_lord)
+
+    # Cusps: the sign on each cusp gives the owner; occupants are placed by the cusps too
+    for house in chart.houses or ():
+        sign = SIGN_INDEX.get(house.start_sign)
+        if sign is not None and 1 <= house.house <= 12:
+            owner[house.house - 1] = SIGN_OWNERS[sign]
+        for planet in house.planets:
+            i = _lord(planet.planet)
+            if i >= 0:
+                planet_house[i] = house.house
+    return planet_house, star_lord, owner
+
+def chart_arrays(chart):
+    """chart_lists() as int8 arrays: (planet_house (9,), star_lord (9,), owner (12,))"""
+    return tuple(np.array(values, dtype=np.int8) for values in chart_lists(chart))
+
+def significators(chart):
+    """
+    One chart's significators, worked out in plain Python: for a single chart the array set-up
+    of SignificatorMatrix costs more than the comparisons it vectorizes
+    :param chart: Chart with houses and kp_planets (or planets)
+    :return: dict as SignificatorMatrix.from_chart(chart).to_dict()
+    """
+    planet_house, star_lord, owner = chart_lists(chart)
+    owned = [[] for _ in DASHA_LORDS]
+    for house, lord in enumerate(owner, 1):
+        if lord >= 0:
+            owned[lord].append(house)
+
+    result = {}
+    for i, lord in enumerate(DASHA_LORDS):
+        star = star_lord[i]
+        star_house = planet_house[star] if star >= 0 else -1
+        row = {
+            'occupant': [planet_house[i]] if 1 <= planet_house[i] <= 12 else [],
+            'star_of_occupant': [star_house] if 1 <= star_house <= 12 else [],
+            'owner': list(owned[i]),
+            'star_of_owner': list(owned[star]) if star >= 0 else []
+        }
+        result[lord.value] = dict({'houses': sorted(set().union(*row.values()))}, **row)
+    return result
+
+class SignificatorMatrix:
+    """
+    KP significators of a batch of charts as one boolean array levels[chart, level, planet, house]
+    (planets in DASHA_LORDS order, houses 1-12 on the last axis). Every level is an elementwise
+    comparison of small per-chart arrays, so a whole batch is built in a handful of NumPy operations
+    """
+    __slots__ = ('levels',)
+
+    def __init__(self, levels):
+        """
+        :param levels: bool array (charts, len(LEVELS), 9, 12)
+        """
+        self.levels = levels
+
+    def __len__(self):
+        return self.levels.shape[0]
+
+    @classmethod
+    def from_arrays(cls, planet_house, star_lord, owner):
+        """
+        :param planet_house: int array (charts, 9) of houses 1-12, -1 unknown
+        :param star_lord: int array (charts, 9) of the DASHA_LORDS index of each planet's star lord, -1 unknown
+        :param owner: int array (charts, 12) of the DASHA_LORDS index of each house's owner, -1 unknown
+        """
+        planet_house = np.atleast_2d(np.asarray(planet_house, dtype=np.int8))
+        star_lord = np.atleast_2d(np.asarray(star_lord, dtype=np.int8))
+        owner = np.atleast_2d(np.asarray(owner, dtype=np.int8))
+        planets = np.arange(len(DASHA_LORDS), dtype=np.int8)
+        known_star = (star_lord >= 0)[:, :, None]
+
+        # House of each planet's star lord: a planet in the star of an occupant of h
+        star_house = np.where(star_lord >= 0, np.take_along_axis(planet_house, np.maximum(star_lord, 0), axis=1), -1)
+        levels = np.stack([
+            planet_house[:, :, None] == HOUSES,
+            star_house[:, :, None] == HOUSES,
+            owner[:, None, :] == planets[None, :, None],
+            (owner[:, None, :] == star_lord[:, :, None]) & known_star
+        ], axis=1)
+        return cls(levels)
+
+    @classmethod
+    def from_charts(cls, charts):
+        """Batch of parsed Charts (only house, planet and cusp data is read)"""
+        arrays = [chart_arrays(chart) for chart in charts]
+        if not arrays:
+            raise ValueError("No charts")
+        return cls.from_arrays(*(np.stack(column) for column in zip(*arrays)))
+
+    @classmethod
+    def from_chart(cls, chart):
+        return cls.from_arrays(*chart_arrays(chart))
+
+    @property
+    def weights(self):
+        """int8 (charts, 9, 12): LEVEL_WEIGHTS of the strongest level a planet signifies a house at, 0 for none"""
+        return (self.levels * LEVEL_WEIGHTS[None, :, None, None]).max(axis=1)
+
+    def signifies(self, houses, levels=LEVELS, require_all=True):
+        """
+        Event-timing query: which planets signify the given houses
+        :param houses: iterable of house numbers (e.g. (2, 7, 11) for marriage)
+        :param levels: level names that count
+        :param require_all: All houses (True) or any of them (False)
+        :return: bool (charts, 9)
+        """
+        columns = np.asarray(list(houses), dtype=np.int64) - 1
+        if not len(columns) or columns.min() < 0 or columns.max() > 11:
+            raise ValueError("Houses must be between 1 and 12")
+        rows = [LEVELS.index(level) for level in levels]
+        hits = self.levels[:, rows][..., columns].any(axis=1)
+        return hits.all(axis=-1) if require_all else hits.any(axis=-1)
+
+    def to_dict(self, chart=0):
+        """
+        One chart's significators
+        :return: dict planet -> {'houses': all houses signified, level: houses, ...}
+        """
+        levels = self.levels[chart]
+        rows = [dict({'houses': []}, **{level: [] for level in LEVELS}) for _ in DASHA_LORDS]
+        # Two nonzero() calls fill every list, in house order
+        for p, h in zip(*(axis.tolist() for axis in levels.any(axis=0).nonzero())):
+            rows[p]['houses'].append(h + 1)
+        for k, p, h in zip(*(axis.tolist() for axis in levels.nonzero())):
+            rows[p][LEVELS[k]].append(h + 1)
+        return {lord.value: row for lord, row in zip(DASHA_LORDS, rows)}
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+    from main import apply_stage
+    from kp_models import Chart
+    from chart_archive import ChartArchive
+
+    # Significators of every archived chart in one batch, or the planets signifying all of --houses
+    parser = argparse.ArgumentParser(description="KP significators for every chart in a chart archive")
+    parser.add_argument('archive', help="Archive directory (KP_ARCHIVE_DIR)")
+    parser.add_argument('--houses', help="Comma-separated houses, e.g. 2,7,11: print the planets signifying all of them")
+    args = parser.parse_args()
+
+    keys, charts = [], []
+    for key, document in ChartArchive(args.archive).iter_charts():
+        chart = Chart()
+        for stage in ('house', 'planet', 'planet_position'):
+            if stage in document['payloads']:
+                apply_stage(chart, stage, document['payloads'][stage])
+        keys.append(key.hex())
+        charts.append(chart)
+    if not charts:
+        sys.exit("No charts in the archive")
+
+    matrix = SignificatorMatrix.from_charts(charts)
+    if args.houses:
+        hits = matrix.signifies(int(house) for house in args.houses.split(','))
+        for key, row in zip(keys, hits):
+            print(json.dumps({'key': key, 'planets': [DASHA_LORDS[i].value for i in np.flatnonzero(row)]}))
+    else:
+        for i, key in enumerate(keys):
+            print(json.dumps({'key': key, 'significators': matrix.to_dict(i)}))
@@ -0,0 +1,197 @@
+# kp_sublords.py
+from bisect import bisect_right
+from functools import lru_cache
+from dataclasses import dataclass
+import numpy as np
+from kp_models import PlanetName, Sign, _Model
+from kp_vimshottari import DASHA_LORDS, DASHA_YEARS
+
+# Zodiac arithmetic in thirds of an arc-second: every sub and sub-sub boundary is an integer
+UNITS_PER_DEGREE = 3600 * 3
+ZODIAC_UNITS = 360 * UNITS_PER_DEGREE
+SIGN_UNITS = 30 * UNITS_PER_DEGREE
+NAKSHATRA_UNITS = ZODIAC_UNITS // 27
+DASHA_YEARS_INT = DASHA_YEARS.astype(np.int64)
+
+NAKSHATRAS = (
+    "Ashwini", "Bharani", "Krittika", "Rohini", "Mrigashira", "Ardra", "Punarvasu",
+    "Pushya", "Ashlesha", "Magha", "Purva Phalguni", "Uttara Phalguni", "Hasta",
+    "Chitra", "Swati", "Vishakha", "Anuradha", "Jyeshtha", "Mula", "Purva Ashadha",
+    "Uttara Ashadha", "Shravana", "Dhanishta", "Shatabhisha", "Purva Bhadrapada",
+    "Uttara Bhadrapada", "Revati"
+)
+SIGNS = tuple(Sign)
+
+# Sign rulers, Aries to Pisces, as indices into DASHA_LORDS
+SIGN_LORDS = np.array([DASHA_LORDS.index(p) for p in (
+    PlanetName.MARS, PlanetName.VENUS, PlanetName.MERCURY, PlanetName.MOON,
+    PlanetName.SUN, PlanetName.MERCURY, PlanetName.VENUS, PlanetName.MARS,
+    PlanetName.JUPITER, PlanetName.SATURN, PlanetName.SATURN, PlanetName.JUPITER
+)], dtype=np.int8)
+
+@dataclass(slots=True, kw_only=True)
+class LordChain(_Model):
+    """Sign, nakshatra and KP lords ruling one zodiac longitude"""
+    longitude: float | None = None
+    number: int | None = None
+    sign: Sign | None = None
+    nakshatra: str | None = None
+    sign_lord: PlanetName | None = None
+    star_lord: PlanetName | None = None
+    sub_lord: PlanetName | None = None
+    sub_sub_lord: PlanetName | None = None
+
+class LordTable:
+    """
+    Zodiac divisions in longitude order, column-wise: start (units) and lord indices into
+    DASHA_LORDS. Divisions crossing a sign boundary are split, so each row has one sign
+    """
+    __slots__ = ('depth', 'starts', 'signs', 'nakshatras', 'star_lords', 'sub_lords', 'sub_sub_lords', '_start_list')
+
+    def __init__(self, depth, starts, signs, nakshatras, star_lords, sub_lords, sub_sub_lords):
+        self.depth = depth
+        self.starts = starts
+        self.signs = signs
+        self.nakshatras = nakshatras
+        self.star_lords = star_lords
+        self.sub_lords = sub_lords
+        self.sub_sub_lords = sub_sub_lords
+        self._start_list = starts.tolist()
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def start_degrees(self):
+        return self.starts / UNITS_PER_DEGREE
+
+    def row_at(self, longitude):
+        """
+        Row index of the division holding a longitude (bisect)
+        :param longitude: float (degrees, wrapped into 0-360)
+        :return: int
+        """
+        return bisect_right(self._start_list, _to_units(longitude)) - 1
+
+    def lords_at(self, longitude):
+        """
+        Lord chain for one longitude
+        :param longitude: float (degrees)
+        :return: LordChain (sub_sub_lord is None for a depth 2 table)
+        """
+        row = self.row_at(longitude)
+        return LordChain(
+            longitude=float(longitude) % 360.0,
+            number=row + 1,
+            sign=SIGNS[self.signs[row]],
+            nakshatra=NAKSHATRAS[self.nakshatras[row]],
+            sign_lord=DASHA_LORDS[SIGN_LORDS[self.signs[row]]],
+            star_lord=DASHA_LORDS[self.star_lords[row]],
+            sub_lord=DASHA_LORDS[self.sub_lords[row]],
+            sub_sub_lord=DASHA_LORDS[self.sub_sub_lords[row]] if self.depth > 2 else None
+        )
+
+    def lords_for(self, longitudes):
+        """
+        Vectorized lookup for many longitudes
+        :param longitudes: array-like of degrees
+        :return: dict of int arrays: row, sign, nakshatra (indices into SIGNS/NAKSHATRAS) and
+                 sign_lord, star_lord, sub_lord, sub_sub_lord (indices into DASHA_LORDS)
+        """
+        units = _to_units(np.asarray(longitudes, dtype=np.float64))
+        rows = np.searchsorted(self.starts, units, side='right') - 1
+        signs = self.signs[rows]
+        return {
+            'row': rows,
+            'sign': signs,
+            'nakshatra': self.nakshatras[rows],
+            'sign_lord': SIGN_LORDS[signs],
+            'star_lord': self.star_lords[rows],
+            'sub_lord': self.sub_lords[rows],
+            'sub_sub_lord': self.sub_sub_lords[rows] if self.depth > 2 else None
+        }
+
+def _to_units(longitude):
+    # Degrees -> integer units in [0, ZODIAC_UNITS)
+    units = np.floor((np.asarray(longitude, dtype=np.float64) % 360.0) * UNITS_PER_DEGREE).astype(np.int64)
+    units = np.minimum(units, ZODIAC_UNITS - 1)
+    return int(units) if units.ndim == 0 else units
+
+def _split(lords, spans):
+    # Sequence of sub divisions starting at each row's lord: (lord indices, spans), one level deeper
+    sub_lords = (lords[:, None] + np.arange(9)) % 9
+    sub_spans = spans[:, None] * DASHA_YEARS_INT[sub_lords] // 120
+    return sub_lords, sub_spans
+
+@lru_cache(maxsize=None)
+def lord_table(depth=2):
+    """
+    Build the KP division table
+    :param depth: 2 = the 249 sub divisions, 3 = sub-sub divisions
+    :return: LordTable
+    """
+    if depth not in (2, 3):
+        raise ValueError("Lord table depth must be 2 or 3")
+
+    nakshatras = np.arange(27)
+    star_lords = nakshatras % 9
+    spans = np.full(27, NAKSHATRA_UNITS, dtype=np.int64)
+    columns = [star_lords]
+
+    # Each level splits its parent in the Vimshottari order starting from the parent's lord
+    lords = star_lords
+    for _ in range(1, depth):
+        lords, spans = _split(lords, spans)
+        columns = [np.repeat(c, 9) for c in columns] + [lords.ravel()]
+        lords, spans = lords.ravel(), spans.ravel()
+    nakshatras = np.repeat(nakshatras, 9 ** (depth - 1))
+
+    starts = np.concatenate(([0], np.cumsum(spans)[:-1]))
+
+    # Split divisions at the sign boundaries inside them
+    boundaries = np.arange(0, ZODIAC_UNITS, SIGN_UNITS)
+    starts_all = np.union1d(starts, boundaries)
+    source = np.searchsorted(starts, starts_all, side='right') - 1
+
+    return LordTable(
+        depth=depth,
+        starts=starts_all,
+        signs=(starts_all // SIGN_UNITS).astype(np.int8),
+        nakshatras=nakshatras[source].astype(np.int8),
+        star_lords=columns[0][source].astype(np.int8),
+        sub_lords=columns[1][source].astype(np.int8),
+        sub_sub_lords=columns[2][source].astype(np.int8) if depth > 2 else None
+    )
+
+def lords_at(longitude, depth=3):
+    """
+    Sign, star, sub and sub-sub lords of a longitude
+    :param longitude: float (sidereal degrees)
+    :param depth: 2 stops at the sub lord (the number is then the KP 1-249 sub number)
+    :return: LordChain
+    """
+    return lord_table(depth).lords_at(longitude)
+
+def lords_for(longitudes, depth=3):
+    """
+    Vectorized lords_at for an array of longitudes
+    :return: dict of index arrays, see LordTable.lords_for
+    """
+    return lord_table(depth).lords_for(longitudes)
+
+def lord_names(indices):
+    """
+    Map DASHA_LORDS indices from lords_for to PlanetName members
+    :param indices: int array
+    :return: object array of PlanetName, same shape
+    """
+    return np.array(DASHA_LORDS, dtype=object)[indices]
+
+if __name__ == '__main__':
+    import sys
+    # Usage: python kp_sublords.py <longitude> [...]
+    for value in sys.argv[1:]:
+        chain = lords_at(float(value))
+        print(f"{chain.longitude:.4f}° #{lord_table(2).row_at(chain.longitude) + 1}: "
+              f"{chain.sign.value} ({chain.sign_lord.value}) / {chain.nakshatra} ({chain.star_lord.value}) "
+              f"/ {chain.sub_lord.value} / {chain.sub_sub_lord.value}")
@@ -0,0 +1,244 @@
+# kp_vimshottari.py
+import os
+import json
+from datetime import datetime
+import numpy as np
+from kp_models import PlanetName
+
+# Vimshottari sequence and mahadasha lengths in years (120 in total)
+DASHA_LORDS = (
+    PlanetName.KETU, PlanetName.VENUS, PlanetName.SUN, PlanetName.MOON, PlanetName.MARS,
+    PlanetName.RAHU, PlanetName.JUPITER, PlanetName.SATURN, PlanetName.MERCURY
+)
+DASHA_YEARS = np.array([7, 20, 6, 10, 7, 18, 16, 19, 17], dtype=np.float64)
+TOTAL_YEARS = 120.0
+NAKSHATRA_SPAN = 360.0 / 27
+
+# Configuration
+YEAR_DAYS = float(os.environ.get('DASHA_YEAR_DAYS', 365.25))  # Length of a dasha year
+DASHA_DATE_FORMAT = os.environ.get('DASHA_DATE_FORMAT', '%a %b %d %Y')  # Date layout of generated payloads
+
+SECONDS_PER_DAY = 86400
+
+class VimshottariDasha:
+    """
+    Dasha periods of one chart down to a given depth. Level k (1 = mahadasha) holds
+    arrays of shape (9,) * k: lord indices into DASHA_LORDS, and start/end datetime64[s]
+    """
+    __slots__ = ('birth', 'moon_longitude', 'lords', 'starts', 'ends')
+
+    def __init__(self, birth, moon_longitude, lords, starts, ends):
+        self.birth = birth
+        self.moon_longitude = moon_longitude
+        self.lords = lords
+        self.starts = starts
+        self.ends = ends
+
+    @property
+    def depth(self):
+        return len(self.lords)
+
+    def period_at(self, when, depth=None):
+        """
+        Lords running at a moment
+        :param when: datetime or numpy datetime64
+        :param depth: int (levels to report, default all)
+        :return: tuple of PlanetName from mahadasha down, or () outside the 120-year cycle
+        """
+        depth = depth or self.depth
+        when = np.datetime64(when, 's')
+        starts = self.starts[depth - 1].ravel()
+        idx = int(np.searchsorted(starts, when, side='right')) - 1
+        if idx < 0 or when >= self.ends[depth - 1].ravel()[idx]:
+            return ()
+        index = np.unravel_index(idx, self.starts[depth - 1].shape)
+        return tuple(DASHA_LORDS[self.lords[level][index[:level + 1]]] for level in range(depth))
+
+    def period_start(self, when, depth=None):
+        """Start (datetime64) of the deepest period running at a moment, or None"""
+        depth = depth or self.depth
+        starts = self.starts[depth - 1].ravel()
+        idx = int(np.searchsorted(starts, np.datetime64(when, 's'), side='right')) - 1
+        return starts[idx] if idx >= 0 else None
+
+def vimshottari(moon_longitude, birth, depth=3, year_days=YEAR_DAYS):
+    """
+    Compute Vimshottari periods from the Moon's sidereal longitude at birth
+    :param moon_longitude: float (degrees, 0-360)
+    :param birth: datetime (birth moment, local time)
+    :param depth: int (1 = mahadasha, 2 = antardasha, 3 = pratyantardasha, ...)
+    :param year_days: float (days per dasha year)
+    :return: VimshottariDasha
+    """
+    moon_longitude = float(moon_longitude) % 360.0
+    nakshatra = int(moon_longitude // NAKSHATRA_SPAN)
+    traversed = (moon_longitude - nakshatra * NAKSHATRA_SPAN) / NAKSHATRA_SPAN
+    first = nakshatra % 9
+
+    # Mahadasha level: the cycle starts before birth by the part of the first dasha already elapsed
+    lords = (first + np.arange(9)) % 9
+    years = DASHA_YEARS[lords]
+    starts = np.concatenate(([0.0], np.cumsum(years)[:-1])) - traversed * years[0]
+
+    level_lords = [lords]
+    level_starts = [starts]
+    level_years = [years]
+
+    # Each sub-level splits its parent in the sequence starting from the parent's lord
+    for _ in range(1, depth):
+        lords = (lords[..., None] + np.arange(9)) % 9
+        years = level_years[-1][..., None] * DASHA_YEARS[lords] / TOTAL_YEARS
+        offsets = np.cumsum(years, axis=-1) - years
+        starts = level_starts[-1][..., None] + offsets
+        level_lords.append(lords)
+        level_starts.append(starts)
+        level_years.append(years)
+
+    birth64 = np.datetime64(birth, 's')
+    seconds_per_year = year_days * SECONDS_PER_DAY
+    to_datetime = lambda offsets_in_years: birth64 + np.rint(offsets_in_years * seconds_per_year).astype('timedelta64[s]')
+
+    return VimshottariDasha(
+        birth=birth,
+        moon_longitude=moon_longitude,
+        lords=[l.astype(np.int8) for l in level_lords],
+        starts=[to_datetime(s) for s in level_starts],
+        ends=[to_datetime(s + y) for s, y in zip(level_starts, level_years)]
+    )
+
+def moon_longitude(planet_details):
+    """
+    Moon's sidereal longitude from a decoded planet-details response
+    :param planet_details: dict (JSON data)
+    :return: float
+    """
+    for pdata in planet_details.get('response', {}).values():
+        if isinstance(pdata, dict) and (pdata.get('name') == 'Mo' or pdata.get('full_name') == 'Moon'):
+            return float(pdata['global_degree'])
+    raise ValueError("Moon not found in planet details")
+
+def _format_dates(values, date_format):
+    # datetime64[s] array -> nested lists of formatted strings
+    return np.vectorize(lambda v: v.strftime(date_format), otypes=[object])(values.astype(datetime)).tolist()
+
+def _period_labels(dasha, level):
+    # Nested lists of 'Jupiter/Saturn/...' labels for a level
+    names = np.array([lord.value for lord in DASHA_LORDS], dtype=object)
+    labels = names[dasha.lords[0]]
+    for k in range(1, level):
+        labels = labels[..., None] + '/' + names[dasha.lords[k]]
+    return labels.tolist()
+
+def dasha_payloads(dasha, now=None, date_format=DASHA_DATE_FORMAT):
+    """
+    Render computed periods in the shape of the upstream maha-, antar- and paryantar-dasha
+    responses, so the existing parsers consume them unchanged
+    :param dasha: VimshottariDasha with depth >= 3
+    :param now: datetime for the current dasa (default: now)
+    :param date_format: strftime layout for dates
+    :return: dict with 'mahadasha', 'antardasha' and 'paryantardasha' JSON data
+    """
+    if dasha.depth < 3:
+        raise ValueError("Dasha payloads need depth 3")
+
+    now = now or datetime.now()
+    code = lambda lords: '>'.join(lord.abbr for lord in lords)
+    format_date = lambda value: value.astype(datetime).strftime(date_format) if value is not None else 'N/A'
+
+    return {
+        'mahadasha': {'status': 200, 'response': {
+            'mahadasha': [DASHA_LORDS[i].value for i in dasha.lords[0]],
+            'mahadasha_order': _format_dates(dasha.starts[0], date_format),
+            'birth_dasa': code(dasha.period_at(dasha.birth, 3)),
+            'birth_dasa_time': format_date(dasha.period_start(dasha.birth, 3)),
+            'current_dasa': code(dasha.period_at(now, 3)),
+            'current_dasa_time': format_date(dasha.period_start(now, 3))
+        }},
+        'antardasha': {'status': 200, 'response': {
+            'antardashas': _period_labels(dasha, 2),
+            'antardasha_order': _format_dates(dasha.starts[1], date_format)
+        }},
+        'paryantardasha': {'status': 200, 'response': {
+            'paryantardasha': _period_labels(dasha, 3),
+            'paryantardasha_order': _format_dates(dasha.starts[2], date_format)
+        }}
+    }
+
+def local_dasha_payloads(planet_details, birth, now=None):
+    """
+    Replace the three upstream dasha calls
+    :param planet_details: dict (decoded planet-details JSON)
+    :param birth: datetime (birth moment, local time)
+    :return: dict with 'mahadasha', 'antardasha' and 'paryantardasha' JSON data
+    """
+    return dasha_payloads(vimshottari(moon_longitude(planet_details), birth, depth=3), now=now)
+
+# Cross-checking against stored upstream responses
+DATE_FORMATS = (DASHA_DATE_FORMAT, '%a %b %d %Y', '%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S',
+                '%a %b %d %Y %H:%M:%S', '%d-%m-%Y %H:%M', '%d-%m-%Y %H:%M:%S')
+
+def _parse_date(text):
+    text = str(text).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised dasha date: {text}")
+
+def _compare_series(name, expected_periods, expected_dates, computed_periods, computed_dates, tolerance_days):
+    mismatches = []
+    for i, (exp_p, exp_d, got_p, got_d) in enumerate(zip(expected_periods, expected_dates, computed_periods, computed_dates)):
+        # Abbreviations are the first two letters of the full names
+        if [l[:2] for l in exp_p.split('/')] != [l[:2] for l in got_p.split('/')]:
+            mismatches.append(f"{name}[{i}]: lords {exp_p} != {got_p}")
+            continue
+        delta = abs((_parse_date(exp_d) - _parse_date(got_d)).total_seconds()) / SECONDS_PER_DAY
+        if delta > tolerance_days:
+            mismatches.append(f"{name}[{i}] {exp_p}: start {exp_d} != {got_d} ({delta:.1f} days)")
+    if len(expected_periods) != len(computed_periods):
+        mismatches.append(f"{name}: {len(expected_periods)} upstream periods, {len(computed_periods)} computed")
+    return mismatches
+
+def compare_with_upstream(computed, upstream, tolerance_days=2.0):
+    """
+    Cross-check computed dasha payloads against stored upstream responses
+    :param computed: dict from dasha_payloads()
+    :param upstream: dict with any of 'mahadasha', 'antardasha', 'paryantardasha' JSON data
+    :param tolerance_days: float (allowed start date difference)
+    :return: list of mismatch descriptions (empty when they agree)
+    """
+    mismatches = []
+    flatten = lambda nested: [x for group in nested for x in (flatten(group) if isinstance(group, list) else [group])]
+
+    if 'mahadasha' in upstream:
+        exp, got = upstream['mahadasha']['response'], computed['mahadasha']['response']
+        if 'mahadasha' in exp:
+            mismatches += _compare_series('mahadasha', exp['mahadasha'], exp['mahadasha_order'],
+                                          got['mahadasha'], got['mahadasha_order'], tolerance_days)
+        if exp.get('birth_dasa') and exp['birth_dasa'] != got['birth_dasa']:
+            mismatches.append(f"birth_dasa: {exp['birth_dasa']} != {got['birth_dasa']}")
+    for key, periods, dates in (('antardasha', 'antardashas', 'antardasha_order'),
+                                ('paryantardasha', 'paryantardasha', 'paryantardasha_order')):
+        if key in upstream:
+            exp, got = upstream[key]['response'], computed[key]['response']
+            mismatches += _compare_series(key, flatten(exp.get(periods, [])), flatten(exp.get(dates, [])),
+                                          flatten(got[periods]), flatten(got[dates]), tolerance_days)
+    return mismatches
+
+if __name__ == '__main__':
+    import sys
+    from timezone_resolver import parse_birth_datetime
+    # Usage: python kp_vimshottari.py <dir with stored input_kp_*.json> <dob> <tob>
+    data_dir, dob, tob = sys.argv[1:4]
+    load = lambda name: json.load(open(os.path.join(data_dir, name)))
+    upstream = {
+        'mahadasha': load('input_kp_mahadasha_details.json'),
+        'antardasha': load('input_kp_antardasha_details.json'),
+        'paryantardasha': load('input_kp_paryantardasha_details.json')
+    }
+    computed = local_dasha_payloads(load('input_kp_planet_position_details.json'), parse_birth_datetime(dob, tob))
+    problems = compare_with_upstream(computed, upstream)
+    for problem in problems[:50]:
+        print(problem)
+    print(f"{len(problems)} mismatches")
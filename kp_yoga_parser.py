@@ -1,11 +1,76 @@
 # kp_yoga_parser.py
+import sys
 import json
+from kp_models import Chart, Yoga, planet_name, label
 
-def parse_kp_yogas(json_input, output_file):
+def extract_kp_yogas(data):
+    """
+    Build Yoga records from decoded yoga-list JSON
+    :param data: dict (JSON data)
+    :return: (tuple of Yoga, (total, raja, dhana, daridra) counts)
+    """
+    if data.get('status') != 200:
+        raise ValueError("Invalid response status")
+
+    response = data.get('response', {})
+    yogas = tuple(
+        Yoga(
+            name=sys.intern(yoga['yoga']),
+            strength=yoga['strength_in_percentage'],
+            planets=tuple(planet_name(p) for p in yoga['planets_involved']),
+            houses=tuple(yoga['houses_involved']),
+            meaning=yoga['meaning']
+        )
+        for yoga in response.get('yogas_list', [])
+    )
+    counts = (
+        response.get('yogas_count', 0),
+        response.get('raja_yoga_count', 0),
+        response.get('dhana_yoga_count', 0),
+        response.get('daridra_yoga_count', 0)
+    )
+    return yogas, counts
+
+def render_kp_yogas(chart):
+    """
+    Format the yoga part of a chart
+    :param chart: Chart (yogas, yoga_counts)
+    :return: Analysis text
+    """
+    output = ["=== KP Yoga Analysis ==="]
+
+    # Process each yoga
+    for yoga in chart.yogas:
+        output.append(f"\n✦ {yoga.name}")
+        output.append(f"   Strength: {yoga.strength:.2f}%")
+        output.append(f"   Planets: {', '.join(label(p) for p in yoga.planets)}")
+        output.append(f"   Houses: {', '.join(map(str, yoga.houses))}")
+        output.append(f"   Meaning: {yoga.meaning}")
+
+    # Add summary statistics
+    total, raja, dhana, daridra = chart.yoga_counts
+    output.append("\n=== Yoga Summary ===")
+    output.append(f"Total Yogas: {total}")
+    output.append(f"Raja Yogas: {raja}")
+    output.append(f"Dhana Yogas: {dhana}")
+    output.append(f"Daridra Yogas: {daridra}")
+
+    return '\n'.join(output)
+
+def format_kp_yogas(data):
+    """
+    Format KP Yoga details from decoded JSON
+    :param data: dict (JSON data)
+    :return: Analysis text
+    """
+    yogas, counts = extract_kp_yogas(data)
+    return render_kp_yogas(Chart(yogas=yogas, yoga_counts=counts))
+
+def parse_kp_yogas(json_input, output_file=None):
     """
     Parse KP Yoga details from JSON input and save formatted output
     :param json_input: str (file path) or dict (JSON data)
-    :param output_file: str (output file path)
+    :param output_file: str (output file path), None to skip writing
     :return: True if successful, False otherwise
     """
     try:
@@ -16,30 +81,12 @@ def parse_kp_yogas(json_input, output_file):
         else:
             data = json_input
 
-        if data.get('status') != 200:
-            raise ValueError("Invalid response status")
-
-        response = data.get('response', {})
-        output = ["=== KP Yoga Analysis ==="]
-
-        # Process each yoga
-        for yoga in response.get('yogas_list', []):
-            output.append(f"\n✦ {yoga['yoga']}")
-            output.append(f"   Strength: {yoga['strength_in_percentage']:.2f}%")
-            output.append(f"   Planets: {', '.join(yoga['planets_involved'])}")
-            output.append(f"   Houses: {', '.join(map(str, yoga['houses_involved']))}")
-            output.append(f"   Meaning: {yoga['meaning']}")
-
-        # Add summary statistics
-        output.append("\n=== Yoga Summary ===")
-        output.append(f"Total Yogas: {response.get('yogas_count', 0)}")
-        output.append(f"Raja Yogas: {response.get('raja_yoga_count', 0)}")
-        output.append(f"Dhana Yogas: {response.get('dhana_yoga_count', 0)}")
-        output.append(f"Daridra Yogas: {response.get('daridra_yoga_count', 0)}")
+        output = format_kp_yogas(data)
 
         # Save to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(output))
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(output)
 
         return True
 
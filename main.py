@@ -1,13 +1,21 @@
-from kp_house_parser import get_kp_details
-from kp_planet_parser import get_kp_planets
-from kp_planet_details_parser import parse_kp_planet_details
-from kp_mahadasha_parser import parse_kp_mahadasha
-from kp_antardasha_parser import parse_kp_antardasha
-from kp_paryantardasha_parser import parse_kp_paryantardasha
-from kp_yoga_parser import parse_kp_yogas
-from kp_analyzer import analyze_kp_charts
+from kp_house_parser import get_kp_details, validate_kp_houses, extract_kp_houses, render_kp_houses
+from kp_planet_parser import get_kp_planets, extract_kp_planets, render_kp_planets
+from kp_planet_details_parser import parse_kp_planet_details, extract_kp_planet_details, render_kp_planet_details
+from kp_mahadasha_parser import parse_kp_mahadasha, extract_kp_mahadasha, render_kp_mahadasha
+from kp_antardasha_parser import parse_kp_antardasha, extract_kp_antardasha, render_kp_antardasha
+from kp_paryantardasha_parser import parse_kp_paryantardasha, extract_kp_paryantardasha, render_kp_paryantardasha
+from kp_yoga_parser import parse_kp_yogas, extract_kp_yogas, render_kp_yogas
+from kp_analyzer import analyze_kp_chart
+from kp_models import Chart
+from metrics import metrics
+from kp_renderers import render_section, render_analysis, render_missing, mark_partial, serialize, output_filename, check_format
+import json
 import os
+import time
+import shutil
+import tempfile
 import logging
+from contextlib import contextmanager
 
 # Configure logging
 logging.basicConfig(
@@ -16,8 +24,107 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def run_kp_analysis():
-    """Main function to execute KP analysis workflow"""
+# Input/output file names per stage
+FILE_PATHS = {
+    'planet_position': ('input_kp_planet_position_details.json', 'output_kp_planet_position_analysis.txt'),
+    'house': ('input_kp_house_details.json', 'output_kp_house_analysis.txt'),
+    'planet': ('input_kp_planet_details.json', 'output_kp_planet_analysis.txt'),
+    'mahadasha': ('input_kp_mahadasha_details.json', 'output_kp_mahadasha_details.txt'),
+    'antardasha': ('input_kp_antardasha_details.json', 'output_kp_antardasha_details.txt'),
+    'paryantardasha': ('input_kp_paryantardasha_details.json', 'output_kp_paryantardasha_details.txt'),
+    'yoga': ('input_kp_list_of_yogas_details.json', 'output_kp_list_of_yogas_details.txt')
+}
+FINAL_OUTPUT = 'output_kp_comprehensive_analysis.txt'
+
+# In-memory stages, same order as the file pipeline:
+# (stage, extractor -> Chart fields, Chart fields, renderer)
+STAGES = [
+    ('planet_position', extract_kp_planet_details, ('planets', 'planet_dasha'), render_kp_planet_details),
+    ('house', lambda data: extract_kp_houses(validate_kp_houses(data)), ('houses',), render_kp_houses),
+    ('planet', extract_kp_planets, ('kp_planets', 'midheaven', 'ascendant'), render_kp_planets),
+    ('mahadasha', extract_kp_mahadasha, ('mahadasha',), render_kp_mahadasha),
+    ('antardasha', extract_kp_antardasha, ('antardashas',), render_kp_antardasha),
+    ('paryantardasha', extract_kp_paryantardasha, ('paryantardashas',), render_kp_paryantardasha),
+    ('yoga', extract_kp_yogas, ('yogas', 'yoga_counts'), render_kp_yogas)
+]
+STAGE_INDEX = {stage[0]: stage for stage in STAGES}
+
+# Default input directory for the file pipeline
+DEFAULT_DATA_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'user_data')
+
+@contextmanager
+def chart_workspace(base_dir=None, keep=False):
+    """
+    Unique per-request working directory, removed on exit unless kept
+    :param base_dir: Parent directory (default: system temp dir)
+    :param keep: Leave the directory in place after use
+    :return: Workspace path
+    """
+    if base_dir:
+        os.makedirs(base_dir, exist_ok=True)
+    workspace = tempfile.mkdtemp(prefix='chart_', dir=base_dir)
+    try:
+        yield workspace
+    finally:
+        if not keep:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+def prune_workspaces(base_dir, max_age=None, max_count=None):
+    """
+    Remove kept workspaces under base_dir (see chart_workspace), oldest first
+    :param base_dir: Parent directory of the workspaces
+    :param max_age: Seconds a workspace is kept after its last change (None: no age limit)
+    :param max_count: Most workspaces kept (None: no count limit)
+    :return: Number of workspaces removed
+    """
+    workspaces = []
+    try:
+        with os.scandir(base_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('chart_') and entry.is_dir(follow_symlinks=False):
+                    try:
+                        workspaces.append((entry.stat().st_mtime, entry.path))
+                    except OSError:  # Removed by another worker meanwhile
+                        continue
+    except FileNotFoundError:
+        return 0
+    workspaces.sort()
+
+    expired = len(workspaces) - max_count if max_count is not None else 0
+    if max_age is not None:
+        cutoff = time.time() - max_age
+        expired = max(expired, sum(1 for mtime, _ in workspaces if mtime < cutoff))
+    for _, path in workspaces[:max(expired, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+    return max(expired, 0)
+
+def run_kp_analysis(payloads=None, output_dir=None, input_dir=None, file_paths=FILE_PATHS, progress=None,
+                    output_format='text', partial=False):
+    """
+    Main function to execute KP analysis workflow
+    :param payloads: dict of decoded upstream responses keyed by stage name; when given
+                     the analysis runs in memory. None reads the input JSON files from input_dir
+    :param output_dir: Directory reports are written to (optional in memory, defaults to input_dir otherwise)
+    :param input_dir: Directory holding the input JSON files (file pipeline, default: user_data)
+    :param file_paths: dict of stage -> (input filename, output filename)
+    :param progress: Optional callable(stage) invoked as each in-memory stage starts
+    :param output_format: 'text' (default), 'json' or 'markdown'
+    :param partial: In memory, analyse whatever stages are usable and mark the rest missing
+    :return: dict with status, reports (stage -> text, or data for json), analysis and any generated files
+    """
+    if payloads is None and output_format != 'text':
+        # Other formats come from the structured chart, so read the input files into memory
+        input_dir = os.path.abspath(input_dir or DEFAULT_DATA_DIR)
+        try:
+            payloads = load_payloads(input_dir, file_paths)
+        except Exception as e:
+            logger.error(f"Analysis failed: {str(e)}")
+            return {'status': 'error', 'output_file': '', 'message': str(e), 'generated_files': []}
+        output_dir = output_dir or input_dir
+
+    if payloads is not None:
+        return run_kp_analysis_in_memory(payloads, output_dir, file_paths, progress, output_format, partial)
+
     result = {
         'status': 'success',
         'output_file': '',
@@ -27,24 +134,12 @@ def run_kp_analysis():
 
     try:
         # Use absolute paths for production
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        input_dir = os.path.join(base_dir, 'user_data')
-        output_dir = os.path.join(base_dir, 'user_data')
-        
+        input_dir = os.path.abspath(input_dir or DEFAULT_DATA_DIR)
+        output_dir = os.path.abspath(output_dir or input_dir)
+
         os.makedirs(input_dir, exist_ok=True)
         os.makedirs(output_dir, exist_ok=True)
 
-        # Define file paths with absolute paths
-        file_paths = {
-            'planet_position': ('input_kp_planet_position_details.json', 'output_kp_planet_position_analysis.txt'),
-            'house': ('input_kp_house_details.json', 'output_kp_house_analysis.txt'),
-            'planet': ('input_kp_planet_details.json', 'output_kp_planet_analysis.txt'),
-            'mahadasha': ('input_kp_mahadasha_details.json', 'output_kp_mahadasha_details.txt'),
-            'antardasha': ('input_kp_antardasha_details.json', 'output_kp_antardasha_details.txt'),
-            'paryantardasha': ('input_kp_paryantardasha_details.json', 'output_kp_paryantardasha_details.txt'),
-            'yoga': ('input_kp_list_of_yogas_details.json', 'output_kp_list_of_yogas_details.txt')
-        }
-
         # Processing pipeline
         processors = [
             (parse_kp_planet_details, 'planet_position'),
@@ -62,25 +157,24 @@ def run_kp_analysis():
             
             logger.info(f"Processing {key} with {input_file}")
             
-            processor_result = processor(input_file, output_file)
+            with metrics.timer('kp_processor_seconds', stage=key, phase='file'):
+                processor_result = processor(input_file, output_file)
             if isinstance(processor_result, str) and processor_result.startswith("KP Analysis Error"):
+                metrics.inc('kp_processor_errors_total', stage=key)
                 raise Exception(processor_result)
             
             result['generated_files'].append(output_file)
 
-        # Generate comprehensive analysis
-        final_output = os.path.join(output_dir, 'output_kp_comprehensive_analysis.txt')
-        analyze_kp_charts(
-            mahadasha_file=os.path.join(output_dir, file_paths['mahadasha'][1]),
-            antardasha_file=os.path.join(output_dir, file_paths['antardasha'][1]),
-            paryantardasha_file=os.path.join(output_dir, file_paths['paryantardasha'][1]),
-            planet_position_file=os.path.join(output_dir, file_paths['planet_position'][1]),
-            planet_analysis_file=os.path.join(output_dir, file_paths['planet'][1]),
-            house_analysis_file=os.path.join(output_dir, file_paths['house'][1]),
-            yoga_details_file=os.path.join(output_dir, file_paths['yoga'][1]),
-            output_file=final_output
-        )
-        
+        # Generate comprehensive analysis from the input JSON, through the same consolidation as
+        # the in-memory pipeline (the text reports don't carry everything it prints)
+        final_output = os.path.join(output_dir, FINAL_OUTPUT)
+        with metrics.timer('kp_analysis_seconds', mode='files'):
+            chart = build_chart(load_payloads(input_dir, file_paths))
+            analysis_result = analyze_kp_chart(chart, output_file=final_output)
+        if analysis_result['status'] != 'success':
+            metrics.inc('kp_analysis_errors_total', mode='files')
+            raise Exception(analysis_result['message'])
+
         result['output_file'] = final_output
         result['generated_files'].append(final_output)
         logger.info("Analysis completed successfully")
@@ -93,8 +187,159 @@ def run_kp_analysis():
         result['message'] = str(e)
         return result
 
+def load_payloads(input_dir, file_paths=FILE_PATHS):
+    """
+    Read the stored input JSON files of a chart
+    :return: dict of JSON data keyed by stage name
+    """
+    payloads = {}
+    for key, (input_name, _) in file_paths.items():
+        with open(os.path.join(input_dir, input_name), 'r') as f:
+            payloads[key] = json.load(f)
+    return payloads
+
+def build_chart(payloads, progress=None, missing=None):
+    """
+    Extract decoded upstream responses into one Chart
+    :param payloads: dict of JSON data keyed by stage name
+    :param progress: Optional callable(stage) invoked as each stage starts
+    :param missing: Optional dict; when given, stages without a usable payload are recorded
+                    in it (stage -> reason) and skipped instead of failing the chart
+    :return: Chart
+    """
+    chart = Chart()
+    for key, _, _, _ in STAGES:
+        if key not in payloads:
+            if missing is None:
+                raise ValueError(f"Missing {key} data")
+            missing[key] = f"Missing {key} data"
+            continue
+
+        logger.info(f"Processing {key}")
+        if progress:
+            progress(key)
+        if missing is None:
+            apply_stage(chart, key, payloads[key])
+            continue
+        try:
+            apply_stage(chart, key, payloads[key])
+        except Exception as e:
+            logger.warning(f"Skipping {key}: {str(e)}")
+            missing[key] = str(e)
+    return chart
+
+def apply_stage(chart, key, data):
+    """
+    Extract one decoded upstream response into its Chart fields
+    :param chart: Chart to fill in
+    :param key: Stage name
+    :param data: dict (JSON data)
+    """
+    _, extractor, fields, _ = STAGE_INDEX[key]
+    try:
+        with metrics.timer('kp_processor_seconds', stage=key, phase='extract'):
+            values = extractor(data)
+    except Exception:
+        metrics.inc('kp_processor_errors_total', stage=key)
+        raise
+    if len(fields) == 1:
+        values = (values,)
+    for field, value in zip(fields, values):
+        setattr(chart, field, value)
+
+def render_stage(chart, key, output_format='text'):
+    """Report of one stage from its Chart fields (text, or see kp_renderers for other formats)"""
+    with metrics.timer('kp_processor_seconds', stage=key, phase='render'):
+        return render_section(chart, key, output_format)
+
+def run_kp_analysis_in_memory(payloads, output_dir=None, file_paths=FILE_PATHS, progress=None, output_format='text',
+                              partial=False):
+    """
+    Run every formatter and the consolidation on decoded upstream responses
+    :param payloads: dict of JSON data keyed by stage name
+    :param output_dir: Optional directory to also write the text reports to
+    :param file_paths: dict of stage -> (input filename, output filename)
+    :param progress: Optional callable(stage) invoked as each stage starts
+    :param output_format: 'text' (default), 'json' or 'markdown'
+    :param partial: Stages are independent until the consolidation, so build the chart from
+                    the usable payloads, mark the others missing and consolidate what is there
+    :return: dict with status, chart, reports, analysis, missing (stage -> reason) and generated files
+    """
+    result = {
+        'status': 'success',
+        'output_file': '',
+        'message': '',
+        'generated_files': [],
+        'chart': None,
+        'reports': {},
+        'analysis': '',
+        'missing': {}
+    }
+
+    try:
+        check_format(output_format)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        missing = result['missing'] if partial else None
+        chart = build_chart(payloads, progress, missing)
+        if missing and len(missing) == len(STAGES):
+            raise ValueError("No section could be built")
+        result['chart'] = chart
+
+        for key, _, _, _ in STAGES:
+            if missing and key in missing:
+                report = render_missing(key, missing[key], output_format)
+            else:
+                report = render_stage(chart, key, output_format)
+            result['reports'][key] = report
+
+            if output_dir:
+                output_file = os.path.join(output_dir, output_filename(file_paths[key][1], output_format))
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(serialize(report))
+                result['generated_files'].append(output_file)
+
+        # Generate comprehensive analysis from the structured data
+        if progress:
+            progress('analysis')
+        final_output = os.path.join(output_dir, output_filename(FINAL_OUTPUT, output_format)) if output_dir else None
+        with metrics.timer('kp_analysis_seconds', mode='chart'):
+            if output_format == 'text':
+                analysis_result = analyze_kp_chart(chart, output_file=None if missing else final_output)
+            else:
+                analysis_result = {'status': 'success', 'analysis': render_analysis(chart, output_format)}
+        if analysis_result['status'] != 'success':
+            metrics.inc('kp_analysis_errors_total', mode='chart')
+            raise Exception(analysis_result['message'])
+
+        result['analysis'] = analysis_result['analysis']
+        if missing:
+            result['analysis'] = mark_partial(result['analysis'], missing, output_format)
+        if final_output and (missing or output_format != 'text'):
+            with open(final_output, 'w', encoding='utf-8') as f:
+                f.write(serialize(result['analysis']))
+        if final_output:
+            result['output_file'] = final_output
+            result['generated_files'].append(final_output)
+        logger.info("Analysis completed successfully")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"Analysis failed: {str(e)}")
+        result['status'] = 'error'
+        result['message'] = str(e)
+        return result
+
 if __name__ == '__main__':
-    analysis_result = run_kp_analysis()
+    import sys
+    # Usage: python main.py [input_dir] [output_dir] [text|json|markdown]
+    analysis_result = run_kp_analysis(
+        input_dir=sys.argv[1] if len(sys.argv) > 1 else None,
+        output_dir=sys.argv[2] if len(sys.argv) > 2 else None,
+        output_format=sys.argv[3] if len(sys.argv) > 3 else 'text'
+    )
     if analysis_result['status'] == 'success':
         print("Analysis completed successfully!")
         print(f"Final output: {analysis_result['output_file']}")
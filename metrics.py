@@ -0,0 +1,297 @@
+# metrics.py
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import atexit
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): snapshots of exited workers are folded without a lock
+    fcntl = None
+
+# Configuration
+METRICS_ENABLED = os.environ.get('KP_METRICS', '1') == '1'  # 0 turns every call below into a no-op
+METRICS_DIR = os.environ.get('KP_METRICS_DIR', '')  # Shared by the gunicorn workers of one host; empty = this process only
+METRICS_FLUSH_INTERVAL = float(os.environ.get('KP_METRICS_FLUSH_INTERVAL', 5))  # Seconds between snapshot writes
+
+SNAPSHOT_FILE = re.compile(r'metrics_(\d+)\.json$')
+# Counts of exited workers, kept so totals never go down until clear() at master start
+RETIRED_FILE = 'metrics_retired.json'
+RETIRED_SNAPSHOTS = 1000  # Folded snapshot ids remembered, so a snapshot is never folded twice
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# Latency buckets in seconds (upper bounds, +Inf implied)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# name -> (type, help)
+METRICS = {
+    'kp_upstream_request_seconds': ('histogram', 'Upstream API call latency by endpoint (cache misses only)'),
+    'kp_upstream_errors_total': ('counter', 'Failed upstream API calls by endpoint'),
+    'kp_endpoint_refetches_total': ('counter', 'Failed endpoints of a chart fetched again, by endpoint'),
+    'kp_upstream_queue_seconds': ('histogram', 'Time upstream calls waited for quota by priority'),
+    'kp_upstream_throttled_total': ('counter', 'Upstream calls answered 429 by priority'),
+    'kp_cache_requests_total': ('counter', 'Response cache lookups by endpoint and result'),
+    'kp_coalesced_requests_total': ('counter', 'Calls answered by an identical in-flight call, by layer'),
+    'kp_timezone_seconds': ('histogram', 'Timezone offset resolution latency'),
+    'kp_processor_seconds': ('histogram', 'Parser latency by stage and phase'),
+    'kp_processor_errors_total': ('counter', 'Parser failures by stage'),
+    'kp_analysis_seconds': ('histogram', 'Consolidated analysis latency by mode'),
+    'kp_analysis_errors_total': ('counter', 'Consolidated analysis failures by mode'),
+    'kp_request_errors_total': ('counter', 'HTTP requests answered with a server error by route')
+}
+
+class MetricsRegistry:
+    """Thread-safe in-process histograms and counters, keyed by metric name and label values"""
+
+    def __init__(self, enabled=METRICS_ENABLED, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._counters = {}  # (name, labels) -> value
+        self._flusher = None
+        self._owner = None  # (pid, id) of the process the snapshots are written for
+
+    def observe(self, name, seconds, **labels):
+        """Record one duration in a histogram"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += seconds
+        self._ensure_flusher()
+
+    def inc(self, name, amount=1, **labels):
+        """Increment a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._ensure_flusher()
+
+    def timer(self, name, **labels):
+        """
+        Context manager observing the duration of its block
+        :return: context manager (a shared no-op when disabled)
+        """
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, name, labels)
+
+    # Multi-process aggregation: each process writes its own snapshot file, /metrics sums them
+    def _snapshot_id(self):
+        # Unique per process, so a reused pid never looks like an already retired snapshot
+        if self._owner is None or self._owner[0] != os.getpid():
+            self._owner = (os.getpid(), uuid.uuid4().hex)
+        return self._owner[1]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'id': self._snapshot_id(),
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in self._histograms.items()],
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            }
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, f"metrics_{os.getpid()}.json")
+
+    def flush(self):
+        """Write this process's snapshot to the shared directory"""
+        if not (self.enabled and self.directory):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics_')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self._snapshot_path())
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _ensure_flusher(self):
+        if not self.directory or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def collect(self):
+        """
+        Aggregated metrics of every process sharing the directory (or just this one)
+        :return: (histograms dict, counters dict) keyed by (name, labels)
+        """
+        snapshots = []
+        if self.directory:
+            self.flush()
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                if os.path.basename(path) == RETIRED_FILE:
+                    continue
+                # A worker that exited (or was replaced) keeps counting through the retired snapshot:
+                # dropping its counts would make every counter go down, which reads as a reset
+                match = SNAPSHOT_FILE.search(path)
+                if match and not _alive(int(match.group(1))):
+                    self._retire(path)
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+            retired = self._load(os.path.join(self.directory, RETIRED_FILE))
+            if retired is not None:
+                snapshots.append(retired)
+        else:
+            snapshots.append(self.snapshot())
+        return _merge(snapshots)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _retire(self, path):
+        """Fold an exited worker's snapshot into RETIRED_FILE, then remove it"""
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        with open(os.path.join(self.directory, '.metrics_retired.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            retired = self._load(retired_path) or {'histograms': [], 'counters': [], 'retired': []}
+            snapshot = self._load(path)
+            # Another worker may have folded it already, then crashed before removing it
+            if snapshot is not None and snapshot.get('id') not in retired['retired']:
+                histograms, counters = _merge([retired, snapshot])
+                retired = {
+                    'histograms': [[name, list(labels), values] for (name, labels), values in histograms.items()],
+                    'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                    'retired': (retired['retired'] + [snapshot.get('id')])[-RETIRED_SNAPSHOTS:]
+                }
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics_')
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(retired, f)
+                    os.replace(tmp_path, retired_path)
+                except OSError:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    return
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def render(self):
+        """
+        Prometheus text exposition format
+        :return: str
+        """
+        histograms, counters = self.collect()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = histograms if kind == 'histogram' else counters
+            keys = sorted(key for key in series if key[0] == name)
+            if not keys:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in keys:
+                labels = key[1]
+                if kind == 'counter':
+                    lines.append(f"{name}{_labels(labels)} {series[key]}")
+                    continue
+                values = series[key]
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {values[-1]}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Remove every snapshot in the shared directory (at server start, before workers fork)"""
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')) + \
+                glob.glob(os.path.join(self.directory, '.metrics_*')):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+def _merge(snapshots):
+    # Sum snapshots into (histograms, counters) keyed by (name, labels)
+    histograms, counters = {}, {}
+    for snap in snapshots:
+        for name, labels, values in snap['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            histograms[key] = [a + b for a, b in zip(total, values)]
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+_NO_TIMER = nullcontext()
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}'
+
+metrics = MetricsRegistry()
@@ -0,0 +1,290 @@
+# response_cache.py
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CACHE_MEMORY_ENTRIES = int(os.environ.get('API_CACHE_MEMORY_ENTRIES', 2048))
+CACHE_DIR = os.environ.get('API_CACHE_DIR', os.path.join('/tmp', 'kp_api_cache'))  # Empty string disables disk tier
+CACHE_DISK_BYTES = int(os.environ.get('API_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+CACHE_TTL = float(os.environ.get('API_CACHE_TTL', 30 * 24 * 3600))  # Seconds from the upstream fetch, 0 disables expiry
+CACHE_SYNC_INTERVAL = float(os.environ.get('API_CACHE_SYNC_INTERVAL', 1))  # Seconds between checks for other workers' invalidations
+
+# Rewritten with a new token on every invalidation, so workers sharing the disk tier drop their memory tiers too
+INVALIDATED_FILE = '.invalidated'
+
+# Parameters that don't change the upstream answer
+EXCLUDED_PARAMS = ('api_key',)
+
+def normalize_params(params):
+    """
+    Canonical form of the birth parameters used for keying
+    :param params: dict (API query parameters)
+    :return: dict with api_key removed, strings trimmed and coordinates rounded
+    """
+    normalized = {}
+    for key, value in params.items():
+        if key in EXCLUDED_PARAMS or value is None:
+            continue
+        if key in ('lat', 'lon'):
+            value = round(float(value), 6)
+        elif key == 'tz':
+            value = round(float(value), 4)
+        elif isinstance(value, str):
+            value = value.strip()
+            if key == 'lang':
+                value = value.lower()
+        normalized[key] = value
+    return normalized
+
+def cache_key(url, params):
+    """Content address of one upstream response: sha256 of endpoint and normalized params"""
+    material = json.dumps([url, normalize_params(params)], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier (memory LRU + on-disk) cache of decoded upstream JSON payloads. Each disk file holds
+    the payload with the time it was fetched, which the TTL counts from in both tiers; the file's
+    mtime only records when it was last read, for LRU eviction. Workers sharing the disk tier see
+    each other's invalidations within `sync_interval` seconds
+    """
+
+    def __init__(self, max_entries=CACHE_MEMORY_ENTRIES, cache_dir=CACHE_DIR,
+                 max_disk_bytes=CACHE_DISK_BYTES, ttl=CACHE_TTL, sync_interval=CACHE_SYNC_INTERVAL, clock=time.time):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir or None
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self._memory = OrderedDict()  # key -> (stored_at, payload)
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # Lazily measured
+        self._invalidated = None  # Last seen token in INVALIDATED_FILE
+        self._synced = None
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'stores': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._invalidated = self._invalidated_stamp()
+
+    def _invalidated_stamp(self):
+        try:
+            with open(os.path.join(self.cache_dir, INVALIDATED_FILE)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _sync(self):
+        # Drop the memory tier once another worker has invalidated anything (checked at most every
+        # sync_interval); invalidations are rare, and the disk tier still has every other entry
+        if not self.cache_dir:
+            return
+        now = time.monotonic()
+        if self._synced is not None and now - self._synced < self.sync_interval:
+            return
+        self._synced = now
+        stamp = self._invalidated_stamp()
+        if stamp != self._invalidated:
+            with self._lock:
+                self._invalidated = stamp
+                self._memory.clear()
+
+    def _mark_invalidated(self):
+        # Caller removed entries from the disk tier: tell the other workers
+        token = uuid.uuid4().hex
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(token)
+            os.replace(tmp_path, os.path.join(self.cache_dir, INVALIDATED_FILE))
+            with self._lock:
+                self._invalidated = token
+        except OSError as e:
+            logger.warning(f"Could not record cache invalidation: {str(e)}")
+
+    def _expired(self, stored_at, now):
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key, stored_at, payload):
+        # Caller holds the lock
+        self._memory[key] = (stored_at, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get(self, url, params):
+        """
+        Look up a cached payload
+        :return: decoded JSON or None on miss/expiry
+        """
+        key = cache_key(url, params)
+        now = self.clock()
+        self._sync()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry[1]
+                del self._memory[key]
+                self.stats['expired'] += 1
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            # Promoted with its fetch time, so it expires from memory when it would on disk
+            self._remember(key, *entry)
+        return entry[1]
+
+    def put(self, url, params, payload):
+        """Store a payload in both tiers"""
+        key = cache_key(url, params)
+        now = self.clock()
+        with self._lock:
+            self._remember(key, now, payload)
+            self.stats['stores'] += 1
+        self._write_disk(key, now, payload)
+
+    def invalidate(self, url, params):
+        """Drop one cached response from both tiers (other workers' memory tiers within sync_interval)"""
+        key = cache_key(url, params)
+        with self._lock:
+            self._memory.pop(key, None)
+            self.stats['invalidations'] += 1
+        if self.cache_dir:
+            try:
+                os.remove(self._path(key))
+                self._disk_bytes = None
+            except FileNotFoundError:
+                pass
+            self._mark_invalidated()
+
+    def clear(self):
+        """Drop everything from both tiers"""
+        with self._lock:
+            self.stats['invalidations'] += len(self._memory)
+            self._memory.clear()
+        if self.cache_dir:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.json'):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+            self._disk_bytes = 0
+            self._mark_invalidated()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['disk_bytes'] = self._disk_bytes
+        return stats
+
+    # Disk tier: each file is {"stored_at": fetch time, "payload": payload}
+    def _read_disk(self, key, now):
+        """:return: (stored_at, payload), or None on miss/expiry"""
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            if not (isinstance(entry, dict) and entry.keys() == {'stored_at', 'payload'}):
+                raise ValueError("not a cache entry")
+            stored_at = float(entry['stored_at'])
+            if self._expired(stored_at, now):
+                os.remove(path)
+                self._disk_bytes = None
+                with self._lock:
+                    self.stats['expired'] += 1
+                return None
+            os.utime(path, (now, now))  # Recency for eviction
+            return stored_at, entry['payload']
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key, stored_at, payload):
+        if not self.cache_dir:
+            return
+        try:
+            data = json.dumps({'stored_at': stored_at, 'payload': payload}, separators=(',', ':'))
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.utime(tmp_path, (stored_at, stored_at))
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Cache write failed for {key}: {str(e)}")
+            return
+
+        if self._disk_bytes is not None:
+            self._disk_bytes += len(data)
+        if self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove least recently used files (by mtime) until the disk tier is under 90% of its budget"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+        if total > self.max_disk_bytes:
+            target = self.max_disk_bytes * 0.9
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                with self._lock:
+                    self.stats['evictions'] += 1
+        self._disk_bytes = total
+
+response_cache = ResponseCache()
@@ -0,0 +1,15 @@
+# conftest.py
+import os
+import sys
+from datetime import datetime
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Birth of the stored vendor chart (fixtures/vendor_chart), which doesn't carry the request's birth
+# time. Worked out by hand, not by the dasha engine: the Moon at 309.967959° is 3.301292° into
+# Shatabhisha (306.666667°-320°), a Rahu star, so 0.247597 of Rahu's 18 years (4.456745 years =
+# 1627.83 days) had run at birth. The vendor starts that Rahu period on Nov 27 1965
+VENDOR_BIRTH = datetime(1970, 5, 12, 19, 49)
@@ -0,0 +1,61 @@
+# test_api_client.py
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from api_client import build_retry, build_session, get_json
+
+class _Upstream(BaseHTTPRequestHandler):
+    # Every GET answers 503 after `delay` seconds
+    delay = 0
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        time.sleep(self.delay)
+        self.send_response(503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Upstream)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _Upstream.hits = 0
+    _Upstream.delay = 0
+    yield f"http://127.0.0.1:{server.server_address[1]}/", _Upstream
+    server.shutdown()
+    server.server_close()
+
+def _session():
+    return build_session(retry=build_retry(retries=4, backoff_factor=0.1, backoff_jitter=0))
+
+def _call(url, **kwargs):
+    started = time.monotonic()
+    with pytest.raises(requests.RequestException):
+        get_json(url, {}, session=_session(), **kwargs)
+    return time.monotonic() - started
+
+def test_retries_stop_within_budget(upstream):
+    url, handler = upstream
+    # 0.1 + 0.2 + 0.4 + 0.8s of backoff without a budget
+    assert _call(url, timeout=(1, 0.2), budget=0.6) < 0.8
+    assert 1 < handler.hits < 5
+
+def test_slow_attempt_is_cut_to_budget(upstream):
+    url, handler = upstream
+    handler.delay = 1
+    assert _call(url, timeout=(1, 5), budget=0.3) < 0.6
+    assert handler.hits == 1
+    with pytest.raises(TimeoutError):
+        get_json(url, {}, session=_session(), budget=0)
+
+def test_no_budget_keeps_every_retry(upstream):
+    url, handler = upstream
+    _call(url, timeout=(1, 1), budget=None)
+    assert handler.hits == 5
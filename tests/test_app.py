@@ -0,0 +1,230 @@
+# test_app.py
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from conftest import FIXTURES_DIR
+import app
+from response_cache import ResponseCache
+
+VENDOR_DIR = os.path.join(FIXTURES_DIR, 'vendor_chart')
+PARAMS = {'dob': '12/05/1970', 'tob': '19:49', 'lat': 19.07, 'lon': 72.88, 'tz': 5.5, 'api_key': 'test', 'lang': 'en'}
+
+class _Upstream(BaseHTTPRequestHandler):
+    # Serves the vendor chart fixture of the endpoint named by the path (/<endpoint key>);
+    # `delay` holds an answer back, `failures` answers the vendor's own 500 that many times
+    files = {}
+    delay = {}
+    failures = {}
+    hits = {}
+
+    def do_GET(self):
+        key = self.path.split('?')[0].strip('/')
+        handler = type(self)
+        handler.hits[key] = handler.hits.get(key, 0) + 1
+        time.sleep(handler.delay.get(key, 0))
+        if handler.failures.get(key):
+            handler.failures[key] -= 1
+            body = b'{"status": 500, "response": "Internal error"}'
+        else:
+            with open(os.path.join(VENDOR_DIR, handler.files[key]), 'rb') as f:
+                body = f.read()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:  # The client gave up on a held-back answer
+            pass
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Upstream)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    _Upstream.files = {endpoint['key']: endpoint['filename'] for endpoint in app.API_ENDPOINTS}
+    _Upstream.delay, _Upstream.failures, _Upstream.hits = {}, {}, {}
+    for endpoint in app.API_ENDPOINTS:
+        monkeypatch.setitem(endpoint, 'url', f"{base}/{endpoint['key']}")
+    monkeypatch.setattr(app, 'response_cache', ResponseCache(cache_dir=''))
+    monkeypatch.setattr(app.upstream_scheduler, 'enabled', False)
+    yield _Upstream
+    server.shutdown()
+    server.server_close()
+
+def test_queued_call_keeps_to_request_deadline(upstream, monkeypatch):
+    # One pool thread: the second call waits 0.4s for it, which comes out of its own budget
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app, 'fetch_executor', executor)
+    upstream.delay = {'mahadasha': 0.4, 'antardasha': 0.4}
+    started = time.monotonic()
+    results = app.fetch_all(PARAMS, deadline=0.6, endpoints=app.API_ENDPOINTS[:2])
+    executor.shutdown(wait=True)
+    assert [result['status'] for result in results] == ['success', 'error']
+    # The running call gave up at the request's deadline instead of taking 0.4s more
+    assert time.monotonic() - started < 0.75
+
+def _lines(response):
+    # NDJSON result lines come in completion order; index gives the input order back
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return sorted(lines, key=lambda line: line['index'])
+
+def _record(**fields):
+    return dict({'dob': '12/05/1970', 'tob': '19:49', 'lat': 19.07, 'lon': 72.88}, **fields)
+
+def test_batch_mixed_records(upstream):
+    no_lon = _record(id='b')
+    del no_lon['lon']
+    records = [
+        _record(id='a'),
+        no_lon,
+        _record(id='c', output_format='pdf'),
+        _record(id='d', dob='31/02/1970'),
+        _record(tob='08:15', output_format='json')
+    ]
+    response = app.app.test_client().post('/batch-analyze', json=records)
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    lines = _lines(response)
+    assert [line['index'] for line in lines] == [0, 1, 2, 3, 4]
+    assert [line.get('id') for line in lines] == ['a', 'b', 'c', 'd', None]
+    assert [(line['status'], line['code']) for line in lines] == [
+        ('success', 200), ('error', 400), ('error', 400), ('error', 400), ('success', 200)
+    ]
+    assert lines[1]['message'] == 'Missing required fields'
+    assert 'output_format' in lines[2]['message']
+    assert lines[3]['message'] == 'Unrecognised date of birth: 31/02/1970'
+
+    # The good records are full analyses in their own format
+    assert isinstance(lines[0]['analysis'], str) and lines[0]['analysis'].startswith('=== Consolidated KP')
+    assert lines[4]['output_format'] == 'json' and 'current_dasa' in lines[4]['analysis']
+    assert set(lines[0]['reports']) == {endpoint['key'] for endpoint in app.API_ENDPOINTS}
+
+def test_batch_ndjson_parse_errors(upstream):
+    body = '\n'.join([
+        json.dumps(_record(id='first')),
+        '{"id": "broken", "dob": ',
+        '',
+        '[1, 2',
+        json.dumps(_record(id='last', tob='06:00'))
+    ]) + '\n'
+    response = app.app.test_client().post('/batch-analyze', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    lines = _lines(response)
+    # The blank line is skipped without using an index
+    assert [(line['index'], line['status'], line['code']) for line in lines] == [
+        (0, 'success', 200), (1, 'error', 400), (2, 'error', 400), (3, 'success', 200)
+    ]
+    assert [line.get('id') for line in lines] == ['first', None, None, 'last']
+    assert all(line['message'].startswith('Invalid JSON line') for line in lines[1:3])
+
+def test_batch_rejects_bad_body_and_caps_records(upstream):
+    client = app.app.test_client()
+    response = client.post('/batch-analyze', json={'records': 'not a list'})
+    assert response.status_code == 400 and response.get_json()['message'] == 'Expected a list of birth records'
+
+    lines = sorted(
+        (json.loads(line) for line in app.stream_batch([_record(id=i) for i in range(4)], workers=2, max_records=2)),
+        key=lambda line: line['index']
+    )
+    assert [(line['index'], line['code']) for line in lines] == [(0, 200), (1, 200), (2, 400)]
+    assert lines[2] == {'index': 2, 'id': 2, 'status': 'error', 'message': 'Batch limited to 2 records', 'code': 400}
+
+def _events(response):
+    # (event, data) per SSE frame
+    events = []
+    for frame in response.get_data(as_text=True).split('\n\n'):
+        if frame:
+            event, data = frame.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+def test_stream_sends_sections_as_they_arrive(upstream):
+    # Yogas held back, so they are the last section before the consolidated analysis
+    upstream.delay = {'yoga': 0.3}
+    client = app.app.test_client()
+    response = client.post('/generate-stream', json=_record())
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = _events(response)
+
+    names = [event for event, _ in events]
+    assert names == ['start'] + ['section'] * 8 + ['done']
+    start = events[0][1]
+    assert start['sections'] == [stage[0] for stage in app.STAGES] + ['analysis']
+    sections = [data for event, data in events if event == 'section']
+    assert [section['key'] for section in sections][-2:] == ['yoga', 'analysis']
+    assert {section['key'] for section in sections} == set(start['sections'])
+    assert all(section['title'] == start['titles'][section['key']] for section in sections)
+    assert events[-1][1] == {'status': 'success', 'message': 'Full analysis completed', 'errors': []}
+
+    # Each section is the report /generate-params gives for the same chart
+    body = client.post('/generate-params', json=_record()).get_json()
+    assert {section['key']: section['report'] for section in sections} == dict(body['reports'], analysis=body['analysis'])
+
+def test_stream_from_query_string(upstream):
+    # EventSource can only GET: the record and format come as query parameters
+    response = app.app.test_client().get('/generate-stream', query_string=_record(format='markdown'))
+    events = _events(response)
+    assert events[0][0] == 'start' and events[-1][1]['status'] == 'success'
+    analysis = [data['report'] for event, data in events if event == 'section' and data['key'] == 'analysis']
+    assert len(analysis) == 1 and analysis[0].startswith('#')
+
+    assert app.app.test_client().get('/generate-stream', query_string={'dob': '12/05/1970'}).status_code == 400
+    assert app.app.test_client().get('/generate-stream', query_string=_record(format='pdf')).status_code == 400
+
+def test_stream_reports_failed_section(upstream):
+    # The vendor keeps failing kp-planets: the other sections still stream, then an error and
+    # no consolidated analysis, which needs every section unless partial is asked for
+    upstream.failures = {'planet': 5}
+    events = _events(app.app.test_client().post('/generate-stream', json=_record()))
+    sections = [data['key'] for event, data in events if event == 'section']
+    errors = [data for event, data in events if event == 'error']
+    assert sorted(sections) == sorted(stage[0] for stage in app.STAGES if stage[0] != 'planet')
+    assert errors == [{'key': 'planet', 'message': 'Upstream status 500: Internal error'}]
+    # Asked once more before giving up
+    assert upstream.hits['planet'] == 2
+    assert events[-1] == ('done', {'status': 'error', 'message': '1 section(s) failed', 'errors': errors})
+
+def test_failed_endpoint_is_refetched(upstream):
+    # One vendor 500, then the answer: only that endpoint is asked again, and nothing is missing
+    upstream.failures = {'house': 1}
+    response = app.app.test_client().post('/generate-params', json=_record())
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['message'] == 'Full analysis completed' and 'partial' not in body
+    assert upstream.hits == {endpoint['key']: 1 for endpoint in app.API_ENDPOINTS} | {'house': 2}
+
+def test_partial_analysis_after_failed_refetch(upstream):
+    upstream.failures = {'yoga': 10}
+    client = app.app.test_client()
+
+    # Without partial, a chart short of a section fails
+    response = client.post('/generate-params', json=_record())
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Only 6/7 files created'
+    assert upstream.hits['yoga'] == 2
+
+    response = client.post('/generate-params?partial=1', json=_record(tob='06:00'))
+    body = response.get_json()
+    assert response.status_code == 200 and body['status'] == 'success' and body['partial'] is True
+    assert body['message'] == 'Partial analysis: 1/7 sections missing'
+    assert list(body['missing_sections']) == ['yoga']
+    assert body['details'] == [{
+        'status': 'error', 'filename': 'input_kp_list_of_yogas_details.json', 'attempts': 2,
+        'message': 'Upstream status 500: Internal error', 'retryable': True
+    }]
+    assert body['analysis'].startswith('PARTIAL ANALYSIS - missing sections: Yogas')
+    # The sections that arrived are all there
+    assert set(body['reports']) >= {stage[0] for stage in app.STAGES if stage[0] != 'yoga'}
+
+    body = client.post('/generate-params', json=_record(tob='07:00', partial=True, output_format='json')).get_json()
+    assert body['analysis']['missing_sections'] == ['yoga']
+    assert body['analysis']['current_dasa']['mahadasha'] == 'Mercury'
@@ -0,0 +1,43 @@
+# test_chart_archive.py
+import threading
+from chart_archive import ChartArchive, chart_key, INITIAL_CAPACITY
+
+def test_put_get_roundtrip(tmp_path):
+    archive = ChartArchive(str(tmp_path))
+    key = chart_key({'dob': '01/01/1990', 'tob': '10:00', 'lat': 28.6, 'lon': 77.2})
+    archive.put(key, {'payloads': {'house': {'status': 200}}})
+    assert key in archive
+    assert archive.get(key) == {'payloads': {'house': {'status': 200}}}
+    assert len(archive) == 1
+
+def test_concurrent_put_and_lookup(tmp_path):
+    # Readers probe while a writer grows the index several times over
+    archive = ChartArchive(str(tmp_path))
+    keys = [chart_key({'dob': f'{i}', 'tob': '10:00'}) for i in range(INITIAL_CAPACITY * 6)]
+    archive.put(keys[0], {'n': 0})
+    errors = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                assert keys[0] in archive
+                assert archive.get(keys[0]) == {'n': 0}
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        for n, key in enumerate(keys[1:], 1):
+            archive.put(key, {'n': n})
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+
+    assert not errors, errors[:3]
+    assert len(archive) == len(keys)
+    assert all(archive.get(key) == {'n': n} for n, key in enumerate(keys))
+    assert sum(1 for _ in archive.iter_charts()) == len(keys)
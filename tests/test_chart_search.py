@@ -0,0 +1,61 @@
+# test_chart_search.py
+from chart_archive import ChartArchive, chart_key
+from chart_search import ChartSearch
+from kp_benchmark import synthetic_pool
+
+def _archive(path, pool):
+    archive = ChartArchive(str(path))
+    keys = []
+    for i, payloads in enumerate(pool):
+        key = chart_key({'dob': str(i), 'tob': '10:00'})
+        archive.put(key, {'payloads': payloads})
+        keys.append(key.hex())
+    return archive, keys
+
+def test_build_saves_snapshot_and_refresh_loads_it(tmp_path):
+    pool = synthetic_pool(12)
+    archive, keys = _archive(tmp_path, pool[:8])
+    builder = ChartSearch(archive, index_interval=0)
+    assert builder.build() == 8
+    assert builder.caught_up()
+
+    # A query process starts from the snapshot without reading the archive
+    search = ChartSearch(archive, index_interval=0)
+    assert search.refresh()
+    assert len(search.keys) == 8 and search.caught_up()
+    query = {'or': [f"planet_house:Sun:{house}" for house in range(1, 13)]}
+    assert search.search(query) == builder.search(query)
+
+    # Charts archived past the snapshot wait for the indexer; a query never indexes them
+    for i, payloads in enumerate(pool[8:], 8):
+        archive.put(chart_key({'dob': str(i), 'tob': '10:00'}), {'payloads': payloads})
+    assert not search.refresh()
+    assert not search.caught_up() and search.search(query)['count'] == 8
+    assert builder.build() == 4
+    assert search.refresh()
+    assert search.caught_up() and search.search(query)['count'] == 12
+
+def test_refresh_picks_up_newer_snapshot(tmp_path):
+    pool = synthetic_pool(6)
+    archive, _ = _archive(tmp_path, pool[:3])
+    builder = ChartSearch(archive, index_interval=0)
+    search = ChartSearch(archive, index_interval=0)
+    builder.build()
+    search.refresh()
+    assert len(search.keys) == 3
+
+    for i, payloads in enumerate(pool[3:], 3):
+        archive.put(chart_key({'dob': str(i), 'tob': '10:00'}), {'payloads': payloads})
+    builder.build()
+    assert search.refresh()
+    assert len(search.keys) == 6 and search.caught_up()
+
+def test_one_indexer_per_snapshot(tmp_path):
+    archive, _ = _archive(tmp_path, synthetic_pool(2))
+    # Two instances stand in for two workers sharing the snapshot
+    first = ChartSearch(archive, index_interval=0)
+    second = ChartSearch(archive, index_interval=0)
+    assert first.is_indexer() and first.is_indexer()
+    assert not second.is_indexer()
+    first._indexer_lock.close()  # The indexing worker exits
+    assert second.is_indexer()
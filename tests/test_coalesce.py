@@ -0,0 +1,115 @@
+# test_coalesce.py
+import fcntl
+import os
+import time
+import threading
+import pytest
+from coalesce import SingleFlight
+
+INTERACTIVE, BATCH = 0, 1
+
+def _start(target):
+    box = {}
+
+    def run():
+        try:
+            box['result'] = target()
+        except Exception as e:
+            box['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, box
+
+def test_duplicate_shares_result():
+    flight = SingleFlight('test', timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return 'done'
+
+    leader, first = _start(lambda: flight.do('k', fn))
+    while not flight.get_stats()['in_flight']:
+        time.sleep(0.005)
+    joiner, second = _start(lambda: flight.do('k', fn))
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    joiner.join()
+    assert first['result'] == ('done', False) and second['result'] == ('done', True)
+    assert len(calls) == 1
+
+def test_interactive_caller_does_not_wait_on_batch_leader():
+    flight = SingleFlight('test', timeout=5)
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return 'batch'
+
+    batch, batch_box = _start(lambda: flight.do('k', slow, priority=BATCH))
+    while not flight.get_stats()['in_flight']:
+        time.sleep(0.005)
+    started = time.monotonic()
+    assert flight.do('k', lambda: 'interactive', priority=INTERACTIVE) == ('interactive', False)
+    assert time.monotonic() - started < 1
+    release.set()
+    batch.join()
+    assert batch_box['result'] == ('batch', False)
+    assert flight.get_stats()['upgraded'] == 1 and flight.get_stats()['in_flight'] == 0
+
+def test_joiner_waits_for_its_own_deadline():
+    flight = SingleFlight('test', timeout=0.05)
+
+    def slow():
+        time.sleep(0.3)
+        return 'late'
+
+    leader, _ = _start(lambda: flight.do('k', slow))
+    while not flight.get_stats()['in_flight']:
+        time.sleep(0.005)
+    assert flight.do('k', slow, timeout=5) == ('late', True)
+    leader.join()
+
+    leader, _ = _start(lambda: flight.do('k', slow))
+    while not flight.get_stats()['in_flight']:
+        time.sleep(0.005)
+    with pytest.raises(TimeoutError):
+        flight.do('k', slow)
+    leader.join()
+
+def test_lock_file_wait_is_bounded(tmp_path):
+    flight = SingleFlight('test', lock_dir=str(tmp_path))
+    with open(flight.lock_path('k'), 'a') as held:
+        fcntl.flock(held.fileno(), fcntl.LOCK_EX)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            flight.do('k', lambda: 'never', timeout=0.2)
+        assert time.monotonic() - started < 1
+        # Another key has a lock file of its own
+        assert flight.do('other', lambda: 'free', timeout=0.2) == ('free', False)
+    assert flight.do('k', lambda: 'free', timeout=0.2) == ('free', False)
+    assert flight.get_stats()['in_flight'] == 0
+    assert os.listdir(tmp_path) == []
+
+def test_lock_file_serializes_workers(tmp_path):
+    # Two instances stand in for two workers sharing the lock directory
+    flights = [SingleFlight('test', lock_dir=str(tmp_path)) for _ in range(2)]
+    inside = []
+    overlaps = []
+
+    def fn():
+        inside.append(1)
+        overlaps.append(len(inside))
+        time.sleep(0.05)
+        inside.pop()
+        return 'done'
+
+    threads = [_start(lambda flight=flight: flight.do('k', fn, timeout=5))[0] for flight in flights * 3]
+    for thread in threads:
+        thread.join()
+    assert max(overlaps) == 1
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,45 @@
+# test_job_queue.py
+import json
+import time
+import threading
+from job_queue import JobQueue
+
+STAGES = ('one', 'two')
+
+def _wait(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_status_visible_from_other_process(tmp_path):
+    # Two queues sharing a job directory stand in for two gunicorn workers
+    release = threading.Event()
+
+    def handler(payload, progress):
+        progress('one')
+        release.wait(5)
+        progress('two')
+        return {'status': 'success', 'value': payload}, 200
+
+    accepting = JobQueue(handler, stages=STAGES, workers=1, job_dir=str(tmp_path))
+    polling = JobQueue(handler, stages=STAGES, workers=1, job_dir=str(tmp_path))
+    job = accepting.submit(42)
+
+    _wait(lambda: (polling.get(job.id) or {}).get('stage') == 'one')
+    assert polling.get(job.id)['status'] == 'running'
+    release.set()
+    _wait(lambda: polling.get(job.id)['status'] == 'success')
+    state = polling.get(job.id)
+    assert state['result'] == {'status': 'success', 'value': 42}
+    assert state['completed_stages'] == ['one', 'two'] and state['progress'] == 1.0
+    assert 'worker' not in state
+    assert polling.get('0' * 32) is None and polling.get('../job') is None
+
+def test_job_of_dead_worker_reports_error(tmp_path):
+    queue = JobQueue(lambda payload, progress: ({}, 200), job_dir=str(tmp_path))
+    job_id = 'a' * 32
+    with open(tmp_path / f'job_{job_id}.json', 'w') as f:
+        json.dump({'job_id': job_id, 'status': 'running', 'stage': 'one', 'completed_stages': [],
+                   'created': time.time(), 'started': time.time(), 'finished': None, 'worker': 2 ** 22 + 1}, f)
+    assert queue.get(job_id)['status'] == 'error'
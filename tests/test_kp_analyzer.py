@@ -0,0 +1,39 @@
+# test_kp_analyzer.py
+import os
+import json
+import time
+from main import FILE_PATHS, FINAL_OUTPUT, build_chart, run_kp_analysis, chart_workspace, prune_workspaces
+from kp_analyzer import KPAstrologyCleaner
+from kp_benchmark import synthetic_pool, legacy_files_content
+
+SIGNIFICATORS = "\n\n5. KP SIGNIFICATORS"
+
+def test_report_text_consolidation_matches_chart():
+    # The text reports carry no cusp signs, so only the significators section is missing
+    for payloads in synthetic_pool(16):
+        from_chart = KPAstrologyCleaner().clean_chart(build_chart(payloads))
+        from_reports = KPAstrologyCleaner().clean_data(legacy_files_content(payloads))
+        assert from_reports == from_chart.split(SIGNIFICATORS)[0]
+
+def test_file_pipeline_consolidation_matches_chart(tmp_path):
+    payloads = synthetic_pool(1)[0]
+    for key, (input_name, _) in FILE_PATHS.items():
+        with open(os.path.join(tmp_path, input_name), 'w') as f:
+            json.dump(payloads[key], f)
+    result = run_kp_analysis(input_dir=str(tmp_path))
+    assert result['status'] == 'success'
+    with open(os.path.join(tmp_path, FINAL_OUTPUT)) as f:
+        assert f.read() == KPAstrologyCleaner().clean_chart(build_chart(payloads))
+
+def test_prune_workspaces_keeps_newest(tmp_path):
+    now = time.time()
+    for age in range(5):
+        with chart_workspace(str(tmp_path), keep=True) as workspace:
+            os.utime(workspace, (now - age * 3600, now - age * 3600))
+    (tmp_path / 'other').mkdir()
+    assert prune_workspaces(str(tmp_path), max_age=2.5 * 3600) == 2
+    assert prune_workspaces(str(tmp_path), max_count=1) == 2
+    remaining = sorted(p.name for p in tmp_path.iterdir())
+    assert len(remaining) == 2 and 'other' in remaining
+    assert os.path.getmtime(tmp_path / [name for name in remaining if name != 'other'][0]) > now - 60
+    assert prune_workspaces(str(tmp_path / 'missing'), max_age=0) == 0
@@ -0,0 +1,76 @@
+# test_kp_dasha_index.py
+import os
+import json
+from datetime import datetime, timedelta
+import pytest
+from conftest import FIXTURES_DIR, VENDOR_BIRTH
+from kp_paryantardasha_parser import extract_kp_paryantardasha
+from kp_dasha_index import DashaIndex
+from kp_vimshottari import vimshottari, moon_longitude
+
+VENDOR_DIR = os.path.join(FIXTURES_DIR, 'vendor_chart')
+DAY = timedelta(days=1)
+
+def load(name):
+    with open(os.path.join(VENDOR_DIR, f'input_kp_{name}_details.json')) as f:
+        return json.load(f)
+
+@pytest.fixture(scope='module')
+def index():
+    return DashaIndex.from_series(extract_kp_paryantardasha(load('paryantardasha')))
+
+@pytest.fixture(scope='module')
+def summary():
+    return load('mahadasha')['response']
+
+def labels(periods):
+    return [period.label for period in periods]
+
+def test_vendor_dates_are_period_starts(index, summary):
+    # The vendor dates each period's start: the current dasa it reports begins on its own
+    # date, and the period before it ends there
+    current = datetime.strptime(summary['current_dasa_time'], '%a %b %d %Y')
+    running = index.period_at(current + timedelta(days=7))
+    assert labels(running) == ['Mercury', 'Mercury/Ketu', 'Mercury/Ketu/Saturn']
+    assert [lord.abbr for lord in running[-1].lords] == summary['current_dasa'].split('>')
+    assert running[-1].start == current
+    assert labels(index.period_at(current - DAY))[-1] == 'Mercury/Ketu/Jupiter'
+
+    birth_dasa = datetime.strptime(summary['birth_dasa_time'], '%a %b %d %Y')
+    assert [lord.abbr for lord in index.period_at(birth_dasa)[-1].lords] == summary['birth_dasa'].split('>')
+
+def test_period_at(index):
+    assert len(index.starts[2]) == 729
+    assert labels(index.period_at('2022-01-10', depth=1)) == ['Mercury']
+    assert index.period_at(datetime(1965, 11, 26)) == ()
+    assert index.period_at(index.ends[2][-1]) == ()
+    with pytest.raises(ValueError):
+        index.period_at('2022-01-10', depth=4)
+
+def test_periods_between(index):
+    periods = index.periods_between('2022-01-03', '2022-04-22', depth=3)
+    assert periods[0].label == 'Mercury/Ketu/Saturn'
+    assert periods[-1].label == 'Mercury/Ketu/Mercury'
+    # The periods tile the range: each ends where the next starts
+    assert all(a.end == b.start for a, b in zip(periods, periods[1:]))
+    assert labels(index.periods_between('2021-04-25', '2022-04-22', depth=2)) == ['Mercury/Ketu']
+    assert len(index.periods_between('1900-01-01', '2200-01-01', depth=1)) == 9
+
+def test_timeline(index):
+    segments = index.timeline('2021-12-30', '2022-01-06', step_days=1, depth=3)
+    assert [(a.day, b.day, period.label) for a, b, period in segments] == [
+        (30, 2, 'Mercury/Ketu/Jupiter'), (3, 5, 'Mercury/Ketu/Saturn')
+    ]
+    before = index.timeline('1965-11-20', '1965-11-29', depth=1)
+    assert before[0][2] is None and before[-1][2].label == 'Rahu'
+    with pytest.raises(ValueError):
+        index.timeline('2022-01-01', '2022-02-01', step_days=0)
+
+def test_vendor_index_matches_computed_periods(index):
+    # Same periods as the local engine from the chart's birth
+    computed = DashaIndex.from_vimshottari(vimshottari(moon_longitude(load('planet_position')), VENDOR_BIRTH, depth=3))
+    for depth in (1, 2, 3):
+        ours = computed.periods_between('1900-01-01', '2200-01-01', depth)
+        theirs = index.periods_between('1900-01-01', '2200-01-01', depth)
+        assert labels(ours) == labels(theirs)
+        assert all(abs(a.start - b.start) <= DAY and abs(a.end - b.end) <= DAY for a, b in zip(ours, theirs))
@@ -0,0 +1,28 @@
+# test_kp_house_parser.py
+import os
+import json
+from conftest import FIXTURES_DIR
+from kp_models import PlanetName
+from kp_house_parser import ChartIndex, extract_kp_houses, get_kp_details, get_sub_lord_house
+
+HOUSES_FILE = os.path.join(FIXTURES_DIR, 'vendor_chart', 'input_kp_house_details.json')
+
+def _houses():
+    with open(HOUSES_FILE) as f:
+        return extract_kp_houses(json.load(f))
+
+def test_sub_lord_house_found_for_every_cusp():
+    houses = _houses()
+    index = ChartIndex(houses)
+    occupied = {planet.planet: house.house for house in reversed(houses) for planet in house.planets}
+    for house in houses:
+        assert get_sub_lord_house(house.cusp_sub_lord, index) == f"House {occupied[house.cusp_sub_lord]}"
+    # Names and abbreviations resolve to the same planet
+    saturn = f"House {occupied[PlanetName.SATURN]}"
+    assert get_sub_lord_house('Saturn', houses) == get_sub_lord_house('Sa', houses) == saturn
+    assert get_sub_lord_house(PlanetName.ASCENDANT, index) == "Not found in chart"
+
+def test_report_places_sub_lords():
+    report = get_kp_details(HOUSES_FILE)
+    assert report.count("Sublord (Vargas)") == 12
+    assert "Not found in chart" not in report
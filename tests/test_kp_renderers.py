@@ -0,0 +1,124 @@
+# test_kp_renderers.py
+import os
+import json
+import pytest
+from conftest import FIXTURES_DIR
+from kp_models import Chart
+from main import FILE_PATHS, apply_stage
+from kp_renderers import (
+    SECTION_TITLES, render_section, render_analysis, render_missing, mark_partial, serialize, output_filename, _table
+)
+
+VENDOR_DIR = os.path.join(FIXTURES_DIR, 'vendor_chart')
+
+def load(stage):
+    with open(os.path.join(VENDOR_DIR, FILE_PATHS[stage][0])) as f:
+        return json.load(f)['response']
+
+@pytest.fixture(scope='module')
+def chart():
+    chart = Chart()
+    for stage in FILE_PATHS:
+        apply_stage(chart, stage, {'status': 200, 'response': load(stage)})
+    return chart
+
+def _rows(markdown):
+    # Cells of every Markdown table row, separator rows left out
+    return [
+        [cell.strip() for cell in line.strip('|').split(' | ')]
+        for line in markdown.splitlines() if line.startswith('| ')
+    ]
+
+def test_json_sections_follow_the_vendor_data(chart):
+    for stage in FILE_PATHS:
+        # Plain JSON all the way down: no enums or models left (json.dumps raises on those)
+        json.dumps(render_section(chart, stage, 'json'))
+
+    # Ascendant and nine grahas under '0'-'9', then the dasha strings
+    raw = load('planet_position')
+    data = render_section(chart, 'planet_position', 'json')
+    assert [p['planet'] for p in data['planets']] == [raw[str(i)]['full_name'] for i in range(10)]
+    assert [(p['sign'], p['house'], p['global_degree']) for p in data['planets']] == [
+        (raw[str(i)]['zodiac'], raw[str(i)]['house'], raw[str(i)]['global_degree']) for i in range(10)
+    ]
+    assert data['dasha']['current_dasa'] == raw['current_dasa']
+
+    mahadasha = load('mahadasha')
+    assert render_section(chart, 'mahadasha', 'json') == {
+        key: mahadasha[key] for key in ('birth_dasa', 'birth_dasa_time', 'current_dasa', 'current_dasa_time')
+    }
+
+    antardasha = load('antardasha')
+    groups = render_section(chart, 'antardasha', 'json')['mahadashas']
+    assert [list(group['periods']) for group in groups] == antardasha['antardashas']
+    assert [list(group['starts']) for group in groups] == antardasha['antardasha_order']
+    assert groups[0]['mahadasha'] == 'Rahu'
+
+    yoga = load('yoga')
+    data = render_section(chart, 'yoga', 'json')
+    assert data['counts'] == {
+        'total': yoga['yogas_count'], 'raja': yoga['raja_yoga_count'],
+        'dhana': yoga['dhana_yoga_count'], 'daridra': yoga['daridra_yoga_count']
+    }
+    assert len(data['yogas']) == len(yoga['yogas_list'])
+
+def test_markdown_sections(chart):
+    for stage in FILE_PATHS:
+        markdown = render_section(chart, stage, 'markdown')
+        assert markdown.startswith(f"## {SECTION_TITLES[stage]}\n\n")
+        # Every table row has as many cells as its header
+        assert len({len(row) for row in _rows(markdown)}) <= 1
+
+    # One row per planet, with the values the JSON section gives
+    rows = _rows(render_section(chart, 'planet', 'markdown'))
+    planets = render_section(chart, 'planet', 'json')['planets']
+    assert len(rows) == len(planets) + 1
+    assert [row[0] for row in rows[1:]] == [planet['abbr'] for planet in planets]
+    assert [row[3] for row in rows[1:]] == [f"{planet['global_degree']:.2f}°" for planet in planets]
+
+    houses = _rows(render_section(chart, 'house', 'markdown'))
+    assert [row[0] for row in houses[1:]] == [str(house) for house in range(1, 13)]
+
+def test_markdown_table_escapes_cells():
+    assert _table(['A', 'B'], [['x|y', None]]) == "| A | B |\n|---|---|\n| x\\|y |  |"
+
+def test_text_sections_keep_the_legacy_layout(chart):
+    assert render_section(chart, 'planet_position', 'text').startswith('=== KP Planetary Details Analysis ===')
+    assert '=== Bhava 1 (' in render_section(chart, 'house', 'text')
+    with pytest.raises(ValueError):
+        render_section(chart, 'house', 'pdf')
+    with pytest.raises(ValueError):
+        render_analysis(chart, 'pdf')
+
+def test_analysis_formats_agree(chart):
+    data = render_analysis(chart, 'json')
+    json.dumps(data)
+    current = data['current_dasa']['mahadasha']
+    assert current == 'Mercury'
+    assert f"Current Mahadasha: {current}" in render_analysis(chart, 'text')
+
+    markdown = render_analysis(chart, 'markdown')
+    assert markdown.startswith(f"## {SECTION_TITLES['analysis']}")
+    assert f"- **Current Mahadasha:** {current}" in markdown
+    for heading in ('### Dasa Periods', '### Planetary Positions', '### Significant Yogas', '### House Analysis'):
+        assert heading in markdown
+    # A planet row per planet of the structured summary
+    planets = [row[0] for row in _rows(markdown.split('### Planetary Positions')[1].split('###')[0])]
+    assert planets[1:] == list(data['planets'])
+
+def test_partial_markers():
+    missing = {'yoga': 'Upstream status 500'}
+    assert render_missing('yoga', 'timeout', 'json') == {'missing': True, 'reason': 'timeout'}
+    assert render_missing('yoga', 'timeout', 'markdown') == "## Yogas\n\n_Unavailable: timeout_"
+    assert render_missing('yoga', 'timeout') == "Yogas: unavailable (timeout)"
+    assert mark_partial({'planets': {}}, missing, 'json') == {'planets': {}, 'missing_sections': ['yoga']}
+    assert mark_partial('## Summary', missing, 'markdown').startswith('> **Partial analysis** - missing sections: Yogas')
+    assert mark_partial('Summary', missing) == "PARTIAL ANALYSIS - missing sections: Yogas\n\nSummary"
+    assert mark_partial('Summary', {}) == 'Summary'
+
+def test_files():
+    assert serialize({'a': 'é', 'b': [1]}) == '{"a":"é","b":[1]}'
+    assert serialize('text') == 'text'
+    assert output_filename('output_kp_house_analysis.txt', 'markdown') == 'output_kp_house_analysis.md'
+    assert output_filename('output_kp_house_analysis.txt', 'json') == 'output_kp_house_analysis.json'
+    assert output_filename('output_kp_house_analysis.txt', 'text') == 'output_kp_house_analysis.txt'
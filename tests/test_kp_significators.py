@@ -0,0 +1,15 @@
+# test_kp_significators.py
+from main import build_chart
+from kp_benchmark import synthetic_pool
+from kp_models import Chart
+from kp_significators import SignificatorMatrix, significators
+
+def test_significators_match_matrix():
+    for payloads in synthetic_pool(32):
+        chart = build_chart(payloads)
+        assert significators(chart) == SignificatorMatrix.from_chart(chart).to_dict()
+
+def test_significators_without_chart_data():
+    chart = Chart(houses=(), planets=(), kp_planets=())
+    assert significators(chart) == SignificatorMatrix.from_chart(chart).to_dict()
+    assert all(row['houses'] == [] for row in significators(chart).values())
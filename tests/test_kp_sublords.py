@@ -0,0 +1,103 @@
+# test_kp_sublords.py
+from fractions import Fraction
+import numpy as np
+import pytest
+from kp_models import PlanetName, Sign
+from kp_sublords import UNITS_PER_DEGREE, ZODIAC_UNITS, lord_table, lords_at, lords_for, lord_names, _to_units
+
+# Vimshottari order and years, written out here rather than taken from kp_vimshottari
+ORDER = (
+    (PlanetName.KETU, 7), (PlanetName.VENUS, 20), (PlanetName.SUN, 6), (PlanetName.MOON, 10),
+    (PlanetName.MARS, 7), (PlanetName.RAHU, 18), (PlanetName.JUPITER, 16), (PlanetName.SATURN, 19),
+    (PlanetName.MERCURY, 17)
+)
+HALF_UNIT = 0.5 / UNITS_PER_DEGREE
+
+def sub_boundaries():
+    # (start degree, star lord, sub lord) of every sub, from 13°20' per nakshatra split by years/120
+    subs = []
+    for nakshatra in range(27):
+        start = Fraction(40, 3) * nakshatra
+        first = nakshatra % 9
+        for step in range(9):
+            lord, years = ORDER[(first + step) % 9]
+            subs.append((start, ORDER[first][0], lord))
+            start += Fraction(40, 3) * years / 120
+    return subs
+
+def test_to_units():
+    assert _to_units(3.0) == 3 * UNITS_PER_DEGREE
+    assert _to_units(3.0 - HALF_UNIT) == 3 * UNITS_PER_DEGREE - 1
+    # 360° wraps to 0, and anything just short of it stays in the last unit
+    assert _to_units(360.0) == 0 and _to_units(720.0) == 0
+    assert _to_units(359.99999999999994) == ZODIAC_UNITS - 1
+    assert _to_units(-1e-9) == ZODIAC_UNITS - 1
+    assert _to_units(np.array([0.0, 360.0, -HALF_UNIT])).tolist() == [0, 0, ZODIAC_UNITS - 1]
+
+def test_table_sizes():
+    # 243 subs, six of them split by a sign boundary: the KP 1-249 sub numbers
+    assert len(lord_table(2)) == 249
+    assert len(lord_table(3)) == 2193
+    with pytest.raises(ValueError):
+        lord_table(4)
+
+def test_sub_lord_boundaries():
+    table = lord_table(2)
+    # Units are thirds of an arc-second, so every sub boundary is an exact table start
+    subs = sub_boundaries()
+    units = [int(start * UNITS_PER_DEGREE) for start, _, _ in subs]
+    assert all(start * UNITS_PER_DEGREE == unit for (start, _, _), unit in zip(subs, units))
+    assert set(units) <= set(table.starts.tolist())
+
+    previous = None
+    for (start, star_lord, sub_lord), unit in zip(subs, units):
+        # Half a unit either side of the boundary, so float rounding of the degree can't blur it
+        chain = table.lords_at(unit / UNITS_PER_DEGREE + HALF_UNIT)
+        assert (chain.star_lord, chain.sub_lord) == (star_lord, sub_lord)
+        if previous is not None:
+            below = table.lords_at(unit / UNITS_PER_DEGREE - HALF_UNIT)
+            assert (below.star_lord, below.sub_lord) == previous
+        previous = (star_lord, sub_lord)
+
+    # Boundaries that are exact in binary too: the division starting there holds them
+    assert (lords_at(3.0).sub_lord, lords_at(3.0 - HALF_UNIT).sub_lord) == (PlanetName.SUN, PlanetName.VENUS)
+    assert (lords_at(40.0).nakshatra, lords_at(40.0).sub_lord) == ('Rohini', PlanetName.MOON)
+    assert (lords_at(40.0 - HALF_UNIT).nakshatra, lords_at(40.0 - HALF_UNIT).sub_lord) == ('Krittika', PlanetName.VENUS)
+
+def test_sign_boundary_splits_a_sub():
+    # 30° falls inside Krittika's Rahu sub: one sub, two rows, two signs
+    below, at = lords_at(30.0 - HALF_UNIT), lords_at(30.0)
+    assert (below.sign, below.sign_lord) == (Sign.ARIES, PlanetName.MARS)
+    assert (at.sign, at.sign_lord) == (Sign.TAURUS, PlanetName.VENUS)
+    assert below.nakshatra == at.nakshatra == 'Krittika'
+    assert below.sub_lord == at.sub_lord == PlanetName.RAHU
+    assert lord_table(2).row_at(30.0) == lord_table(2).row_at(30.0 - HALF_UNIT) + 1
+
+def test_wrap_at_360():
+    last = lords_at(359.99999999999994)
+    assert (last.sign, last.nakshatra, last.star_lord) == (Sign.PISCES, 'Revati', PlanetName.MERCURY)
+    # Revati's last sub is Saturn's, and its last sub-sub Jupiter's
+    assert (last.sub_lord, last.sub_sub_lord) == (PlanetName.SATURN, PlanetName.JUPITER)
+    assert lord_table(2).row_at(359.99999999999994) == 248
+    assert lords_at(360.0) == lords_at(0.0) == lords_at(720.0)
+    first = lords_at(0.0)
+    assert (first.sign, first.nakshatra, first.sub_lord, first.sub_sub_lord) == (
+        Sign.ARIES, 'Ashwini', PlanetName.KETU, PlanetName.KETU
+    )
+
+@pytest.mark.parametrize('depth', [2, 3])
+def test_numpy_lookup_matches_bisect(depth):
+    table = lord_table(depth)
+    starts = table.start_degrees
+    rng = np.random.default_rng(7)
+    longitudes = np.concatenate((
+        starts, starts - HALF_UNIT, starts + HALF_UNIT, rng.uniform(-360, 720, 2000),
+        [0.0, 360.0, 359.99999999999994, -1e-9]
+    ))
+    found = lords_for(longitudes, depth)
+    assert found['row'].tolist() == [table.row_at(value) for value in longitudes]
+    columns = ('sign_lord', 'star_lord', 'sub_lord') + (('sub_sub_lord',) if depth > 2 else ())
+    for index in rng.choice(len(longitudes), 200, replace=False):
+        chain = table.lords_at(longitudes[index])
+        for column in columns:
+            assert lord_names(found[column][index]) == getattr(chain, column)
@@ -0,0 +1,62 @@
+# test_kp_vimshottari.py
+import os
+import json
+from datetime import datetime, timedelta
+import pytest
+from conftest import FIXTURES_DIR, VENDOR_BIRTH
+from kp_models import PlanetName
+from kp_vimshottari import vimshottari, moon_longitude, dasha_payloads, compare_with_upstream
+
+VENDOR_DIR = os.path.join(FIXTURES_DIR, 'vendor_chart')
+
+def load(name):
+    with open(os.path.join(VENDOR_DIR, f'input_kp_{name}_details.json')) as f:
+        return json.load(f)
+
+@pytest.fixture(scope='module')
+def upstream():
+    return {key: load(key) for key in ('mahadasha', 'antardasha', 'paryantardasha')}
+
+RAHU_BALANCE_YEARS = 13.543255  # 18 * (1 - 0.247597), see VENDOR_BIRTH
+
+def _years(delta):
+    return delta / timedelta(days=365.25)
+
+@pytest.mark.parametrize('moon, lord, balance_years, first_end', [
+    (0.0, PlanetName.KETU, 7.0, datetime(2006, 12, 31, 18, 0)),  # Start of Ashwini: all of Ketu's 7 years
+    (10.0, PlanetName.KETU, 1.75, datetime(2001, 10, 1, 4, 30)),  # 3/4 through Ashwini
+    (313.333333333, PlanetName.RAHU, 9.0, datetime(2008, 12, 31, 6, 0)),  # Halfway through Shatabhisha
+    (133.333333333 + 1e-9, PlanetName.VENUS, 20.0, datetime(2020, 1, 1)),  # Start of Purva Phalguni
+])
+def test_balance_of_first_dasha(moon, lord, balance_years, first_end):
+    birth = datetime(2000, 1, 1)
+    dasha = vimshottari(moon, birth, depth=2)
+    assert dasha.period_at(birth, depth=1) == (lord,)
+    end = dasha.ends[0][0].astype(datetime)
+    assert abs(_years(end - birth) - balance_years) < 1e-6
+    assert abs(end - first_end) <= timedelta(seconds=1)
+    # The first antardasha is the mahadasha lord's own, 1/120 of its full length times its years
+    full_years = {PlanetName.KETU: 7, PlanetName.RAHU: 18, PlanetName.VENUS: 20}[lord]
+    sub_end = dasha.ends[1][0][0].astype(datetime)
+    assert abs(_years(sub_end - dasha.starts[0][0].astype(datetime)) - full_years * full_years / 120) < 1e-6
+
+def test_balance_of_vendor_chart():
+    dasha = vimshottari(moon_longitude(load('planet_position')), VENDOR_BIRTH, depth=1)
+    assert dasha.period_at(VENDOR_BIRTH) == (PlanetName.RAHU,)
+    assert abs(_years(dasha.ends[0][0].astype(datetime) - VENDOR_BIRTH) - RAHU_BALANCE_YEARS) < 1e-5
+
+def test_local_dashas_match_vendor(upstream):
+    dasha = vimshottari(moon_longitude(load('planet_position')), VENDOR_BIRTH, depth=3)
+    computed = dasha_payloads(dasha, now=datetime(2022, 1, 10))
+    # Vendor dates are period starts rounded to the day
+    assert compare_with_upstream(computed, upstream, tolerance_days=1.0) == []
+
+    expected, got = upstream['mahadasha']['response'], computed['mahadasha']['response']
+    assert got['birth_dasa'] == expected['birth_dasa']
+    assert got['current_dasa'] == expected['current_dasa']
+    assert got['current_dasa_time'] == expected['current_dasa_time']
+
+def test_compare_reports_shifted_dates(upstream):
+    dasha = vimshottari(moon_longitude(load('planet_position')), VENDOR_BIRTH.replace(year=VENDOR_BIRTH.year + 1), depth=3)
+    problems = compare_with_upstream(dasha_payloads(dasha), upstream, tolerance_days=1.0)
+    assert problems and any(problem.startswith('mahadasha') for problem in problems)
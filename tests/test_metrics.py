@@ -0,0 +1,50 @@
+# test_metrics.py
+import os
+import json
+import subprocess
+import sys
+from metrics import MetricsRegistry, RETIRED_FILE
+
+def _dead_pid():
+    # A pid that has certainly exited: a finished child process
+    child = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    return int(child.stdout)
+
+def _write_snapshot(directory, pid, value, snapshot_id=None):
+    snapshot = {
+        'id': snapshot_id or f"snapshot-{pid}",
+        'histograms': [['kp_test_seconds', [], [value, 0, float(value)]]],
+        'counters': [['kp_test_total', [], value]]
+    }
+    with open(os.path.join(directory, f"metrics_{pid}.json"), 'w') as f:
+        json.dump(snapshot, f)
+
+def test_exited_workers_keep_counting(tmp_path):
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.inc('kp_test_total')
+    _write_snapshot(tmp_path, os.getppid(), 2)
+    _, counters = registry.collect()
+    assert counters[('kp_test_total', ())] == 3
+
+    # Two workers recycled: their counts stay in the totals, once each
+    first, second = _dead_pid(), _dead_pid()
+    _write_snapshot(tmp_path, first, 5)
+    _write_snapshot(tmp_path, second, 7)
+    for _ in range(2):
+        histograms, counters = registry.collect()
+        assert counters[('kp_test_total', ())] == 15
+        assert histograms[('kp_test_seconds', ())] == [14, 0, 14.0]
+    assert not os.path.exists(os.path.join(tmp_path, f"metrics_{first}.json"))
+
+    # A snapshot folded before a crash left it behind is not counted twice
+    _write_snapshot(tmp_path, first, 5)
+    assert registry.collect()[1][('kp_test_total', ())] == 15
+    with open(os.path.join(tmp_path, RETIRED_FILE)) as f:
+        assert sorted(json.load(f)['retired']) == sorted([f"snapshot-{first}", f"snapshot-{second}"])
+
+    # A new process reusing a retired pid is counted when it exits in turn
+    _write_snapshot(tmp_path, first, 5, 'reused')
+    assert registry.collect()[1][('kp_test_total', ())] == 20
+
+    registry.clear()
+    assert not [name for name in os.listdir(tmp_path) if 'metrics_' in name]
@@ -0,0 +1,76 @@
+# test_response_cache.py
+import os
+from response_cache import ResponseCache, cache_key
+
+URL = 'https://upstream.test/kp-houses'
+PARAMS = {'dob': '27/11/1965', 'tob': '05:30', 'lat': 11.0, 'lon': 77.0, 'tz': 5.5, 'api_key': 'secret'}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def _params(i):
+    return dict(PARAMS, tob=f"05:{i:02d}")
+
+def test_api_key_not_part_of_key():
+    assert cache_key(URL, PARAMS) == cache_key(URL, dict(PARAMS, api_key='other'))
+    assert cache_key(URL, PARAMS) == cache_key(URL, dict(PARAMS, lat=11.0000001, tob=' 05:30 '))
+    assert cache_key(URL, PARAMS) != cache_key(URL, dict(PARAMS, tob='05:31'))
+
+def test_ttl_counts_from_fetch_not_last_read(tmp_path):
+    clock = FakeClock()
+    writer = ResponseCache(cache_dir=str(tmp_path), ttl=100, clock=clock)
+    writer.put(URL, PARAMS, {'status': 200})
+    reader = ResponseCache(cache_dir=str(tmp_path), ttl=100, clock=clock)
+    for _ in range(3):
+        clock.now += 30
+        assert writer.get(URL, PARAMS) == {'status': 200}
+        assert reader.get(URL, PARAMS) == {'status': 200}  # Disk hit, then promoted to memory
+    clock.now += 30  # 120s after the fetch, read every 30s
+    assert writer.get(URL, PARAMS) is None
+    assert reader.get(URL, PARAMS) is None
+    assert not os.path.exists(os.path.join(tmp_path, f"{cache_key(URL, PARAMS)}.json"))
+
+def test_memory_lru_eviction():
+    cache = ResponseCache(max_entries=2, cache_dir='')
+    cache.put(URL, _params(1), 1)
+    cache.put(URL, _params(2), 2)
+    assert cache.get(URL, _params(1)) == 1
+    cache.put(URL, _params(3), 3)
+    assert cache.get(URL, _params(2)) is None
+    assert cache.get(URL, _params(1)) == 1 and cache.get(URL, _params(3)) == 3
+    assert cache.get_stats()['evictions'] == 1
+
+def test_disk_eviction_drops_least_recently_read(tmp_path):
+    clock = FakeClock()
+    payload = {'response': 'x' * 1000}
+    cache = ResponseCache(max_entries=1, cache_dir=str(tmp_path), max_disk_bytes=3500, clock=clock)
+    for i in range(3):
+        clock.now += 10
+        cache.put(URL, _params(i), payload)
+    clock.now += 10
+    cache.put(URL, _params(9), 'memory')  # Push entry 0 out of memory
+    assert cache.get(URL, _params(0)) == payload  # A disk read makes it the most recent
+    clock.now += 10
+    cache.put(URL, _params(3), payload)
+    files = set(os.listdir(tmp_path))
+    assert f"{cache_key(URL, _params(0))}.json" in files
+    assert f"{cache_key(URL, _params(1))}.json" not in files
+    assert sum(os.path.getsize(tmp_path / name) for name in files if name.endswith('.json')) <= 3500
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    first = ResponseCache(cache_dir=str(tmp_path), sync_interval=0)
+    second = ResponseCache(cache_dir=str(tmp_path), sync_interval=0)
+    first.put(URL, PARAMS, 'a')
+    first.put(URL, _params(1), 'b')
+    assert second.get(URL, PARAMS) == 'a' and second.get(URL, _params(1)) == 'b'  # Now in both memory tiers
+
+    first.invalidate(URL, PARAMS)
+    assert first.get(URL, PARAMS) is None and second.get(URL, PARAMS) is None
+    assert second.get(URL, _params(1)) == 'b'  # Reloaded from disk
+
+    second.clear()
+    assert first.get(URL, _params(1)) is None
@@ -0,0 +1,79 @@
+# test_timezone_resolver.py
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from timezone_resolver import TimezoneResolver, parse_birth_datetime
+
+NEW_YORK = 'America/New_York'
+
+@pytest.fixture(scope='module')
+def resolver():
+    return TimezoneResolver()
+
+@pytest.mark.parametrize('dob, tob, expected', [
+    ('23/06/1990', '14:30', datetime(1990, 6, 23, 14, 30)),
+    ('1990-06-23', '14:30:15', datetime(1990, 6, 23, 14, 30, 15)),
+    ('06/23/1990', '02:30 PM', datetime(1990, 6, 23, 14, 30)),  # Not a valid dd/mm, so mm/dd
+    ('23-06-1990', ' 12:05 am ', datetime(1990, 6, 23, 0, 5)),
+    ('05/06/1990', '09:00', datetime(1990, 6, 5, 9, 0)),  # Ambiguous: the vendor's dd/mm wins
+])
+def test_parse_birth_datetime(dob, tob, expected):
+    assert parse_birth_datetime(dob, tob) == expected
+
+@pytest.mark.parametrize('dob, tob', [('31/02/1990', '10:00'), ('yesterday', '10:00'), ('23/06/1990', '25:00')])
+def test_parse_birth_datetime_rejects(dob, tob):
+    with pytest.raises(ValueError):
+        parse_birth_datetime(dob, tob)
+
+@pytest.mark.parametrize('local, offset', [
+    # Spring forward, 2021-03-14 02:00 EST -> 03:00 EDT
+    (datetime(2021, 3, 14, 1, 59), -5.0),
+    (datetime(2021, 3, 14, 3, 0), -4.0),
+    # Fall back, 2021-11-07 02:00 EDT -> 01:00 EST; the repeated hour reads as standard time
+    (datetime(2021, 11, 7, 0, 59), -4.0),
+    (datetime(2021, 11, 7, 1, 0), -5.0),
+    (datetime(2021, 11, 7, 2, 0), -5.0),
+])
+def test_offset_either_side_of_dst_transition(resolver, local, offset):
+    assert resolver.offset_at(NEW_YORK, local) == offset
+
+def test_offset_matches_pytz_outside_transitions(resolver):
+    # Unambiguous times across a few years, checked against pytz's own localize
+    zone = pytz.timezone(NEW_YORK)
+    moment = datetime(2019, 1, 1, 12)
+    while moment < datetime(2023, 1, 1):
+        expected = zone.localize(moment, is_dst=None).utcoffset().total_seconds() / 3600
+        assert resolver.offset_at(NEW_YORK, moment) == expected
+        moment += timedelta(days=5, hours=7)
+
+@pytest.mark.parametrize('zone, local, offset', [
+    ('Asia/Kolkata', datetime(1943, 6, 1), 6.5),  # Wartime time, 1942-1945
+    ('Asia/Kolkata', datetime(1950, 6, 1), 5.5),
+    ('Europe/London', datetime(1970, 1, 15), 1.0),  # British Standard Time, all year 1968-1971
+    ('Europe/London', datetime(1975, 1, 15), 0.0),
+])
+def test_historical_offsets(resolver, zone, local, offset):
+    assert resolver.offset_at(zone, local) == offset
+
+def test_zone_lookup(resolver):
+    assert resolver.zone_at(19.07, 72.88) == 'Asia/Kolkata'
+    assert resolver.zone_at(40.71, -74.01) == NEW_YORK
+    # Open sea falls back to the nautical zone, whose offset is fixed
+    assert resolver.zone_at(0.0, -30.0) == 'Etc/GMT+2'
+    assert resolver.offset_at('Etc/GMT+2', datetime(2000, 1, 1)) == -2.0
+
+    # Coordinates are cached at `precision` decimal places
+    hits = resolver.cache_info()['hits']
+    assert resolver.zone_at(19.070001, 72.879999) == 'Asia/Kolkata'
+    assert resolver.cache_info()['hits'] == hits + 1
+
+def test_offsets_for_birth_records(resolver):
+    records = [
+        {'lat': 40.71, 'lon': -74.01, 'dob': '14/03/2021', 'tob': '01:30'},
+        {'lat': 40.71, 'lon': -74.01, 'dob': '14/03/2021', 'tob': '03:30'},
+        {'lat': 19.07, 'lon': 72.88, 'dob': '01/06/1943', 'tob': '12:00'},
+        {'lat': 19.07, 'lon': 72.88, 'dob': 'not a date', 'tob': '12:00'},
+        {'lat': 19.07, 'lon': 72.88}
+    ]
+    assert resolver.offsets_for(records) == [-5.0, -4.0, 6.5, None, None]
+    assert resolver.offset_for(40.71, -74.01, '07/11/2021', '00:30') == -4.0
@@ -0,0 +1,138 @@
+# test_upstream_scheduler.py
+import time
+import threading
+import pytest
+from upstream_scheduler import UpstreamScheduler, INTERACTIVE, BATCH
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class Throttled(Exception):
+    # Looks like requests.HTTPError for a 429
+    def __init__(self, retry_after):
+        super().__init__('429')
+        self.response = type('Response', (), {'status_code': 429, 'headers': {'Retry-After': retry_after}})()
+
+def _scheduler(clock, **kwargs):
+    kwargs = dict(dict(enabled=True, rate=1.0, burst=1.0, reserve=0.0, clock=clock), **kwargs)
+    return UpstreamScheduler(**kwargs)
+
+def _advance(scheduler, clock, seconds):
+    # Move the fake clock and wake the waiters, whose condition waits run on real time
+    clock.now += seconds
+    with scheduler._lock:
+        for bucket in scheduler._buckets.values():
+            bucket.ready.notify_all()
+
+def _waiting(scheduler, count, key='k'):
+    deadline = time.time() + 5
+    while sum(scheduler.get_stats()['keys'][scheduler._label(key)]['waiting'].values()) < count:
+        assert time.time() < deadline, "waiters never queued"
+        time.sleep(0.005)
+
+def _queue(scheduler, served, name, priority, tenant='t', key='k', timeout=None):
+    def run():
+        try:
+            scheduler.acquire(key, priority, tenant, timeout)
+            served.append(name)
+        except TimeoutError:
+            served.append(f"{name}:timeout")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def _serve_one(scheduler, clock, served, count, seconds=1.0):
+    _advance(scheduler, clock, seconds)
+    deadline = time.time() + 5
+    while len(served) < count:
+        assert time.time() < deadline, "no waiter served"
+        time.sleep(0.005)
+
+def test_interactive_served_before_earlier_batch():
+    clock = FakeClock()
+    scheduler = _scheduler(clock)
+    scheduler.acquire('k')  # Empty the bucket
+    served = []
+    threads = [_queue(scheduler, served, 'batch', BATCH)]
+    _waiting(scheduler, 1)
+    threads.append(_queue(scheduler, served, 'interactive', INTERACTIVE))
+    _waiting(scheduler, 2)
+    _serve_one(scheduler, clock, served, 1)
+    _serve_one(scheduler, clock, served, 2)
+    assert served == ['interactive', 'batch']
+    for thread in threads:
+        thread.join(5)
+
+def test_tenants_take_turns():
+    clock = FakeClock()
+    scheduler = _scheduler(clock)
+    scheduler.acquire('k')
+    served = []
+    for queued, (name, tenant) in enumerate((('a1', 'a'), ('a2', 'a'), ('b1', 'b')), 1):
+        _queue(scheduler, served, name, BATCH, tenant)
+        _waiting(scheduler, queued)
+    for count in (1, 2, 3):
+        _serve_one(scheduler, clock, served, count)
+    assert served == ['a1', 'b1', 'a2']
+
+def test_batch_leaves_interactive_reserve():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, rate=0.001, burst=5.0, reserve=3.0)
+    for _ in range(2):
+        assert scheduler.acquire('k', BATCH, timeout=0) == 0
+    with pytest.raises(TimeoutError):
+        scheduler.acquire('k', BATCH, timeout=0)  # 3 tokens left, a batch call needs 1 + 3
+    for _ in range(3):
+        assert scheduler.acquire('k', INTERACTIVE, timeout=0) == 0
+    with pytest.raises(TimeoutError):
+        scheduler.acquire('k', INTERACTIVE, timeout=0)
+
+def test_429_pauses_key_and_halves_rate():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, rate=10.0, burst=10.0, min_rate=0.5)
+    attempts = []
+
+    def fn():
+        attempts.append(clock())
+        if len(attempts) == 1:
+            raise Throttled('2')
+        return 'ok'
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(scheduler.call('k', fn)), daemon=True)
+    thread.start()
+    _waiting(scheduler, 1)
+    stats = scheduler.get_stats()['keys'][scheduler._label('k')]
+    assert stats['rate'] == 5.0 and stats['paused_seconds'] == 2.0 and stats['throttled'] == 1
+    _advance(scheduler, clock, 1.0)
+    time.sleep(0.05)
+    assert not result  # Still paused
+    _advance(scheduler, clock, 1.5)
+    thread.join(5)
+    assert result == ['ok'] and attempts[1] - attempts[0] >= 2.0
+    # Each success restores `recovery` of the configured rate
+    assert scheduler.get_stats()['keys'][scheduler._label('k')]['rate'] == 5.5
+
+def test_max_wait_expires():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, rate=0.01)
+    scheduler.acquire('k')
+    served = []
+    thread = _queue(scheduler, served, 'late', INTERACTIVE, timeout=5)
+    _waiting(scheduler, 1)
+    _advance(scheduler, clock, 6)
+    thread.join(5)
+    assert served == ['late:timeout']
+    stats = scheduler.get_stats()['keys'][scheduler._label('k')]
+    assert stats['timeouts'] == 1 and stats['waiting'] == {'interactive': 0, 'batch': 0}
+
+def test_split_divides_quota_between_processes():
+    scheduler = _scheduler(FakeClock(), rate=12.0, burst=24.0, reserve=3.0)
+    scheduler.split(4)
+    stats = scheduler.get_stats()
+    assert (stats['rate'], stats['burst'], stats['reserve'], stats['processes']) == (3.0, 6.0, 0.75, 4)
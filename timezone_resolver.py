@@ -0,0 +1,151 @@
+# timezone_resolver.py
+import os
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+# pytz and timezonefinder are imported on first use, keeping them off the app's import path
+
+# Configuration
+COORD_PRECISION = int(os.environ.get('TZ_COORD_PRECISION', 4))  # Decimal places, 4 ~ 11 m
+ZONE_CACHE_SIZE = int(os.environ.get('TZ_ZONE_CACHE_SIZE', 65536))
+TZ_IN_MEMORY = os.environ.get('TZ_IN_MEMORY', '0') == '1'  # Read polygon data into RAM (shared copy-on-write when preloaded)
+
+# Accepted birth date/time layouts; the vendor API uses dd/mm/yyyy
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M:%S %p')
+
+@lru_cache(maxsize=4096)
+def parse_birth_datetime(dob, tob):
+    """
+    Parse birth date and time strings into a naive local datetime
+    :param dob: str (e.g. 23/06/1990)
+    :param tob: str (e.g. 14:30 or 02:30 PM)
+    :return: datetime
+    """
+    birth_date = None
+    for fmt in DATE_FORMATS:
+        try:
+            birth_date = datetime.strptime(str(dob).strip(), fmt).date()
+            break
+        except ValueError:
+            continue
+    if birth_date is None:
+        raise ValueError(f"Unrecognised date of birth: {dob}")
+
+    for fmt in TIME_FORMATS:
+        try:
+            birth_time = datetime.strptime(str(tob).strip().upper(), fmt).time()
+            return datetime.combine(birth_date, birth_time)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time of birth: {tob}")
+
+class TimezoneResolver:
+    """Long-lived coordinate -> zone -> UTC offset resolver"""
+
+    def __init__(self, precision=COORD_PRECISION, cache_size=ZONE_CACHE_SIZE, in_memory=TZ_IN_MEMORY):
+        self.precision = precision
+        self.in_memory = in_memory
+        self._finder = None
+        self._finder_lock = threading.Lock()
+        self._transitions = {}  # zone name -> (local transition times, offsets in hours)
+        self._zone_at = lru_cache(maxsize=cache_size)(self._lookup_zone)
+
+    @property
+    def finder(self):
+        """TimezoneFinder instance, loaded once"""
+        if self._finder is None:
+            with self._finder_lock:
+                if self._finder is None:
+                    from timezonefinder import TimezoneFinder
+                    self._finder = TimezoneFinder(in_memory=self.in_memory)
+        return self._finder
+
+    def _lookup_zone(self, lat, lon):
+        zone = self.finder.timezone_at(lng=lon, lat=lat)
+        if zone is None:
+            # Open sea: nautical zone from longitude (Etc/GMT signs are inverted)
+            hours = int(round(lon / 15.0))
+            zone = 'Etc/GMT' if hours == 0 else f"Etc/GMT{'-' if hours > 0 else '+'}{abs(hours)}"
+        return zone
+
+    def zone_at(self, lat, lon):
+        """
+        Zone name for a coordinate, cached on coordinates rounded to `precision`
+        :return: str (IANA zone name)
+        """
+        return self._zone_at(round(float(lat), self.precision), round(float(lon), self.precision))
+
+    def _zone_transitions(self, zone_name):
+        transitions = self._transitions.get(zone_name)
+        if transitions is not None:
+            return transitions
+
+        import pytz
+        zone = pytz.timezone(zone_name)
+        utc_times = getattr(zone, '_utc_transition_times', None)
+        if not utc_times:
+            # Fixed-offset zone
+            offset = zone.utcoffset(datetime(2000, 1, 1)).total_seconds() / 3600
+            transitions = ([datetime.min], [offset])
+        else:
+            local_times = []
+            offsets = []
+            for i, (utc_time, info) in enumerate(zip(utc_times, zone._transition_info)):
+                utcoffset = info[0]
+                # Transition instants expressed in the local wall clock they switch to
+                local_times.append(datetime.min if i == 0 else utc_time + utcoffset)
+                offsets.append(utcoffset.total_seconds() / 3600)
+            transitions = (local_times, offsets)
+
+        self._transitions[zone_name] = transitions
+        return transitions
+
+    def offset_at(self, zone_name, local_dt):
+        """
+        UTC offset in hours for a local wall-clock time in a zone
+        :param zone_name: str (IANA zone name)
+        :param local_dt: naive datetime (local time)
+        :return: float
+        """
+        local_times, offsets = self._zone_transitions(zone_name)
+        return offsets[max(bisect_right(local_times, local_dt) - 1, 0)]
+
+    def offset_for(self, lat, lon, dob, tob):
+        """
+        UTC offset in hours at the birth place for the actual birth date and time
+        :return: float
+        """
+        return self.offset_at(self.zone_at(lat, lon), parse_birth_datetime(dob, tob))
+
+    def zones_at(self, coords):
+        """
+        Batch zone lookup
+        :param coords: iterable of (lat, lon)
+        :return: list of zone names, same order
+        """
+        return [self.zone_at(lat, lon) for lat, lon in coords]
+
+    def offsets_for(self, records):
+        """
+        Batch offset lookup
+        :param records: iterable of dicts with lat, lon, dob, tob
+        :return: list of offsets in hours (None where a record can't be resolved)
+        """
+        offsets = []
+        for record in records:
+            try:
+                offsets.append(self.offset_for(record['lat'], record['lon'], record['dob'], record['tob']))
+            except (KeyError, TypeError, ValueError):
+                offsets.append(None)
+        return offsets
+
+    def warm_up(self):
+        """Load the polygon data and pytz ahead of the first request"""
+        self.offset_at(self.zone_at(0.0, 0.0), datetime(2000, 1, 1))
+
+    def cache_info(self):
+        return self._zone_at.cache_info()._asdict()
+
+resolver = TimezoneResolver()
@@ -0,0 +1,326 @@
+# upstream_scheduler.py
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SCHEDULER_ENABLED = os.environ.get('KP_SCHEDULER', '1') == '1'
+# Rate and burst are each API key's whole quota; with several worker processes each takes its share (see split)
+UPSTREAM_RATE = float(os.environ.get('UPSTREAM_RATE', 10))  # Upstream calls per second per API key
+UPSTREAM_BURST = float(os.environ.get('UPSTREAM_BURST', 20))  # Token bucket size
+UPSTREAM_INTERACTIVE_RESERVE = float(os.environ.get('UPSTREAM_INTERACTIVE_RESERVE', 3))  # Tokens batch calls leave for interactive ones
+UPSTREAM_THROTTLE_RETRIES = int(os.environ.get('UPSTREAM_THROTTLE_RETRIES', 4))  # Re-queues of a call answered 429
+UPSTREAM_MAX_BACKOFF = float(os.environ.get('UPSTREAM_MAX_BACKOFF', 60))  # Longest pause after a 429, seconds
+UPSTREAM_MIN_RATE = float(os.environ.get('UPSTREAM_MIN_RATE', 0.2))  # Floor for the adapted rate
+UPSTREAM_RECOVERY = float(os.environ.get('UPSTREAM_RECOVERY', 0.05))  # Share of UPSTREAM_RATE restored per successful call
+
+# Priorities, most urgent first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = ('interactive', 'batch')
+DEFAULT_TENANT = 'default'
+
+def retry_after(error):
+    """
+    Whether an upstream error is a 429, and how long it asked us to wait
+    :param error: Exception raised by the upstream call (requests.HTTPError carries .response)
+    :return: seconds from Retry-After (0.0 when absent or unreadable), or None when not throttled
+    """
+    response = getattr(error, 'response', None)
+    if response is None or getattr(response, 'status_code', None) != 429:
+        return None
+    value = (response.headers.get('Retry-After') or '').strip()
+    if not value:
+        return 0.0
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class _Waiter:
+    __slots__ = ('priority', 'tenant')
+
+    def __init__(self, priority, tenant):
+        self.priority = priority
+        self.tenant = tenant
+
+class _Bucket:
+    """Token bucket and wait queues of one API key"""
+    __slots__ = ('tokens', 'rate', 'updated', 'paused_until', 'strikes', 'queues', 'ready', 'stats')
+
+    def __init__(self, rate, burst, now, lock):
+        self.tokens = burst
+        self.rate = rate
+        self.updated = now
+        self.paused_until = 0.0
+        self.strikes = 0  # 429s since the last success
+        self.queues = [OrderedDict() for _ in PRIORITIES]  # per priority: tenant -> deque of waiters
+        self.ready = threading.Condition(lock)
+        self.stats = {'served': [0] * len(PRIORITIES), 'throttled': 0, 'timeouts': 0, 'wait_seconds': [0.0] * len(PRIORITIES)}
+
+    def head(self):
+        # Most urgent priority first; within it tenants take turns, each tenant in arrival order
+        for tenants in self.queues:
+            if tenants:
+                return next(iter(tenants.values()))[0]
+        return None
+
+    def remove(self, waiter, served):
+        tenants = self.queues[waiter.priority]
+        waiting = tenants[waiter.tenant]
+        waiting.remove(waiter)
+        if not waiting:
+            del tenants[waiter.tenant]
+        elif served:
+            tenants.move_to_end(waiter.tenant)
+
+class UpstreamScheduler:
+    """
+    Admits upstream calls under a token bucket per API key. Waiting calls are served by
+    priority (interactive before batch), round-robin across tenants within a priority, and
+    batch calls only take a token while `reserve` more stay in the bucket, so a burst of
+    batch work cannot make an interactive request wait for a refill. A 429 pauses the key
+    for its Retry-After (or an exponential backoff), halves its rate and re-queues the call;
+    successful calls bring the rate back up step by step
+    """
+
+    def __init__(self, enabled=SCHEDULER_ENABLED, rate=UPSTREAM_RATE, burst=UPSTREAM_BURST,
+                 reserve=UPSTREAM_INTERACTIVE_RESERVE, retries=UPSTREAM_THROTTLE_RETRIES,
+                 max_backoff=UPSTREAM_MAX_BACKOFF, min_rate=UPSTREAM_MIN_RATE, recovery=UPSTREAM_RECOVERY,
+                 clock=time.monotonic):
+        self.enabled = enabled
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.recovery = recovery
+        self.clock = clock
+        self._quota = (rate, burst, reserve, min_rate)
+        self._buckets = {}  # API key -> _Bucket
+        self._lock = threading.Lock()
+        self.split(1)
+
+    def split(self, processes):
+        """
+        Take this process's share of every key's quota. Buckets live in each process, so with
+        N worker processes each one admits rate/N calls per second (burst/N at once)
+        :param processes: int (processes running a scheduler against the same API keys)
+        """
+        processes = max(int(processes), 1)
+        rate, burst, reserve, min_rate = self._quota
+        with self._lock:
+            self.processes = processes
+            self.rate = rate / processes
+            self.burst = max(burst / processes, 1.0)
+            self.reserve = min(max(reserve / processes, 0.0), self.burst - 1)
+            self.min_rate = min(min_rate / processes, self.rate)
+            for bucket in self._buckets.values():
+                bucket.rate = min(bucket.rate, self.rate)
+                bucket.tokens = min(bucket.tokens, self.burst)
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.rate, self.burst, self.clock(), self._lock)
+        return bucket
+
+    def _refill(self, bucket, now):
+        start = max(bucket.updated, bucket.paused_until)
+        if now > start:
+            bucket.tokens = min(bucket.tokens + (now - start) * bucket.rate, self.burst)
+        bucket.updated = max(now, bucket.updated)
+
+    def acquire(self, key, priority=INTERACTIVE, tenant=DEFAULT_TENANT, timeout=None):
+        """
+        Wait for this call's turn and take one token
+        :param key: str (API key the quota belongs to)
+        :param priority: INTERACTIVE or BATCH
+        :param tenant: str (client whose calls share one round-robin turn)
+        :param timeout: Seconds to wait at most (None = no limit)
+        :return: seconds waited
+        :raises TimeoutError: when no token could be had in time
+        """
+        started = self.clock()
+        deadline = None if timeout is None else started + timeout
+        needed = 1.0 if priority == INTERACTIVE else 1.0 + self.reserve
+        waiter = _Waiter(priority, tenant)
+        with self._lock:
+            bucket = self._bucket(key)
+            bucket.queues[priority].setdefault(tenant, deque()).append(waiter)
+            try:
+                while True:
+                    now = self.clock()
+                    self._refill(bucket, now)
+                    pause = None
+                    if bucket.head() is waiter:
+                        shortfall = needed - bucket.tokens
+                        ready_at = max(bucket.paused_until, now + shortfall / bucket.rate if shortfall > 0 else now)
+                        if ready_at <= now:
+                            bucket.tokens -= 1
+                            bucket.remove(waiter, served=True)
+                            waited = now - started
+                            bucket.stats['served'][priority] += 1
+                            bucket.stats['wait_seconds'][priority] += waited
+                            bucket.ready.notify_all()
+                            return waited
+                        pause = ready_at - now
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            bucket.stats['timeouts'] += 1
+                            raise TimeoutError(f"No upstream quota within {timeout:.1f}s ({PRIORITIES[priority]} call)")
+                        pause = remaining if pause is None else min(pause, remaining)
+                    bucket.ready.wait(pause)
+            except BaseException:
+                if waiter in bucket.queues[priority].get(tenant, ()):
+                    bucket.remove(waiter, served=False)
+                    bucket.ready.notify_all()
+                raise
+
+    def throttled(self, key, delay=0.0):
+        """
+        Record a 429 for a key: pause it, empty its bucket and halve its rate
+        :param delay: Seconds from Retry-After; 0 falls back to exponential backoff from 1s
+        :return: seconds the key is paused for
+        """
+        with self._lock:
+            bucket = self._bucket(key)
+            bucket.strikes += 1
+            bucket.stats['throttled'] += 1
+            if delay <= 0:
+                delay = 2.0 ** (bucket.strikes - 1)
+            delay = min(delay, self.max_backoff)
+            now = self.clock()
+            bucket.paused_until = max(bucket.paused_until, now + delay)
+            bucket.tokens = 0.0
+            bucket.updated = now
+            bucket.rate = max(bucket.rate / 2, self.min_rate)
+            bucket.ready.notify_all()
+        logger.warning(f"Upstream throttled (429); pausing key {self._label(key)} for {delay:.1f}s at {bucket.rate:.2f} calls/s")
+        return delay
+
+    def succeeded(self, key):
+        """Record a successful call: the key's rate recovers by `recovery` of the configured rate"""
+        with self._lock:
+            bucket = self._bucket(key)
+            bucket.strikes = 0
+            if bucket.rate < self.rate:
+                bucket.rate = min(bucket.rate + self.rate * self.recovery, self.rate)
+
+    def call(self, key, fn, *args, priority=INTERACTIVE, tenant=DEFAULT_TENANT, max_wait=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) when the key's quota allows, re-queueing it after a 429
+        :param key: str (API key)
+        :param priority: INTERACTIVE or BATCH
+        :param tenant: str
+        :param max_wait: Seconds the call may spend queued in total (None = no limit)
+        :return: fn's result
+        :raises TimeoutError: when the quota does not allow the call in time
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+
+        deadline = None if max_wait is None else self.clock() + max_wait
+        attempt = 0
+        while True:
+            remaining = None if deadline is None else max(deadline - self.clock(), 0.0)
+            waited = self.acquire(key, priority, tenant, remaining)
+            metrics.observe('kp_upstream_queue_seconds', waited, priority=PRIORITIES[priority])
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = retry_after(e)
+                if delay is None:
+                    raise
+                metrics.inc('kp_upstream_throttled_total', priority=PRIORITIES[priority])
+                delay = self.throttled(key, delay)
+                attempt += 1
+                if attempt > self.retries or (deadline is not None and self.clock() + delay >= deadline):
+                    raise
+                continue
+            self.succeeded(key)
+            return result
+
+    @staticmethod
+    def _label(key):
+        # API keys stay out of logs and stats
+        return hashlib.sha256(str(key).encode('utf-8')).hexdigest()[:8]
+
+    def get_stats(self):
+        with self._lock:
+            now = self.clock()
+            keys = {}
+            for key, bucket in self._buckets.items():
+                self._refill(bucket, now)
+                keys[self._label(key)] = {
+                    'tokens': round(bucket.tokens, 2),
+                    'rate': round(bucket.rate, 3),
+                    'paused_seconds': round(max(bucket.paused_until - now, 0.0), 3),
+                    'waiting': {name: sum(len(w) for w in bucket.queues[p].values()) for p, name in enumerate(PRIORITIES)},
+                    'served': dict(zip(PRIORITIES, bucket.stats['served'])),
+                    'mean_wait_seconds': {
+                        name: round(bucket.stats['wait_seconds'][p] / bucket.stats['served'][p], 4) if bucket.stats['served'][p] else 0.0
+                        for p, name in enumerate(PRIORITIES)
+                    },
+                    'throttled': bucket.stats['throttled'],
+                    'timeouts': bucket.stats['timeouts']
+                }
+        return {
+            'enabled': self.enabled, 'rate': self.rate, 'burst': self.burst, 'reserve': self.reserve,
+            'processes': self.processes, 'keys': keys
+        }
+
+upstream_scheduler = UpstreamScheduler()
+
+if __name__ == '__main__':
+    import argparse
+    import statistics
+    from concurrent.futures import ThreadPoolExecutor
+    from api_client import get_json
+
+    # Load an upstream (e.g. a local stub) with mixed interactive and batch traffic under one key
+    parser = argparse.ArgumentParser(description="Drive an upstream URL through the scheduler and report queueing per priority")
+    parser.add_argument('url')
+    parser.add_argument('--rate', type=float, default=UPSTREAM_RATE)
+    parser.add_argument('--burst', type=float, default=UPSTREAM_BURST)
+    parser.add_argument('--interactive', type=int, default=20, help="Interactive calls, one every 1/rate seconds")
+    parser.add_argument('--batch', type=int, default=200, help="Batch calls, all queued at once")
+    parser.add_argument('--tenants', type=int, default=3, help="Tenants the batch calls are spread over")
+    args = parser.parse_args()
+
+    scheduler = UpstreamScheduler(enabled=True, rate=args.rate, burst=args.burst)
+    waits = {name: [] for name in PRIORITIES}
+
+    def run(priority, tenant):
+        started = time.monotonic()
+        try:
+            scheduler.call('cli', get_json, args.url, {}, priority=priority, tenant=tenant)
+        except Exception as e:
+            logger.warning(f"{PRIORITIES[priority]} call failed: {str(e)}")
+        waits[PRIORITIES[priority]].append(time.monotonic() - started)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.batch + args.interactive) as pool:
+        for i in range(args.batch):
+            pool.submit(run, BATCH, f"tenant-{i % max(args.tenants, 1)}")
+        for _ in range(args.interactive):
+            pool.submit(run, INTERACTIVE, 'interactive')
+            time.sleep(1 / args.rate)
+    elapsed = time.monotonic() - started
+
+    for name, samples in waits.items():
+        if samples:
+            samples.sort()
+            print(f"{name}: {len(samples)} calls, median {statistics.median(samples):.3f}s, "
+                  f"p95 {samples[int(0.95 * (len(samples) - 1))]:.3f}s, max {samples[-1]:.3f}s")
+    print(f"{args.interactive + args.batch} calls in {elapsed:.2f}s; {scheduler.get_stats()['keys']}")